@@ -0,0 +1,58 @@
+"""Benchmark JsonDatabase startup replay of the append-only journal.
+
+Builds a snapshot plus a journal tail of message-count mutations in a temporary
+directory, then times how long JsonDatabase takes to load and replay it.
+
+Usage:
+    python benchmarks/journal_replay.py [operations] [users]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.database import JsonDatabase
+
+
+def build_database(directory, operations, users):
+    """Write a snapshot and a journal tail of the given size"""
+    db_file = os.path.join(directory, 'bench_database.json')
+    database = JsonDatabase(db_file)
+    
+    # Keep everything in the journal so the load below has to replay it
+    database.write_behind = False
+    database.journal_max_bytes = float('inf')
+    
+    for i in range(operations):
+        database.increment_message_count(1, i % users)
+    
+    return db_file, os.path.getsize(database.journal_file)
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        db_file, journal_size = build_database(directory, operations, users)
+        build_time = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        database = JsonDatabase(db_file)
+        replay_time = time.perf_counter() - started
+        
+        total = sum(user['all_time'] for user in database.data['message_counts']['1'].values())
+        assert total == operations, f"replayed {total} messages, expected {operations}"
+        
+        print(f"operations:   {operations}")
+        print(f"users:        {users}")
+        print(f"journal size: {journal_size / 1024:.1f} KiB")
+        print(f"write time:   {build_time * 1000:.1f} ms ({build_time / operations * 1e6:.1f} us/op)")
+        print(f"replay time:  {replay_time * 1000:.1f} ms ({replay_time / operations * 1e6:.1f} us/op)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
 import logging
+from datetime import datetime, timezone
 from config import CONFIG
+from utils.channel_activity import channel_activity, describe_activity
 from utils.embed_creator import EmbedCreator
+from utils.message_pipeline import pipeline
+from utils.permission_executor import permission_executor, set_overwrite
 
 logger = logging.getLogger('discord_bot')
 
@@ -11,8 +16,95 @@ class ChannelManagement(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
+        self.settings = CONFIG.get('channel_activity', {})
+        self.backfill_task = None
+        
+        # Per-channel message counters are fed by the message pipeline
+        pipeline.register(bot, 'channels.activity', self.count_message, order=10)
+        self.save_activity.change_interval(seconds=self.settings.get('save_interval', 30))
+        self.save_activity.start()
+        
         logger.info("ChannelManagement cog initialized")
     
+    async def cog_load(self):
+        # Cogs loaded after the bot is ready never see on_ready
+        if self.bot.is_ready():
+            self.start_backfill()
+    
+    def cog_unload(self):
+        pipeline.unregister('channels.activity')
+        self.save_activity.cancel()
+        channel_activity.flush()
+        if self.backfill_task is not None:
+            self.backfill_task.cancel()
+    
+    async def count_message(self, context):
+        """Count a message in its channel (message pipeline stage)"""
+        message = context.message
+        channel_activity.record(message.guild.id, message.channel.id, message.created_at.timestamp())
+    
+    @tasks.loop(seconds=30)
+    async def save_activity(self):
+        """Write changed channel counters to the database"""
+        channel_activity.flush()
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.start_backfill()
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        """Drop the message counter of a deleted channel"""
+        channel_activity.forget_channel(channel.guild.id, channel.id)
+    
+    def start_backfill(self):
+        """Start counting older channel history if enabled and not already running"""
+        if not self.settings.get('backfill', False):
+            return
+        if self.backfill_task is None or self.backfill_task.done():
+            self.backfill_task = asyncio.create_task(self.backfill_history())
+    
+    async def backfill_history(self):
+        """Count the messages sent before each text channel was tracked, one channel at a time"""
+        delay = self.settings.get('backfill_delay', 2.0)
+        
+        for guild in list(self.bot.guilds):
+            for channel in list(guild.text_channels):
+                permissions = channel.permissions_for(guild.me)
+                if not (permissions.read_messages and permissions.read_message_history):
+                    continue
+                
+                try:
+                    await self.backfill_channel(channel, delay)
+                except discord.HTTPException as e:
+                    logger.warning(f"Could not backfill message counts of #{channel.name}: {e}")
+        
+        logger.info("Channel message count backfill finished")
+    
+    async def backfill_channel(self, channel, delay):
+        """Count a channel's history before live counting started, one page at a time
+        
+        The position is saved with the counts, so an interrupted backfill
+        resumes where it stopped instead of counting pages twice.
+        """
+        while True:
+            cursor = channel_activity.get_backfill_cursor(channel.guild.id, channel.id)
+            if cursor is None:
+                return
+            
+            before_id, since = cursor
+            before = discord.Object(id=before_id) if before_id else datetime.fromtimestamp(since, timezone.utc)
+            messages = [message async for message in channel.history(limit=100, before=before)]
+            
+            channel_activity.add_history(
+                channel.guild.id,
+                channel.id,
+                [message.created_at.timestamp() for message in messages if not message.author.bot],
+                messages[-1].id if messages else before_id,
+                len(messages) < 100
+            )
+            await asyncio.sleep(delay)
+    
     @commands.command(name="lock")
     @commands.has_permissions(manage_channels=True)
     @commands.bot_has_permissions(manage_channels=True)
@@ -43,10 +135,13 @@ class ChannelManagement(commands.Cog):
                 return
             
             # Set send_messages to False
-            current_perms.send_messages = False
-            
-            # Update the channel permissions
-            await channel.set_permissions(default_role, overwrite=current_perms, reason=reason)
+            result = await permission_executor.apply([channel], default_role, set_overwrite(send_messages=False), reason=reason)
+            if result['failed']:
+                await ctx.send(embed=EmbedCreator.create_error_embed(
+                    "Error",
+                    f"Failed to lock {channel.mention}. Check my permissions in that channel."
+                ))
+                return
             
             # Create and send embed
             embed = discord.Embed(
@@ -122,14 +217,14 @@ class ChannelManagement(commands.Cog):
                 ))
                 return
             
-            # Reset send_messages permission
-            current_perms.send_messages = None
-            
-            # If all permissions are None, remove the override
-            if all(getattr(current_perms, attr) is None for attr in dir(current_perms) if not attr.startswith('_') and attr != 'pair'):
-                await channel.set_permissions(default_role, overwrite=None, reason=reason)
-            else:
-                await channel.set_permissions(default_role, overwrite=current_perms, reason=reason)
+            # Reset send_messages permission, removing the override if nothing else is left
+            result = await permission_executor.apply([channel], default_role, set_overwrite(send_messages=None), reason=reason)
+            if result['failed']:
+                await ctx.send(embed=EmbedCreator.create_error_embed(
+                    "Error",
+                    f"Failed to unlock {channel.mention}. Check my permissions in that channel."
+                ))
+                return
             
             # Create and send embed
             embed = discord.Embed(
@@ -170,6 +265,96 @@ class ChannelManagement(commands.Cog):
                 f"Failed to unlock {channel.mention}: {str(e)}"
             ))
     
+    @commands.command(name="lockall")
+    @commands.has_permissions(manage_channels=True)
+    @commands.bot_has_permissions(manage_channels=True)
+    async def lock_all(self, ctx, *, reason: str = "No reason provided"):
+        """Lock every text channel in the server
+        
+        Args:
+            reason: The reason for the lockdown
+        """
+        await self.update_all_channels(ctx, set_overwrite(send_messages=False), reason, locking=True)
+    
+    @commands.command(name="unlockall")
+    @commands.has_permissions(manage_channels=True)
+    @commands.bot_has_permissions(manage_channels=True)
+    async def unlock_all(self, ctx, *, reason: str = "No reason provided"):
+        """Lift a server-wide lockdown
+        
+        Args:
+            reason: The reason for unlocking the server
+        """
+        await self.update_all_channels(ctx, set_overwrite(send_messages=None), reason, locking=False)
+    
+    async def update_all_channels(self, ctx, update, reason, locking):
+        """Apply a lock or unlock to every category and text channel, reporting progress
+        
+        Args:
+            ctx: The command context
+            update: The overwrite update for the default role
+            reason: The reason for the change
+            locking: Whether the server is being locked
+        """
+        action = "Locking" if locking else "Unlocking"
+        channels = [
+            channel for channel in ctx.guild.channels
+            if isinstance(channel, (discord.CategoryChannel, discord.TextChannel))
+        ]
+        
+        status = await ctx.send(embed=EmbedCreator.create_info_embed(
+            f"{action} Server",
+            f"Updating {len(channels)} channels..."
+        ))
+        
+        async def report(done, total):
+            try:
+                await status.edit(embed=EmbedCreator.create_info_embed(
+                    f"{action} Server",
+                    f"Updated {done}/{total} channels..."
+                ))
+            except discord.HTTPException:
+                pass
+        
+        result = await permission_executor.apply(
+            channels,
+            ctx.guild.default_role,
+            update,
+            reason=f"{'Lockdown' if locking else 'Lockdown lifted'} by {ctx.author}: {reason}",
+            progress=report
+        )
+        
+        embed = discord.Embed(
+            title="🔒 Server Locked" if locking else "🔓 Server Unlocked",
+            description=f"{result['updated']} channels updated, {result['skipped']} already {'locked' if locking else 'unlocked'}.",
+            color=CONFIG['colors']['warning'] if locking else CONFIG['colors']['success']
+        )
+        
+        embed.add_field(
+            name="Reason",
+            value=reason,
+            inline=False
+        )
+        
+        if result['failed']:
+            embed.add_field(
+                name="Failed",
+                value=f"{result['failed']} channels could not be updated. Check my permissions in them.",
+                inline=False
+            )
+        
+        if locking:
+            embed.add_field(
+                name="Unlock Command",
+                value="Use `.unlockall` to lift the lockdown.",
+                inline=False
+            )
+        
+        try:
+            await status.edit(embed=embed)
+        except discord.HTTPException:
+            await ctx.send(embed=embed)
+    
     @commands.command(name="slowmode")
     @commands.has_permissions(manage_channels=True)
     @commands.bot_has_permissions(manage_channels=True)
@@ -346,27 +531,12 @@ class ChannelManagement(commands.Cog):
                 inline=True
             )
         
-        # Add message count if available
-        try:
-            message_count = 0
-            async for _ in channel.history(limit=None):
-                message_count += 1
-                if message_count >= 100:  # Cap at 100 for performance
-                    message_count = "100+"
-                    break
-            
-            if isinstance(message_count, int):
-                count_str = str(message_count)
-            else:
-                count_str = message_count
-                
-            embed.add_field(
-                name="💬 Message Count",
-                value=count_str,
-                inline=True
-            )
-        except:
-            pass
+        # Add message counts (kept by the message pipeline, no API calls)
+        embed.add_field(
+            name="💬 Messages",
+            value=describe_activity(channel_activity.get_counts(ctx.guild.id, channel.id)),
+            inline=True
+        )
         
         await ctx.send(embed=embed)
 
@@ -7,6 +7,7 @@ import asyncio
 from datetime import datetime, timedelta
 from config import CONFIG
 from utils.embed_creator import EmbedCreator
+from utils.ban_cache import ban_cache
 
 logger = logging.getLogger('discord_bot')
 
@@ -24,6 +25,9 @@ class DirectModeration(commands.Cog):
         # Load settings
         self.load_settings()
         
+        # Ban events keep the cached ban lists current
+        ban_cache.attach(bot)
+        
         logger.info("DirectModeration cog initialized")
         
     def load_settings(self):
@@ -354,46 +358,9 @@ class DirectModeration(commands.Cog):
         """Unban a member from the server
         
         Args:
-            user_name: The username of the banned member (e.g. User#1234)
+            user_name: The username, ID or mention of the banned member (e.g. User#1234)
         """
-        # Get ban list
-        banned_users = [entry async for entry in ctx.guild.bans()]
-        
-        # Find user in ban list
-        for ban_entry in banned_users:
-            user = ban_entry.user
-            
-            # Check if username matches
-            if user.name.lower() == user_name.lower() or str(user).lower() == user_name.lower():
-                # Unban the user
-                try:
-                    await ctx.guild.unban(user)
-                    
-                    embed = discord.Embed(
-                        title=f"✅ User Unbanned",
-                        description=f"{user} has been unbanned from the server.",
-                        color=CONFIG['colors']['success']
-                    )
-                    
-                    await ctx.send(embed=embed)
-                    return
-                except Exception as e:
-                    error_embed = discord.Embed(
-                        title="❌ Error",
-                        description=f"Could not unban {user}: {str(e)}",
-                        color=CONFIG['colors']['error']
-                    )
-                    await ctx.send(embed=error_embed)
-                    return
-        
-        # User not found
-        embed = discord.Embed(
-            title="❌ Not Found",
-            description=f"Could not find a banned user with the name '{user_name}'. Please check the spelling.",
-            color=CONFIG['colors']['error']
-        )
-        
-        await ctx.send(embed=embed)
+        await ban_cache.unban(ctx, user_name)
     
     @commands.command(name="purge")
     @commands.has_permissions(manage_messages=True)
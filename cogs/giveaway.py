@@ -1,13 +1,15 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
-import random
 import logging
 import re
 from datetime import datetime, timedelta
 
 from utils.database import db
 from utils.embed_creator import EmbedCreator
+from utils.giveaway_entries import GiveawayEntryBuffer
+from utils.sampling import AliasTable
+from utils.scheduler import scheduler
 from config import CONFIG
 
 logger = logging.getLogger('discord_bot')
@@ -22,32 +24,127 @@ TIME_DICT = {
     "w": 604800
 }
 
+# Bonus entries: members get the multiplier of the best rule they match
+BONUS_TYPES = ('role', 'level', 'invites')
+MAX_BONUS_MULTIPLIER = 50
+
+# Draw tables kept for rerolls
+MAX_DRAW_TABLES = 32
+
 class Giveaway(commands.Cog):
     """Giveaway system"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.check_giveaways.start()
+        
+        # Each giveaway's end is a scheduler job, persisted across restarts
+        scheduler.register('giveaway_end', self.end_scheduled_giveaway)
+        self.schedule_active_giveaways()
+        
+        # Reaction entries are written to the database in batches
+        self.entries = GiveawayEntryBuffer(db)
+        self.flush_entries.start()
+        
+        # Weighted draw tables of ended giveaways, reused by greroll
+        self.draw_tables = {}
+        
         logger.info("Giveaway cog initialized")
     
     def cog_unload(self):
-        self.check_giveaways.cancel()
+        scheduler.unregister('giveaway_end')
+        self.flush_entries.cancel()
+        self.entries.flush()
+    
+    @tasks.loop(seconds=5)
+    async def flush_entries(self):
+        """Write buffered giveaway entries to the database"""
+        self.entries.flush()
+    
+    def get_giveaway_job_id(self, guild_id, message_id):
+        """Get the scheduler job ID of a giveaway's end"""
+        return f"giveaway_end:{guild_id}:{message_id}"
     
-    @tasks.loop(seconds=60)
-    async def check_giveaways(self):
-        """Check for ended giveaways and announce winners"""
-        active_giveaways = db.get_active_giveaways()
-        now = datetime.now()
-        
-        for giveaway in active_giveaways:
-            if giveaway['end_time'] <= now:
-                # Giveaway has ended
-                await self.end_giveaway(giveaway)
+    def schedule_giveaway(self, guild_id, message_id, end_time):
+        """Schedule a giveaway to end at end_time (a local datetime)"""
+        scheduler.schedule('giveaway_end', end_time.timestamp(), {
+            'guild_id': str(guild_id),
+            'message_id': str(message_id)
+        }, job_id=self.get_giveaway_job_id(guild_id, message_id))
     
-    @check_giveaways.before_loop
-    async def before_check_giveaways(self):
-        """Wait until the bot is ready before starting the giveaway checker"""
+    def schedule_active_giveaways(self):
+        """Schedule giveaways that are running but have no pending end job"""
+        for giveaway in db.get_active_giveaways():
+            if scheduler.get(self.get_giveaway_job_id(giveaway['guild_id'], giveaway['message_id'])) is None:
+                self.schedule_giveaway(giveaway['guild_id'], giveaway['message_id'], giveaway['end_time'])
+    
+    async def end_scheduled_giveaway(self, job):
+        """End a giveaway when its time is up (scheduler job)"""
         await self.bot.wait_until_ready()
+        
+        guild_id = job['payload']['guild_id']
+        message_id = job['payload']['message_id']
+        
+        giveaway = db.get_giveaway(guild_id, message_id)
+        if not giveaway or giveaway.get('ended'):
+            return
+        
+        await self.end_giveaway({
+            'guild_id': guild_id,
+            'channel_id': giveaway['channel_id'],
+            'message_id': message_id,
+            'end_time': datetime.fromisoformat(giveaway['end_time']),
+            'data': giveaway
+        })
+    
+    def get_entry_weight(self, member, bonus):
+        """Get how many entries a member has under a giveaway's bonus rules"""
+        weight = 1
+        
+        for rule in bonus:
+            if rule['type'] == 'role':
+                matched = member.get_role(rule['target']) is not None
+            elif rule['type'] == 'level':
+                matched = db.get_user_level(member.guild.id, member.id).get('level', 0) >= rule['target']
+            else:
+                matched = db.get_invite_stats(member.guild.id, member.id)['total'] >= rule['target']
+            
+            if matched:
+                weight = max(weight, rule['multiplier'])
+        
+        return weight
+    
+    def get_draw_table(self, guild, message_id, giveaway_data):
+        """Get the weighted draw table of a giveaway, building it on first use
+        
+        Participants who are no longer in the guild get no entries.
+        """
+        key = (str(guild.id), str(message_id))
+        table = self.draw_tables.get(key)
+        if table is not None:
+            return table
+        
+        bonus = giveaway_data.get('bonus', [])
+        members, weights = [], []
+        for user_id in giveaway_data['participants']:
+            member = guild.get_member(int(user_id))
+            if member:
+                members.append(member)
+                weights.append(self.get_entry_weight(member, bonus) if bonus else 1)
+        
+        table = self.draw_tables[key] = AliasTable(members, weights)
+        if len(self.draw_tables) > MAX_DRAW_TABLES:
+            del self.draw_tables[next(iter(self.draw_tables))]
+        return table
+    
+    def describe_bonus(self, rule):
+        """Describe a bonus entry rule"""
+        if rule['type'] == 'role':
+            requirement = f"<@&{rule['target']}>"
+        elif rule['type'] == 'level':
+            requirement = f"Level {rule['target']}+"
+        else:
+            requirement = f"{rule['target']}+ invites"
+        return f"{requirement}: {rule['multiplier']}x entries"
     
     async def end_giveaway(self, giveaway):
         """End a giveaway and announce winners"""
@@ -71,26 +168,22 @@ class Giveaway(commands.Cog):
             logger.error(f"Could not fetch message {message_id} for giveaway: {e}")
             return
         
+        # Write entries still in the buffer before drawing
+        self.entries.flush(guild_id, message_id)
+        giveaway_data = db.get_giveaway(guild_id, message_id) or giveaway['data']
+        
         # Mark giveaway as ended
         db.end_giveaway(guild_id, message_id)
+        scheduler.cancel(self.get_giveaway_job_id(guild_id, message_id))
         
         # Get giveaway data
-        giveaway_data = giveaway['data']
         winners_count = giveaway_data['winners']
         participants = giveaway_data['participants']
         prize = giveaway_data['prize']
         
-        # Select winners
-        winners = []
-        if participants:
-            # Make sure we don't try to select more winners than participants
-            winners_count = min(winners_count, len(participants))
-            winner_ids = random.sample(participants, winners_count)
-            
-            for winner_id in winner_ids:
-                winner = guild.get_member(int(winner_id))
-                if winner:
-                    winners.append(winner)
+        # Select winners from a fresh weighted table
+        self.draw_tables.pop((str(guild_id), str(message_id)), None)
+        winners = self.get_draw_table(guild, message_id, giveaway_data).draw(winners_count)
         
         # Update the giveaway embed
         if winners:
@@ -194,6 +287,7 @@ class Giveaway(commands.Cog):
             end_time,
             winners
         )
+        self.schedule_giveaway(ctx.guild.id, message.id, end_time)
         
         # Send confirmation to command user if different from giveaway channel
         if ctx.channel.id != message.channel.id:
@@ -214,13 +308,12 @@ class Giveaway(commands.Cog):
         if str(payload.emoji) != CONFIG['emojis']['giveaway']:
             return
         
-        # Get the giveaway data
-        giveaway = db.get_giveaway(payload.guild_id, payload.message_id)
-        if not giveaway:
+        # Check that the giveaway is still running
+        if not db.is_giveaway_running(payload.guild_id, payload.message_id):
             return
         
         # Add participant
-        db.add_giveaway_participant(payload.guild_id, payload.message_id, payload.user_id)
+        self.entries.add(payload.guild_id, payload.message_id, payload.user_id)
     
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
@@ -229,13 +322,79 @@ class Giveaway(commands.Cog):
         if str(payload.emoji) != CONFIG['emojis']['giveaway']:
             return
         
-        # Get the giveaway data
-        giveaway = db.get_giveaway(payload.guild_id, payload.message_id)
-        if not giveaway:
+        # Check that the giveaway is still running
+        if not db.is_giveaway_running(payload.guild_id, payload.message_id):
             return
         
         # Remove participant
-        db.remove_giveaway_participant(payload.guild_id, payload.message_id, payload.user_id)
+        self.entries.remove(payload.guild_id, payload.message_id, payload.user_id)
+    
+    @commands.hybrid_command(name="gbonus", description="Give members bonus entries in a giveaway")
+    @commands.has_permissions(manage_guild=True)
+    async def gbonus(self, ctx, message_id: str, bonus_type: str, target: str, multiplier: int):
+        """Give members bonus entries in a running giveaway
+        
+        Args:
+            message_id: The ID of the giveaway message
+            bonus_type: What the bonus depends on (role, level or invites)
+            target: The role, or the minimum level or invite count
+            multiplier: How many entries matching members get (1 removes the bonus)
+        """
+        giveaway = db.get_giveaway(ctx.guild.id, message_id)
+        if not giveaway or giveaway.get('ended'):
+            embed = EmbedCreator.create_error_embed(
+                "Giveaway Not Found",
+                "Could not find an active giveaway with that message ID."
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        bonus_type = bonus_type.lower()
+        if bonus_type not in BONUS_TYPES:
+            embed = EmbedCreator.create_error_embed(
+                "Invalid Bonus Type",
+                f"The bonus type must be one of: {', '.join(BONUS_TYPES)}."
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        if not 1 <= multiplier <= MAX_BONUS_MULTIPLIER:
+            embed = EmbedCreator.create_error_embed(
+                "Invalid Multiplier",
+                f"The multiplier must be between 1 and {MAX_BONUS_MULTIPLIER}."
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        # Resolve the role or threshold
+        try:
+            if bonus_type == 'role':
+                target = (await commands.RoleConverter().convert(ctx, target)).id
+            else:
+                target = int(target)
+        except (commands.BadArgument, ValueError):
+            embed = EmbedCreator.create_error_embed(
+                "Invalid Target",
+                "Please provide a role for role bonuses, or a number for level and invite bonuses."
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        # Replace any rule for the same role or threshold
+        bonus = [
+            rule for rule in giveaway.get('bonus', [])
+            if (rule['type'], rule['target']) != (bonus_type, target)
+        ]
+        if multiplier > 1:
+            bonus.append({'type': bonus_type, 'target': target, 'multiplier': multiplier})
+        db.set_giveaway_bonus(ctx.guild.id, message_id, bonus)
+        
+        embed = EmbedCreator.create_success_embed(
+            "Bonus Entries Updated",
+            f"Bonus entries for **{giveaway['prize']}**:\n" +
+            ("\n".join(self.describe_bonus(rule) for rule in bonus) or "None")
+        )
+        await ctx.send(embed=embed)
     
     @commands.hybrid_command(name="gend", description="End a giveaway early")
     @commands.has_permissions(manage_guild=True)
@@ -293,6 +452,7 @@ class Giveaway(commands.Cog):
             message_id: The ID of the giveaway message
         """
         # Get the giveaway
+        self.entries.flush(ctx.guild.id, message_id)
         giveaway = db.get_giveaway(ctx.guild.id, message_id)
         if not giveaway:
             embed = EmbedCreator.create_error_embed(
@@ -311,15 +471,8 @@ class Giveaway(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        # Select new winners
-        winners_count = min(giveaway['winners'], len(giveaway['participants']))
-        winner_ids = random.sample(giveaway['participants'], winners_count)
-        
-        winners = []
-        for winner_id in winner_ids:
-            winner = ctx.guild.get_member(int(winner_id))
-            if winner:
-                winners.append(winner)
+        # Select new winners, reusing the table of the original draw
+        winners = self.get_draw_table(ctx.guild, message_id, giveaway).draw(giveaway['winners'])
         
         if not winners:
             embed = EmbedCreator.create_error_embed(
@@ -86,6 +86,10 @@ COMMANDS_INFO = {
         "greroll": {
             "description": "Reroll a giveaway",
             "usage": "greroll <message_id>"
+        },
+        "gbonus": {
+            "description": "Give members bonus entries in a giveaway",
+            "usage": "gbonus <message_id> <role|level|invites> <target> <multiplier>"
         }
     },
     "roles": {
@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands
+import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 
 from utils.database import db
@@ -15,36 +17,183 @@ class Invites(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.invite_cache = {}
+        
+        # Joins are queued per guild and attributed in micro-batches, so a
+        # burst of joins costs one invites fetch per window
+        self.join_queues = {}
+        self.join_workers = {}
+        self.batch_window = CONFIG['invites'].get('join_batch_window', 2.0)
+        self.join_metrics = self.new_join_metrics()
+        
+        # Guilds whose invite cache is warm enough to diff joins against
+        self.ready_guilds = set()
+        # Guild ID -> monotonic time the fetch behind its cached invites started
+        self.refreshed_at = {}
+        # Guild ID -> time.time() of its latest join, seeded from stored joins
+        self.last_join = {}
+        self.warmup_task = None
+        self.warmup_concurrency = CONFIG['invites'].get('warmup_concurrency', 5)
+        self.warmup_progress = self.new_warmup_progress(0)
+        
         logger.info("Invites cog initialized")
     
+    async def cog_load(self):
+        # Cogs loaded after the bot is ready never see on_ready
+        if self.bot.is_ready():
+            self.start_warmup()
+    
+    def cog_unload(self):
+        if self.warmup_task is not None:
+            self.warmup_task.cancel()
+        for worker in self.join_workers.values():
+            worker.cancel()
+    
+    @staticmethod
+    def new_join_metrics():
+        """Create empty join attribution metrics"""
+        return {
+            'joins': 0,
+            'batches': 0,
+            'fetches': 0,
+            'max_batch': 0,
+            'high': 0,          # confidence >= 0.9
+            'medium': 0,        # confidence >= 0.5
+            'low': 0,
+            'vanity': 0,
+            'unattributed': 0,
+            'unsaved': 0        # attributed below min_confidence, so not written to the database
+        }
+    
+    @staticmethod
+    def new_warmup_progress(total):
+        """Create the progress record of an invite cache warm-up"""
+        return {
+            'total': total,
+            'done': 0,
+            'failed': 0,
+            'started_at': time.monotonic() if total else None,
+            'finished_at': None
+        }
+    
     @commands.Cog.listener()
     async def on_ready(self):
         """Cache all invites when the bot starts"""
-        await self.cache_invites()
+        self.start_warmup()
+    
+    def start_warmup(self):
+        """Start warming the invite cache unless a warm-up is already running"""
+        if self.warmup_task is None or self.warmup_task.done():
+            self.warmup_task = asyncio.create_task(self.cache_invites())
+    
+    def is_guild_ready(self, guild_id):
+        """Check whether a guild's invite cache can be trusted for diffing joins"""
+        return guild_id in self.ready_guilds
+    
+    def get_warmup_progress(self):
+        """Get the progress of the invite cache warm-up"""
+        progress = dict(self.warmup_progress)
+        progress['ready'] = len(self.ready_guilds)
+        
+        if progress['started_at'] is not None:
+            progress['elapsed'] = (progress['finished_at'] or time.monotonic()) - progress['started_at']
+        else:
+            progress['elapsed'] = 0.0
+        return progress
     
     async def cache_invites(self):
-        """Cache all invites from all guilds"""
-        for guild in self.bot.guilds:
+        """Cache all invites from all guilds
+        
+        Guilds are fetched with bounded concurrency, those with recent joins
+        first and then the largest, so the guilds most likely to see joins
+        become ready soonest. On a cold start the latest joins come from the
+        joins stored in the database.
+        """
+        self.seed_last_joins()
+        guilds = [guild for guild in self.bot.guilds if guild.me.guild_permissions.manage_guild]
+        guilds.sort(key=lambda guild: (self.last_join.get(guild.id, 0), guild.member_count or 0), reverse=True)
+        
+        progress = self.warmup_progress = self.new_warmup_progress(len(guilds))
+        semaphore = asyncio.Semaphore(self.warmup_concurrency)
+        
+        async def warm(guild):
+            async with semaphore:
+                if await self.warm_guild(guild):
+                    progress['done'] += 1
+                else:
+                    progress['failed'] += 1
+            
+            finished = progress['done'] + progress['failed']
+            if finished % 100 == 0 and finished < progress['total']:
+                logger.info(f"Invite cache warm-up: {finished}/{progress['total']} guilds")
+        
+        await asyncio.gather(*(warm(guild) for guild in guilds))
+        
+        progress['finished_at'] = time.monotonic()
+        logger.info(
+            f"Invite cache warm-up finished: {progress['done']} guilds ready, "
+            f"{progress['failed']} failed in {progress['finished_at'] - progress['started_at']:.1f}s"
+        )
+    
+    def seed_last_joins(self):
+        """Fill in the latest join of guilds that saw no join in this process"""
+        for guild_id, joined_at in db.get_last_join_times().items():
+            try:
+                self.last_join.setdefault(int(guild_id), datetime.fromisoformat(joined_at).timestamp())
+            except (TypeError, ValueError):
+                continue
+    
+    async def warm_guild(self, guild, retries=3):
+        """Fetch and cache a guild's invites and vanity URL uses, then mark it ready
+        
+        Returns:
+            bool: True if the guild's invites were cached
+        """
+        started = time.monotonic()
+        for attempt in range(retries):
             try:
-                # Skip guilds where the bot doesn't have permission to manage guild
-                if not guild.me.guild_permissions.manage_guild:
-                    continue
-                
-                self.invite_cache[guild.id] = {}
-                
-                # Fetch and cache invites
                 invites = await guild.invites()
-                for invite in invites:
-                    self.invite_cache[guild.id][invite.code] = {
-                        'uses': invite.uses,
-                        'inviter': invite.inviter.id if invite.inviter else None
-                    }
-                
-                logger.info(f"Cached {len(invites)} invites for guild {guild.name}")
+                vanity = None
+                if getattr(guild, 'vanity_url_code', None):
+                    try:
+                        vanity = await guild.vanity_invite()
+                    except discord.HTTPException:
+                        pass
+                break
             except discord.Forbidden:
                 logger.warning(f"No permission to fetch invites in guild {guild.name}")
+                return False
+            except discord.HTTPException as e:
+                # Back off when rate limited, give up on other errors
+                if e.status != 429 or attempt == retries - 1:
+                    logger.error(f"Error caching invites for guild {guild.name}: {e}")
+                    return False
+                await asyncio.sleep(5 * 2 ** attempt)
             except Exception as e:
                 logger.error(f"Error caching invites for guild {guild.name}: {e}")
+                return False
+        
+        # A join batch that fetched after us already left a newer cache
+        if self.refreshed_at.get(guild.id, 0) > started:
+            return True
+        
+        self.invite_cache[guild.id] = {
+            invite.code: {
+                'uses': invite.uses,
+                'inviter': invite.inviter.id if invite.inviter else None
+            }
+            for invite in invites
+        }
+        if vanity is not None:
+            self.invite_cache[guild.id][guild.vanity_url_code] = {
+                'uses': vanity.uses,
+                'inviter': None,
+                'vanity': True
+            }
+        
+        self.refreshed_at[guild.id] = started
+        self.ready_guilds.add(guild.id)
+        logger.debug(f"Cached {len(invites)} invites for guild {guild.name}")
+        return True
     
     @commands.Cog.listener()
     async def on_invite_create(self, invite):
@@ -72,71 +221,76 @@ class Invites(commands.Cog):
         if not guild.me.guild_permissions.manage_guild:
             return
         
-        try:
-            self.invite_cache[guild.id] = {}
-            
-            invites = await guild.invites()
-            for invite in invites:
-                self.invite_cache[guild.id][invite.code] = {
-                    'uses': invite.uses,
-                    'inviter': invite.inviter.id if invite.inviter else None
-                }
-            
-            logger.info(f"Cached {len(invites)} invites for new guild {guild.name}")
-        except discord.Forbidden:
-            logger.warning(f"No permission to fetch invites in guild {guild.name}")
-        except Exception as e:
-            logger.error(f"Error caching invites for guild {guild.name}: {e}")
+        if await self.warm_guild(guild):
+            logger.info(f"Cached {len(self.invite_cache[guild.id])} invites for new guild {guild.name}")
     
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
         """Remove guild from cache when the bot leaves a guild"""
+        self.ready_guilds.discard(guild.id)
+        self.refreshed_at.pop(guild.id, None)
+        self.last_join.pop(guild.id, None)
         if guild.id in self.invite_cache:
             del self.invite_cache[guild.id]
             logger.info(f"Removed guild {guild.name} from invite cache")
     
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        """Track which invite was used when a member joins"""
+        """Queue a join so the invite it used is resolved with the rest of its batch"""
         # Skip bots
         if member.bot:
             return
         
-        # Skip if guild is not in cache or bot doesn't have required permissions
-        if member.guild.id not in self.invite_cache or not member.guild.me.guild_permissions.manage_guild:
+        # Skip if bot doesn't have required permissions
+        if not member.guild.me.guild_permissions.manage_guild:
             return
         
-        # Get current invites
+        self.last_join[member.guild.id] = time.time()
+        self.join_queues.setdefault(member.guild.id, []).append(member)
+        
+        worker = self.join_workers.get(member.guild.id)
+        if worker is None or worker.done():
+            self.join_workers[member.guild.id] = asyncio.create_task(self.process_join_queue(member.guild))
+    
+    async def process_join_queue(self, guild):
+        """Resolve queued joins of a guild in batches until the queue is empty"""
+        try:
+            while self.join_queues.get(guild.id):
+                # Let the rest of a burst arrive before fetching
+                await asyncio.sleep(self.batch_window)
+                
+                members = self.join_queues.pop(guild.id, [])
+                if members:
+                    await self.resolve_join_batch(guild, members)
+        finally:
+            self.join_workers.pop(guild.id, None)
+    
+    async def resolve_join_batch(self, guild, members):
+        """Attribute a batch of joins from one fetch of the guild's invites
+        
+        Every use an invite gained since the last fetch is one slot. Discord
+        doesn't say which member used which invite, so slots are paired with
+        the queued members (in the order their join events arrived) in a fixed
+        but arbitrary order: vanity URL uses first, as the vanity check took
+        precedence for single joins, then the other invites by code.
+        
+        A member's confidence is the share of slots belonging to its inviter,
+        scaled down when the number of slots and members differ; it is 1.0
+        whenever the whole batch can only have come from one inviter. Only
+        attributions of at least min_confidence are written to the database.
+        """
+        self.join_metrics['joins'] += len(members)
+        self.join_metrics['batches'] += 1
+        self.join_metrics['max_batch'] = max(self.join_metrics['max_batch'], len(members))
+        cached = self.invite_cache.get(guild.id, {})
+        trusted = self.is_guild_ready(guild.id)
+        
         try:
-            invite_used = None
-            inviter_id = None
-            is_vanity = False
-            is_fake = False
-            is_rejoin = False
-            
-            # Check if the member had joined the server before (rejoin)
-            # This is a basic check; a more robust implementation would require storing join/leave history
-            member_age = (datetime.now() - member.created_at).days
-            if member_age < 7:  # If account is less than 7 days old
-                is_fake = True
-            
-            try:
-                # Get previous join/leave entries for this user from database
-                guild_invites = db.data.get('invites', {}).get(str(member.guild.id), {})
-                for inviter_id_str, inviter_data in guild_invites.items():
-                    for invitee in inviter_data.get('invitees', []):
-                        if invitee.get('user_id') == str(member.id):
-                            is_rejoin = True
-                            break
-                    if is_rejoin:
-                        break
-            except Exception as e:
-                logger.error(f"Error checking rejoin status: {e}")
-                is_rejoin = False
-            
             # Get new invites
             current_invites = {}
-            guild_invites = await member.guild.invites()
+            fetch_started = time.monotonic()
+            guild_invites = await guild.invites()
+            self.join_metrics['fetches'] += 1
             
             for invite in guild_invites:
                 current_invites[invite.code] = {
@@ -145,61 +299,125 @@ class Invites(commands.Cog):
                 }
             
             # Check for vanity URL
-            if hasattr(member.guild, 'vanity_url_code') and member.guild.vanity_url_code:
-                # Guild has a vanity URL, check if it was used
+            if getattr(guild, 'vanity_url_code', None):
                 try:
-                    vanity = await member.guild.vanity_invite()
-                    old_uses = self.invite_cache[member.guild.id].get(member.guild.vanity_url_code, {}).get('uses', 0)
-                    
-                    if vanity.uses > old_uses:
-                        # Vanity URL was used
-                        invite_used = member.guild.vanity_url_code
-                        is_vanity = True
-                        
-                        # Update the cache
-                        self.invite_cache[member.guild.id][member.guild.vanity_url_code] = {
-                            'uses': vanity.uses,
-                            'inviter': None
-                        }
-                except:
+                    vanity = await guild.vanity_invite()
+                    self.join_metrics['fetches'] += 1
+                    current_invites[guild.vanity_url_code] = {
+                        'uses': vanity.uses,
+                        'inviter': None,
+                        'vanity': True
+                    }
+                except discord.HTTPException:
                     pass
-            
-            # If not vanity URL, find which invite was used by comparing with cache
-            if not is_vanity:
-                for invite_code, invite_data in current_invites.items():
-                    # If this invite is new or has more uses than cached
-                    if (invite_code not in self.invite_cache[member.guild.id] or 
-                        invite_data['uses'] > self.invite_cache[member.guild.id][invite_code]['uses']):
-                        invite_used = invite_code
-                        inviter_id = invite_data['inviter']
-                        break
-            
-            # Update the invite cache
-            self.invite_cache[member.guild.id] = current_invites
-            
-            # If we found which invite was used
-            if invite_used and inviter_id:
-                # Track the invite in the database
-                db.track_invite(member.guild.id, inviter_id, member.id, is_fake, is_rejoin)
-                
-                # Log the invite
-                inviter = member.guild.get_member(inviter_id)
-                inviter_name = inviter.name if inviter else f"Unknown ({inviter_id})"
-                
-                logger.info(
-                    f"Member {member.name} joined {member.guild.name} "
-                    f"using invite {invite_used} from {inviter_name}. "
-                    f"Fake: {is_fake}, Rejoin: {is_rejoin}"
-                )
-            elif is_vanity:
-                logger.info(f"Member {member.name} joined {member.guild.name} using the vanity URL.")
-            else:
-                logger.warning(f"Could not determine which invite {member.name} used to join {member.guild.name}")
-            
         except discord.Forbidden:
-            logger.warning(f"No permission to fetch invites in guild {member.guild.name}")
+            logger.warning(f"No permission to fetch invites in guild {guild.name}")
+            self.join_metrics['unattributed'] += len(members)
+            self.ready_guilds.discard(guild.id)
+            return
+        except Exception as e:
+            logger.error(f"Error fetching invites for {len(members)} joins in {guild.name}: {e}")
+            self.join_metrics['unattributed'] += len(members)
+            # The cached uses don't include these joins, so the next batch would
+            # credit them to its own members; diff again only after a fresh fetch
+            self.ready_guilds.discard(guild.id)
+            asyncio.create_task(self.warm_guild(guild))
+            return
+        
+        # One slot per new use of each invite, vanity uses first
+        slots = []
+        for invite_code, invite_data in sorted(
+            current_invites.items(),
+            key=lambda item: (not item[1].get('vanity', False), item[0])
+        ):
+            new_uses = invite_data['uses'] - cached.get(invite_code, {}).get('uses', 0)
+            slots.extend([(invite_code, invite_data)] * max(new_uses, 0))
+        
+        # Update the invite cache
+        self.invite_cache[guild.id] = current_invites
+        self.refreshed_at[guild.id] = fetch_started
+        self.ready_guilds.add(guild.id)
+        
+        # Without a warm cache there is nothing to diff against
+        if not trusted:
+            self.join_metrics['unattributed'] += len(members)
+            logger.warning(f"Invite cache for {guild.name} was not warm yet; {len(members)} joins left unattributed")
+            return
+        
+        uses_by_inviter = {}
+        for invite_code, invite_data in slots:
+            uses_by_inviter[invite_data['inviter']] = uses_by_inviter.get(invite_data['inviter'], 0) + 1
+        match_ratio = min(len(slots), len(members)) / max(len(slots), len(members))
+        
+        for i, member in enumerate(members):
+            if i >= len(slots):
+                self.join_metrics['unattributed'] += 1
+                logger.warning(f"Could not determine which invite {member.name} used to join {guild.name}")
+                continue
+            
+            invite_used, invite_data = slots[i]
+            inviter_id = invite_data['inviter']
+            confidence = uses_by_inviter[inviter_id] / len(slots) * match_ratio
+            self.track_join(member, invite_used, invite_data, confidence)
+    
+    def track_join(self, member, invite_used, invite_data, confidence):
+        """Record an attributed join"""
+        inviter_id = invite_data['inviter']
+        
+        if invite_data.get('vanity'):
+            self.join_metrics['vanity'] += 1
+            logger.info(f"Member {member.name} joined {member.guild.name} using the vanity URL.")
+            return
+        
+        if confidence >= 0.9:
+            self.join_metrics['high'] += 1
+        elif confidence >= 0.5:
+            self.join_metrics['medium'] += 1
+        else:
+            self.join_metrics['low'] += 1
+        
+        if not inviter_id:
+            return
+        
+        # Several inviters share the batch; which of them brought this member is a guess
+        if confidence < CONFIG['invites'].get('min_confidence', 0.9):
+            self.join_metrics['unsaved'] += 1
+            logger.info(
+                f"Member {member.name} joined {member.guild.name} in a mixed batch; "
+                f"invite {invite_used} is only a guess (confidence {confidence:.2f}), not saving it"
+            )
+            return
+        
+        # Accounts younger than 7 days count as fake invites
+        member_age = (discord.utils.utcnow() - member.created_at).days
+        is_fake = member_age < 7
+        
+        try:
+            # Get previous join/leave entries for this user from database
+            is_rejoin = db.has_joined_before(member.guild.id, member.id)
         except Exception as e:
-            logger.error(f"Error tracking invite for {member.name} in {member.guild.name}: {e}")
+            logger.error(f"Error checking rejoin status: {e}")
+            is_rejoin = False
+        
+        # Track the invite in the database
+        db.track_invite(member.guild.id, inviter_id, member.id, is_fake, is_rejoin)
+        
+        # Log the invite
+        inviter = member.guild.get_member(inviter_id)
+        inviter_name = inviter.name if inviter else f"Unknown ({inviter_id})"
+        
+        logger.info(
+            f"Member {member.name} joined {member.guild.name} "
+            f"using invite {invite_used} from {inviter_name} (confidence {confidence:.2f}). "
+            f"Fake: {is_fake}, Rejoin: {is_rejoin}"
+        )
+    
+    def get_join_metrics(self):
+        """Get join attribution metrics, including the average batch size"""
+        metrics = dict(self.join_metrics)
+        metrics['avg_batch'] = metrics['joins'] / metrics['batches'] if metrics['batches'] else 0.0
+        metrics['queued'] = sum(len(queue) for queue in self.join_queues.values())
+        return metrics
     
     @commands.Cog.listener()
     async def on_member_remove(self, member):
@@ -231,6 +449,59 @@ class Invites(commands.Cog):
         embed = EmbedCreator.create_invite_stats_embed(member, stats)
         
         await ctx.send(embed=embed)
+    
+    @commands.command(name="invitemetrics")
+    @commands.is_owner()
+    async def invitemetrics(self, ctx, reset: str = None):
+        """Show how joins are batched and how confidently they are attributed
+        
+        Args:
+            reset: Pass "reset" to clear the metrics
+        """
+        if reset and reset.lower() == "reset":
+            self.join_metrics = self.new_join_metrics()
+            await ctx.send(embed=EmbedCreator.create_success_embed(
+                "Invite Metrics Reset",
+                "Join attribution metrics have been cleared."
+            ))
+            return
+        
+        metrics = self.get_join_metrics()
+        embed = EmbedCreator.create_info_embed(
+            "Invite Attribution Metrics",
+            f"{metrics['joins']} joins in {metrics['batches']} batches "
+            f"using {metrics['fetches']} invite fetches ({metrics['queued']} queued)"
+        )
+        embed.add_field(
+            name="Batch Size",
+            value=f"avg {metrics['avg_batch']:.1f} • max {metrics['max_batch']}",
+            inline=False
+        )
+        embed.add_field(
+            name="Confidence",
+            value=(
+                f"High: {metrics['high']}\n"
+                f"Medium: {metrics['medium']}\n"
+                f"Low: {metrics['low']}\n"
+                f"Vanity URL: {metrics['vanity']}\n"
+                f"Unattributed: {metrics['unattributed']}\n"
+                f"Not saved (low confidence): {metrics['unsaved']}"
+            ),
+            inline=False
+        )
+        
+        warmup = self.get_warmup_progress()
+        embed.add_field(
+            name="Cache Warm-up",
+            value=(
+                f"{warmup['ready']} guilds ready • "
+                f"{warmup['done'] + warmup['failed']}/{warmup['total']} fetched "
+                f"({warmup['failed']} failed) in {warmup['elapsed']:.1f}s"
+            ),
+            inline=False
+        )
+        
+        await ctx.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(Invites(bot))
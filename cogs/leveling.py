@@ -1,5 +1,5 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
 import random
 import json
@@ -9,6 +9,8 @@ from datetime import datetime
 from utils.data_manager import DataManager
 from utils.embed_creator import EmbedCreator
 from utils.helpers import Helpers
+from utils.message_pipeline import pipeline
+from utils.xp_buffer import XPBuffer
 from config import LEVEL_DATA_FILE, COLORS
 
 logger = logging.getLogger('discord_bot')
@@ -17,51 +19,57 @@ class Leveling(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.data_manager = DataManager(LEVEL_DATA_FILE)
+        self.xp_buffer = XPBuffer(self.data_manager)
         self.xp_cooldown = commands.CooldownMapping.from_cooldown(1, 60, commands.BucketType.member)
         self.xp_per_message = 15  # Base XP per message
         self.xp_randomizer = 5    # Random XP bonus
-    
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Give XP when a member sends a message."""
-        # Don't give XP for bot messages or DMs
-        if message.author.bot or not message.guild:
-            return
-        
-        # Check if the channel is excluded from XP gain
-        guild_settings = await self.data_manager.get(f"guild_{message.guild.id}", {})
         
+        pipeline.register_settings('leveling', self.get_guild_settings)
+        pipeline.register(bot, 'leveling.cooldown', self.check_cooldown, order=20)
+        pipeline.register(bot, 'leveling.xp', self.award_xp, order=30)
+        self.flush_xp.start()
+    
+    async def cog_unload(self):
+        pipeline.unregister('leveling.cooldown')
+        pipeline.unregister('leveling.xp')
+        pipeline.unregister_settings('leveling')
+        self.flush_xp.cancel()
+        await self.xp_buffer.flush()
+    
+    @tasks.loop(seconds=30)
+    async def flush_xp(self):
+        """Apply buffered XP to the data file in one write."""
+        await self.xp_buffer.flush()
+    
+    async def get_guild_settings(self, guild_id):
+        """Load leveling settings for a guild (cached by the message pipeline)."""
+        return await self.data_manager.get(f"guild_{guild_id}", {})
+    
+    async def check_cooldown(self, context):
+        """Skip the XP stage when leveling is off or the member is on cooldown."""
         # If leveling is disabled, don't give XP
-        if not guild_settings.get('enabled', True):
+        if not context.settings['leveling'].get('enabled', True):
+            context.skip('leveling.xp')
             return
         
         # Apply cooldown to prevent XP farming
-        bucket = self.xp_cooldown.get_bucket(message)
+        bucket = self.xp_cooldown.get_bucket(context.message)
         if bucket.update_rate_limit():
-            return
+            context.skip('leveling.xp')
+    
+    async def award_xp(self, context):
+        """Give XP when a member sends a message."""
+        message = context.message
+        guild_settings = context.settings['leveling']
         
         # Calculate XP to give
         xp_gain = self.xp_per_message + random.randint(0, self.xp_randomizer)
         
-        # Get user's current XP
-        user_key = f"user_{message.guild.id}_{message.author.id}"
-        user_data = await self.data_manager.get(user_key, {'xp': 0, 'level': 0, 'messages': 0})
-        
-        # Increment message count
-        user_data['messages'] = user_data.get('messages', 0) + 1
+        # Buffer the XP; levels are computed from the stored total plus pending XP
+        old_level, new_level = self.xp_buffer.add(message.guild.id, message.author.id, xp_gain)
         
-        # Add XP
-        old_xp = user_data.get('xp', 0)
-        new_xp = old_xp + xp_gain
-        user_data['xp'] = new_xp
-        
-        # Calculate current level
-        old_level = user_data.get('level', 0)
-        new_level = Helpers.get_level_from_xp(new_xp)
-        user_data['level'] = new_level
-        
-        # Save updated user data
-        await self.data_manager.set(user_key, user_data)
+        # Written by flush_xp, or early by the pipeline commit if the buffer is full
+        context.commit(self.xp_buffer)
         
         # Check for level up
         if new_level > old_level:
@@ -89,9 +97,8 @@ class Leveling(commands.Cog):
         if member is None:
             member = ctx.author
         
-        # Get user data
-        user_key = f"user_{ctx.guild.id}_{member.id}"
-        user_data = await self.data_manager.get(user_key, {'xp': 0, 'level': 0, 'messages': 0})
+        # Get user data, including XP that hasn't been flushed yet
+        user_data = self.xp_buffer.get_user_data(ctx.guild.id, member.id)
         
         xp = user_data.get('xp', 0)
         level = user_data.get('level', 0)
@@ -119,6 +126,7 @@ class Leveling(commands.Cog):
         embed.add_field(name="Level", value=str(level), inline=True)
         embed.add_field(name="XP", value=f"{xp}/{next_level_xp}", inline=True)
         embed.add_field(name="Messages", value=str(messages), inline=True)
+        embed.add_field(name="Rank", value=f"#{self.xp_buffer.get_ranking(ctx.guild.id).rank(member.id) or '-'}", inline=True)
         embed.add_field(name="Progress to Next Level", value=f"`{bar}` {progress_percentage}%", inline=False)
         
         embed.set_thumbnail(url=member.display_avatar.url)
@@ -126,46 +134,38 @@ class Leveling(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name="leaderboard", aliases=["top", "lb"])
-    async def leaderboard(self, ctx, category="level"):
+    async def leaderboard(self, ctx, category="level", page: int = 1):
         """Show the server leaderboard."""
         guild_id = ctx.guild.id
+        page = max(page, 1)
         
         if category.lower() not in ["level", "xp", "messages"]:
             category = "level"  # Default to level
         
-        # Get all user data for this guild
-        all_data = await self.data_manager.get_all()
-        guild_users = []
-        
-        for key, value in all_data.items():
-            if key.startswith(f"user_{guild_id}_"):
-                user_id = int(key.split('_')[2])
-                guild_users.append({
-                    "user_id": user_id,
-                    "xp": value.get('xp', 0),
-                    "level": value.get('level', 0),
-                    "messages": value.get('messages', 0)
-                })
-        
-        # Sort by the requested category
+        # Rank by the requested category using the buffer's ranking index
         if category.lower() in ["level", "xp"]:
-            guild_users.sort(key=lambda x: x["xp"], reverse=True)
+            ranking = self.xp_buffer.get_ranking(guild_id, 'xp')
             leaderboard_type = "Levels"
             display_key = "level"
         else:  # messages
-            guild_users.sort(key=lambda x: x["messages"], reverse=True)
+            ranking = self.xp_buffer.get_ranking(guild_id, 'messages')
             leaderboard_type = "Messages"
             display_key = "messages"
         
-        # Create the leaderboard entries
+        # Create the leaderboard entries for the requested page
         entries = []
-        for user_data in guild_users[:10]:  # Get top 10
-            user_id = user_data["user_id"]
-            count = user_data[display_key]
+        for user_id, score in ranking.page(page, 10):
+            count = self.xp_buffer.get_user_data(guild_id, user_id)[display_key]
             entries.append({"user_id": user_id, "count": count})
         
         # Create the embed
-        embed = EmbedCreator.create_leaderboard_embed(leaderboard_type, entries)
+        embed = EmbedCreator.create_leaderboard_embed(leaderboard_type, entries, start=(page - 1) * 10 + 1)
+        
+        rank = ranking.rank(ctx.author.id)
+        footer = f"Page {page}"
+        if rank:
+            footer += f" • Your rank: #{rank}"
+        embed.set_footer(text=footer)
         
         await ctx.send(embed=embed)
     
@@ -186,6 +186,7 @@ class Leveling(commands.Cog):
         guild_settings['enabled'] = True
         
         await self.data_manager.set(guild_key, guild_settings)
+        pipeline.invalidate_settings(guild_id)
         
         embed = EmbedCreator.create_basic_embed(
             title="Leveling System Enabled",
@@ -206,6 +207,7 @@ class Leveling(commands.Cog):
         guild_settings['enabled'] = False
         
         await self.data_manager.set(guild_key, guild_settings)
+        pipeline.invalidate_settings(guild_id)
         
         embed = EmbedCreator.create_basic_embed(
             title="Leveling System Disabled",
@@ -235,6 +237,7 @@ class Leveling(commands.Cog):
             color = COLORS["info"]
         
         await self.data_manager.set(guild_key, guild_settings)
+        pipeline.invalidate_settings(guild_id)
         
         embed = EmbedCreator.create_basic_embed(
             title="Level-Up Channel Updated",
@@ -253,6 +256,7 @@ class Leveling(commands.Cog):
         if member:
             # Reset for specific user
             user_key = f"user_{guild_id}_{member.id}"
+            self.xp_buffer.discard(guild_id, member.id)
             await self.data_manager.delete(user_key)
             
             embed = EmbedCreator.create_basic_embed(
@@ -276,6 +280,7 @@ class Leveling(commands.Cog):
                 response = await self.bot.wait_for("message", check=check, timeout=30.0)
                 if response.content.lower() == "yes":
                     # Reset for entire server
+                    self.xp_buffer.discard(guild_id)
                     all_data = await self.data_manager.get_all()
                     keys_to_delete = [key for key in all_data if key.startswith(f"user_{guild_id}_")]
                     
@@ -1,5 +1,5 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import random
 import logging
 import datetime
@@ -7,7 +7,10 @@ import json
 import os
 from utils.helpers import Helpers
 from utils.data_manager import DataManager
+from utils.database import db
 from utils.embed_creator import EmbedCreator
+from utils.message_pipeline import pipeline
+from utils.xp_buffer import XPBuffer
 from config import CONFIG
 
 logger = logging.getLogger('discord_bot')
@@ -18,55 +21,60 @@ class Levels(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.data_manager = DataManager("bot_database.json")
+        self.xp_buffer = XPBuffer(self.data_manager)
         self.xp_cooldown = commands.CooldownMapping.from_cooldown(
             1, 60, commands.BucketType.member
         )
-        logger.info("Levels cog initialized")
         
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Award XP for messages"""
-        # Don't process commands or bot messages
-        if message.author.bot or not message.guild:
-            return
-            
-        # Get guild settings
-        guild_key = f"guild_{message.guild.id}"
-        guild_settings = await self.data_manager.get(guild_key, {})
+        pipeline.register_settings('levels', self.get_guild_settings)
+        pipeline.register(bot, 'levels.cooldown', self.check_cooldown, order=20)
+        pipeline.register(bot, 'levels.xp', self.award_xp, order=30)
         
+        self.flush_xp.change_interval(seconds=CONFIG['levels'].get('flush_interval', 30))
+        self.flush_xp.start()
+        logger.info("Levels cog initialized")
+    
+    async def cog_unload(self):
+        pipeline.unregister('levels.cooldown')
+        pipeline.unregister('levels.xp')
+        pipeline.unregister_settings('levels')
+        self.flush_xp.cancel()
+        await self.xp_buffer.flush()
+    
+    @tasks.loop(seconds=30)
+    async def flush_xp(self):
+        """Apply buffered XP to the data file in one write"""
+        await self.xp_buffer.flush()
+    
+    async def get_guild_settings(self, guild_id):
+        """Load leveling settings for a guild (cached by the message pipeline)"""
+        return await self.data_manager.get(f"guild_{guild_id}", {})
+    
+    async def check_cooldown(self, context):
+        """Skip the XP stage when leveling is off or the author is on cooldown (message pipeline stage)"""
         # Check if leveling is enabled for this guild
-        if guild_settings.get('leveling_enabled', True) is False:
+        if context.settings['levels'].get('leveling_enabled', True) is False:
+            context.skip('levels.xp')
             return
             
         # Apply cooldown to prevent XP farming
-        bucket = self.xp_cooldown.get_bucket(message)
+        bucket = self.xp_cooldown.get_bucket(context.message)
         if bucket.update_rate_limit():
-            return
+            context.skip('levels.xp')
+    
+    async def award_xp(self, context):
+        """Award XP for messages (message pipeline stage)"""
+        message = context.message
+        guild_settings = context.settings['levels']
             
         # Calculate random XP gain
         xp_gain = 15 + random.randint(0, 5)  # Base XP (15) + random bonus (0-5)
         
-        # Get user's current XP and level
-        user_key = f"user_{message.guild.id}_{message.author.id}"
-        user_data = await self.data_manager.get(user_key, {'xp': 0, 'level': 0, 'messages': 0})
-        
-        # Update message count
-        user_data['messages'] = user_data.get('messages', 0) + 1
-        
-        # Get current XP and level
-        current_xp = user_data.get('xp', 0)
-        current_level = user_data.get('level', 0)
-        
-        # Add XP
-        new_xp = current_xp + xp_gain
-        user_data['xp'] = new_xp
+        # Buffer the XP; levels are computed from the stored total plus pending XP
+        current_level, new_level = self.xp_buffer.add(message.guild.id, message.author.id, xp_gain)
         
-        # Calculate new level
-        new_level = Helpers.get_level_from_xp(new_xp)
-        user_data['level'] = new_level
-        
-        # Save updated user data
-        await self.data_manager.set(user_key, user_data)
+        # Written by flush_xp, or early by the pipeline commit if the buffer is full
+        context.commit(self.xp_buffer)
         
         # Check for level up
         if new_level > current_level:
@@ -113,13 +121,13 @@ class Levels(commands.Cog):
         if member is None:
             member = ctx.author
             
-        # Get user data
-        user_key = f"user_{ctx.guild.id}_{member.id}"
-        user_data = await self.data_manager.get(user_key, {'xp': 0, 'level': 0, 'messages': 0})
+        # Get user data, including XP that hasn't been flushed yet
+        user_data = self.xp_buffer.get_user_data(ctx.guild.id, member.id)
         
         xp = user_data.get('xp', 0)
         level = user_data.get('level', 0)
         messages = user_data.get('messages', 0)
+        rank = self.xp_buffer.get_ranking(ctx.guild.id).rank(member.id) or "-"
         
         # Calculate XP for next level
         next_level_xp = Helpers.get_xp_for_level(level + 1)
@@ -140,7 +148,7 @@ class Levels(commands.Cog):
         # Create embed
         embed = discord.Embed(
             title=f"{member.display_name}'s Level Stats",
-            description=f"**Level:** {level}\n**XP:** {xp}/{next_level_xp}\n**Messages:** {messages}",
+            description=f"**Level:** {level}\n**XP:** {xp}/{next_level_xp}\n**Messages:** {messages}\n**Rank:** #{rank}",
             color=CONFIG['colors']['default'],
             timestamp=datetime.datetime.utcnow()
         )
@@ -161,48 +169,32 @@ class Levels(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name="leaderboard", aliases=["lb", "top"])
-    async def leaderboard(self, ctx, type: str = "levels"):
+    async def leaderboard(self, ctx, type: str = "levels", page: int = 1):
         """Show the server leaderboard
         
         Args:
             type: The type of leaderboard to show (levels, messages, invites)
+            page: The page of the leaderboard to show
         """
         if type.lower() not in ["levels", "messages", "invites"]:
             type = "levels"  # Default to levels
-            
-        # Get all data
-        all_data = await self.data_manager.get_all()
-        
-        # Filter users from this guild
-        guild_users = []
-        for key, data in all_data.items():
-            if key.startswith(f"user_{ctx.guild.id}_"):
-                try:
-                    user_id = int(key.split('_')[2])
-                    
-                    if type.lower() == "levels":
-                        value = data.get('level', 0)
-                        secondary = data.get('xp', 0)
-                    elif type.lower() == "messages":
-                        value = data.get('messages', 0)
-                        secondary = 0
-                    # Invites are handled by a different cog
-                    else:
-                        continue
-                        
-                    guild_users.append({
-                        'user_id': user_id,
-                        'value': value,
-                        'secondary': secondary
-                    })
-                except (IndexError, ValueError):
-                    continue
-        
-        # Sort users by value (descending)
-        guild_users.sort(key=lambda x: (x['value'], x['secondary']), reverse=True)
-        
-        # Take top 10
-        top_users = guild_users[:10]
+        page = max(page, 1)
+        
+        # Read the requested page from the ranking index instead of sorting every member
+        top_users = []
+        if type.lower() == "invites":
+            for entry in db.get_invite_leaderboard(ctx.guild.id, 10, page=page):
+                top_users.append({'user_id': entry['user_id'], 'value': entry['total']})
+            rank = db.get_invite_rank(ctx.guild.id, ctx.author.id)
+        else:
+            ranking = self.xp_buffer.get_ranking(ctx.guild.id, 'xp' if type.lower() == "levels" else 'messages')
+            for user_id, score in ranking.page(page, 10):
+                if type.lower() == "levels":
+                    value = self.xp_buffer.get_user_data(ctx.guild.id, user_id)['level']
+                else:
+                    value = score
+                top_users.append({'user_id': user_id, 'value': value})
+            rank = ranking.rank(ctx.author.id)
         
         if not top_users:
             await ctx.send(f"No data available for the {type} leaderboard.")
@@ -218,7 +210,7 @@ class Levels(commands.Cog):
         
         # Format leaderboard entries
         lb_text = ""
-        for i, user_data in enumerate(top_users):
+        for i, user_data in enumerate(top_users, (page - 1) * 10):
             user_id = user_data['user_id']
             value = user_data['value']
             
@@ -237,7 +229,10 @@ class Levels(commands.Cog):
         embed.add_field(name="Rankings", value=lb_text, inline=False)
         
         # Set footer
-        embed.set_footer(text=f"Requested by {ctx.author}", icon_url=ctx.author.display_avatar.url)
+        footer = f"Requested by {ctx.author} • Page {page}"
+        if rank:
+            footer += f" • Your rank: #{rank}"
+        embed.set_footer(text=footer, icon_url=ctx.author.display_avatar.url)
         
         await ctx.send(embed=embed)
     
@@ -306,6 +301,7 @@ class Levels(commands.Cog):
         # Enable leveling
         guild_settings['leveling_enabled'] = True
         await self.data_manager.set(guild_key, guild_settings)
+        pipeline.invalidate_settings(ctx.guild.id)
         
         # Send confirmation
         embed = discord.Embed(
@@ -326,6 +322,7 @@ class Levels(commands.Cog):
         # Disable leveling
         guild_settings['leveling_enabled'] = False
         await self.data_manager.set(guild_key, guild_settings)
+        pipeline.invalidate_settings(ctx.guild.id)
         
         # Send confirmation
         embed = discord.Embed(
@@ -395,6 +392,7 @@ class Levels(commands.Cog):
             
         # Save settings
         await self.data_manager.set(guild_key, guild_settings)
+        pipeline.invalidate_settings(ctx.guild.id)
         
         # Send confirmation
         await ctx.send(embed=embed)
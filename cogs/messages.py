@@ -4,6 +4,7 @@ import logging
 
 from utils.database import db
 from utils.embed_creator import EmbedCreator
+from utils.message_pipeline import pipeline
 from config import CONFIG
 
 logger = logging.getLogger('discord_bot')
@@ -13,17 +14,15 @@ class Messages(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
+        pipeline.register(bot, 'messages.count', self.count_message, order=10)
         logger.info("Messages cog initialized")
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Track messages from users"""
-        # Skip if message is from a bot or in DMs
-        if message.author.bot or not message.guild:
-            return
-        
-        # Track the message
-        db.increment_message_count(message.guild.id, message.author.id)
+    def cog_unload(self):
+        pipeline.unregister('messages.count')
+    
+    async def count_message(self, context):
+        """Track messages from users (message pipeline stage)"""
+        db.increment_message_count(context.guild.id, context.author.id)
     
     @commands.hybrid_command(name="messages", aliases=["m"], description="Check your message stats or someone else's")
     async def messages(self, ctx, member: discord.Member = None):
@@ -40,7 +39,14 @@ class Messages(commands.Cog):
         stats = db.get_message_stats(ctx.guild.id, member.id)
         
         # Create embed
-        embed = EmbedCreator.create_message_stats_embed(member, stats)
+        embed = EmbedCreator.create_message_stats_embed(member, stats['all_time'])
+        embed.add_field(name="Today", value=str(stats['today']), inline=True)
+        embed.add_field(name="This Week", value=str(stats['week']), inline=True)
+        embed.add_field(name="This Month", value=str(stats['month']), inline=True)
+        
+        rank = db.get_message_rank(ctx.guild.id, member.id)
+        if rank:
+            embed.add_field(name="Rank", value=f"#{rank}", inline=True)
         
         await ctx.send(embed=embed)
     
@@ -53,15 +59,7 @@ class Messages(commands.Cog):
             member: The member whose stats to reset.
         """
         # Reset the stats in the database
-        guild_id, user_id = str(ctx.guild.id), str(member.id)
-        
-        if 'message_counts' in db.data and guild_id in db.data['message_counts'] and user_id in db.data['message_counts'][guild_id]:
-            db.data['message_counts'][guild_id][user_id] = {
-                'all_time': 0,
-                'daily': {}
-            }
-            db._save_data()
-            
+        if db.reset_message_stats(ctx.guild.id, member.id):
             embed = EmbedCreator.create_success_embed(
                 "Stats Reset",
                 f"Message statistics for {member.mention} have been reset."
@@ -75,45 +73,84 @@ class Messages(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.hybrid_command(name="topmessages", description="Show top message senders in the server")
-    async def topmessages(self, ctx, period: str = "all_time"):
+    async def topmessages(self, ctx, period: str = "all_time", page: int = 1):
         """Show the top message senders
         
         Args:
-            period: The time period to show (all_time or today)
+            period: The time period to show (all_time, today, week or month)
+            page: The page of the leaderboard to show
         """
-        if period.lower() not in ["all_time", "today"]:
+        if period.lower() not in ["all_time", "today", "week", "month"]:
             embed = EmbedCreator.create_error_embed(
                 "Invalid Period",
-                "Valid periods are: all_time, today"
+                "Valid periods are: all_time, today, week, month"
             )
             await ctx.send(embed=embed)
             return
         
-        # Get the leaderboard
-        leaderboard = db.get_message_leaderboard(ctx.guild.id, 10, period.lower())
+        page = max(page, 1)
+        
+        # Get the requested page of the leaderboard
+        leaderboard = db.get_message_leaderboard(ctx.guild.id, 10, period.lower(), page=page)
         
         if not leaderboard:
             embed = EmbedCreator.create_info_embed(
                 "Empty Leaderboard",
                 f"No message data for {period.replace('_', ' ')} has been tracked yet."
+                if page == 1 else f"There is no page {page} of this leaderboard."
             )
             await ctx.send(embed=embed)
             return
         
-        # Format the leaderboard entries
-        entries = []
-        for entry in leaderboard:
-            member = ctx.guild.get_member(int(entry['user_id']))
-            name = member.display_name if member else f"Unknown User ({entry['user_id']})"
-            entries.append({
-                "name": name,
-                "value": entry['count']
-            })
-        
         # Create embed
-        embed = EmbedCreator.create_leaderboard_embed("messages", entries)
+        embed = EmbedCreator.create_leaderboard_embed("messages", leaderboard, start=(page - 1) * 10 + 1)
         embed.title = f"📊 Message Leaderboard ({period.replace('_', ' ')})"
         
+        rank = db.get_message_rank(ctx.guild.id, ctx.author.id, period.lower())
+        footer = f"Page {page}"
+        if rank:
+            footer += f" • Your rank: #{rank}"
+        embed.set_footer(text=footer)
+        
+        await ctx.send(embed=embed)
+
+    @commands.command(name="pipelinestats")
+    @commands.is_owner()
+    async def pipelinestats(self, ctx, reset: str = None):
+        """Show how long each message pipeline stage takes
+        
+        Args:
+            reset: Pass "reset" to clear the statistics
+        """
+        if reset and reset.lower() == "reset":
+            pipeline.reset_stats()
+            await ctx.send(embed=EmbedCreator.create_success_embed(
+                "Pipeline Stats Reset",
+                "Message pipeline timing statistics have been cleared."
+            ))
+            return
+        
+        stats = pipeline.get_stats()
+        if not stats:
+            await ctx.send(embed=EmbedCreator.create_info_embed(
+                "No Pipeline Stats",
+                "No message pipeline stages are registered."
+            ))
+            return
+        
+        embed = EmbedCreator.create_info_embed(
+            "Message Pipeline Stats",
+            f"Messages processed: **{pipeline.messages_processed}**"
+        )
+        for stage in stats:
+            embed.add_field(
+                name=stage['name'],
+                value=f"Calls: {stage['calls']}\n"
+                      f"Avg: {stage['avg_ms']:.3f} ms\n"
+                      f"Max: {stage['max_ms']:.3f} ms",
+                inline=True
+            )
+        
         await ctx.send(embed=embed)
 
 async def setup(bot):
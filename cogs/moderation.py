@@ -4,8 +4,11 @@ import logging
 import json
 import os
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import CONFIG
+from utils.scheduler import scheduler
+from utils.permission_executor import permission_executor, set_overwrite
+from utils.ban_cache import ban_cache
 
 logger = logging.getLogger('discord_bot')
 
@@ -23,7 +26,35 @@ class Moderation(commands.Cog):
         # Load settings
         self.load_settings()
         
+        # Timed mutes are ended by the scheduler, which persists them across restarts
+        scheduler.register('unmute', self.auto_unmute)
+        self.schedule_stored_mutes()
+        
+        # Ban events keep the cached ban lists current
+        ban_cache.attach(bot)
+        
         logger.info("Moderation cog initialized")
+    
+    def cog_unload(self):
+        scheduler.unregister('unmute')
+    
+    def get_unmute_job_id(self, guild_id, member_id):
+        """Get the scheduler job ID of a member's timed mute"""
+        return f"unmute:{guild_id}:{member_id}"
+    
+    def schedule_stored_mutes(self):
+        """Schedule timed mutes saved before the scheduler tracked them"""
+        for guild_id, guild_settings in self.moderation_settings.items():
+            for member_id, mute in guild_settings.get("mutes", {}).items():
+                job_id = self.get_unmute_job_id(guild_id, member_id)
+                if scheduler.get(job_id) is None:
+                    unmute_time = datetime.fromisoformat(mute["unmute_time"]).replace(tzinfo=timezone.utc)
+                    scheduler.schedule('unmute', unmute_time.timestamp(), {
+                        "guild_id": guild_id,
+                        "member_id": member_id,
+                        "role_id": mute["role_id"],
+                        "channel_id": None
+                    }, job_id=job_id)
         
     def load_settings(self):
         """Load moderation settings from file"""
@@ -385,46 +416,9 @@ class Moderation(commands.Cog):
         """Unban a member from the server
         
         Args:
-            user_name: The username of the banned member (e.g. User#1234)
+            user_name: The username, ID or mention of the banned member (e.g. User#1234)
         """
-        # Get ban list
-        banned_users = [entry async for entry in ctx.guild.bans()]
-        
-        # Find user in ban list
-        for ban_entry in banned_users:
-            user = ban_entry.user
-            
-            # Check if username matches
-            if user.name.lower() == user_name.lower() or str(user).lower() == user_name.lower():
-                # Unban the user
-                try:
-                    await ctx.guild.unban(user)
-                    
-                    embed = discord.Embed(
-                        title=f"✅ User Unbanned",
-                        description=f"{user} has been unbanned from the server.",
-                        color=CONFIG['colors']['success']
-                    )
-                    
-                    await ctx.send(embed=embed)
-                    return
-                except Exception as e:
-                    error_embed = discord.Embed(
-                        title="❌ Error",
-                        description=f"Could not unban {user}: {str(e)}",
-                        color=CONFIG['colors']['error']
-                    )
-                    await ctx.send(embed=error_embed)
-                    return
-        
-        # User not found
-        embed = discord.Embed(
-            title="❌ Not Found",
-            description=f"Could not find a banned user with the name '{user_name}'. Please check the spelling.",
-            color=CONFIG['colors']['error']
-        )
-        
-        await ctx.send(embed=embed)
+        await ban_cache.unban(ctx, user_name)
     
     @mod.command(name="purge")
     @commands.has_permissions(manage_messages=True)
@@ -544,9 +538,39 @@ class Moderation(commands.Cog):
                 )
                 
                 # Set role permissions for all channels
-                for channel in ctx.guild.channels:
-                    await channel.set_permissions(muted_role, speak=False, send_messages=False, add_reactions=False)
-                    
+                status = await ctx.send(embed=discord.Embed(
+                    title="⏳ Setting Up Muted Role",
+                    description=f"Updating {len(ctx.guild.channels)} channels...",
+                    color=CONFIG['colors']['default']
+                ))
+                
+                async def report(done, total):
+                    try:
+                        await status.edit(embed=discord.Embed(
+                            title="⏳ Setting Up Muted Role",
+                            description=f"Updated {done}/{total} channels...",
+                            color=CONFIG['colors']['default']
+                        ))
+                    except discord.HTTPException:
+                        pass
+                
+                result = await permission_executor.apply(
+                    ctx.guild.channels,
+                    muted_role,
+                    set_overwrite(speak=False, send_messages=False, add_reactions=False),
+                    reason="Created for mute command",
+                    progress=report
+                )
+                
+                description = f"Muted role applied to {result['updated']} channels."
+                if result['failed']:
+                    description += f" {result['failed']} channels could not be updated; check my permissions in them."
+                await status.edit(embed=discord.Embed(
+                    title="✅ Muted Role Ready",
+                    description=description,
+                    color=CONFIG['colors']['success']
+                ))
+            
             except Exception as e:
                 error_embed = discord.Embed(
                     title="❌ Error",
@@ -659,33 +683,12 @@ class Moderation(commands.Cog):
                 self.save_settings()
                 
                 # Schedule unmute
-                await asyncio.sleep(seconds)
-                
-                # Check if still muted
-                if (guild_id in self.moderation_settings and 
-                    "mutes" in self.moderation_settings[guild_id] and
-                    str(member.id) in self.moderation_settings[guild_id]["mutes"]):
-                    
-                    # Remove from muted list
-                    del self.moderation_settings[guild_id]["mutes"][str(member.id)]
-                    self.save_settings()
-                    
-                    # Remove role if member still in server
-                    try:
-                        member = ctx.guild.get_member(member.id)
-                        if member and muted_role in member.roles:
-                            await member.remove_roles(muted_role, reason="Mute duration expired")
-                            
-                            # Notify channel
-                            unmute_embed = discord.Embed(
-                                title=f"🔊 Member Unmuted",
-                                description=f"{member.mention} has been automatically unmuted (duration expired).",
-                                color=CONFIG['colors']['success']
-                            )
-                            
-                            await ctx.send(embed=unmute_embed)
-                    except Exception as e:
-                        logger.error(f"Failed to auto-unmute {member.id}: {e}")
+                scheduler.schedule('unmute', unmute_time.replace(tzinfo=timezone.utc).timestamp(), {
+                    "guild_id": guild_id,
+                    "member_id": str(member.id),
+                    "role_id": str(muted_role.id),
+                    "channel_id": ctx.channel.id
+                }, job_id=self.get_unmute_job_id(guild_id, member.id))
                 
         except Exception as e:
             error_embed = discord.Embed(
@@ -738,6 +741,7 @@ class Moderation(commands.Cog):
                 
                 del self.moderation_settings[guild_id]["mutes"][str(member.id)]
                 self.save_settings()
+            scheduler.cancel(self.get_unmute_job_id(guild_id, member.id))
             
             # Create unmute embed
             embed = discord.Embed(
@@ -767,6 +771,48 @@ class Moderation(commands.Cog):
                 color=CONFIG['colors']['error']
             )
             await ctx.send(embed=error_embed)
+    
+    async def auto_unmute(self, job):
+        """Remove the Muted role when a timed mute expires (scheduler job)"""
+        await self.bot.wait_until_ready()
+        
+        payload = job['payload']
+        guild_id = payload["guild_id"]
+        member_id = payload["member_id"]
+        
+        # Check if still muted
+        if (guild_id not in self.moderation_settings or
+            "mutes" not in self.moderation_settings[guild_id] or
+            member_id not in self.moderation_settings[guild_id]["mutes"]):
+            return
+        
+        # Remove from muted list
+        del self.moderation_settings[guild_id]["mutes"][member_id]
+        self.save_settings()
+        
+        guild = self.bot.get_guild(int(guild_id))
+        if guild is None:
+            return
+        
+        # Remove role if member still in server
+        try:
+            member = guild.get_member(int(member_id))
+            muted_role = guild.get_role(int(payload["role_id"]))
+            if member and muted_role and muted_role in member.roles:
+                await member.remove_roles(muted_role, reason="Mute duration expired")
+                
+                # Notify channel
+                channel = guild.get_channel(payload["channel_id"]) if payload["channel_id"] else None
+                if channel:
+                    unmute_embed = discord.Embed(
+                        title=f"🔊 Member Unmuted",
+                        description=f"{member.mention} has been automatically unmuted (duration expired).",
+                        color=CONFIG['colors']['success']
+                    )
+                    
+                    await channel.send(embed=unmute_embed)
+        except Exception as e:
+            logger.error(f"Failed to auto-unmute {member_id}: {e}")
 
 async def setup(bot):
     await bot.add_cog(Moderation(bot))
\ No newline at end of file
@@ -1,14 +1,44 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
 import json
 import os
 import asyncio
 import datetime
+import time
 from config import CONFIG
+from utils.scheduler import scheduler
 
 logger = logging.getLogger('discord_bot')
 
+class PollButton(discord.ui.Button):
+    """Button for voting on one option of a button poll"""
+    
+    def __init__(self, option, label):
+        super().__init__(
+            style=discord.ButtonStyle.secondary,
+            label=label[:80],
+            custom_id=f"poll_vote:{option}"
+        )
+        self.option = option
+    
+    async def callback(self, interaction: discord.Interaction):
+        """Handle button click"""
+        cog = interaction.client.get_cog('Polls')
+        if cog is None:
+            await interaction.response.send_message("Polls are not available right now.", ephemeral=True)
+            return
+        
+        await cog.record_button_vote(interaction, str(interaction.message.id), self.option)
+
+class PollButtonView(discord.ui.View):
+    """View with one vote button per poll option"""
+    
+    def __init__(self, options):
+        super().__init__(timeout=None)  # Persistent view
+        for i, option in enumerate(options):
+            self.add_item(PollButton(i, f"{i+1}. {option}"))
+
 class Polls(commands.Cog):
     """Poll creation system for voting"""
     
@@ -17,13 +47,68 @@ class Polls(commands.Cog):
         self.active_polls = {}
         self.data_file = 'data/polls_data.json'
         
+        # Vote counts per option of each poll, rebuilt from the recorded votes.
+        # Polls saved before votes were recorded are still counted from reactions.
+        self.tallies = {}
+        self.dirty = False
+        
+        # Live results: pending edit task and last edit time per poll
+        self.refresh_interval = CONFIG['polls'].get('live_results_interval', 5)
+        self.refresh_tasks = {}
+        self.last_refresh = {}
+        
+        # Vote button views of button polls
+        self.poll_views = {}
+        
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         
         # Load active polls
         self.load_polls()
+        self.register_poll_views()
+        
+        # Timed polls are ended by the scheduler, which persists them across restarts
+        scheduler.register('poll_end', self.end_timed_poll)
+        self.schedule_stored_polls()
+        
+        # Votes are saved in batches
+        self.save_votes.change_interval(seconds=CONFIG['polls'].get('save_interval', 10))
+        self.save_votes.start()
         
         logger.info("Polls cog initialized")
+    
+    def cog_unload(self):
+        scheduler.unregister('poll_end')
+        self.save_votes.cancel()
+        for task in self.refresh_tasks.values():
+            task.cancel()
+        for view in self.poll_views.values():
+            view.stop()
+        if self.dirty:
+            self.save_polls()
+    
+    @tasks.loop(seconds=10)
+    async def save_votes(self):
+        """Save polls if votes were recorded since the last save"""
+        if self.dirty:
+            self.save_polls()
+    
+    def get_poll_job_id(self, poll_id):
+        """Get the scheduler job ID of a timed poll"""
+        return f"poll_end:{poll_id}"
+    
+    def schedule_stored_polls(self):
+        """Schedule timed polls saved before the scheduler tracked them"""
+        for guild_id, guild_polls in self.active_polls.items():
+            for poll_id, poll_data in guild_polls.items():
+                if not poll_data.get("timed") or scheduler.get(self.get_poll_job_id(poll_id)):
+                    continue
+                
+                end_time = datetime.datetime.fromisoformat(poll_data["end_time"]).replace(tzinfo=datetime.timezone.utc)
+                scheduler.schedule('poll_end', end_time.timestamp(), {
+                    "guild_id": guild_id,
+                    "poll_id": poll_id
+                }, job_id=self.get_poll_job_id(poll_id))
         
     def load_polls(self):
         """Load active polls from file"""
@@ -37,15 +122,225 @@ class Polls(commands.Cog):
         except Exception as e:
             logger.error(f"Error loading polls: {e}")
             self.active_polls = {}
+        
+        self.tallies = {}
+        for guild_polls in self.active_polls.values():
+            for poll_id, poll_data in guild_polls.items():
+                self.tallies[poll_id] = self.count_votes(poll_data)
             
     def save_polls(self):
         """Save active polls to file"""
         try:
             with open(self.data_file, 'w') as f:
                 json.dump(self.active_polls, f, indent=4)
+            self.dirty = False
         except Exception as e:
             logger.error(f"Error saving polls: {e}")
     
+    def register_poll_views(self):
+        """Attach vote buttons to stored button polls, without fetching their messages"""
+        for guild_polls in self.active_polls.values():
+            for poll_id, poll_data in guild_polls.items():
+                if poll_data.get("mode") == "buttons":
+                    view = self.poll_views[poll_id] = PollButtonView(poll_data["options"])
+                    self.bot.add_view(view, message_id=int(poll_id))
+    
+    def count_votes(self, poll_data):
+        """Count the recorded votes of a poll per option"""
+        tally = [0] * len(poll_data["options"])
+        for choice in poll_data.get("votes", {}).values():
+            # Multi-choice polls record a list of options per voter
+            for option in (choice if isinstance(choice, list) else [choice]):
+                tally[option] += 1
+        return tally
+    
+    def get_tally(self, poll_id, poll_data):
+        """Get the live vote counts of a poll, counting the recorded votes on first use"""
+        tally = self.tallies.get(poll_id)
+        if tally is None:
+            tally = self.tallies[poll_id] = self.count_votes(poll_data)
+        return tally
+    
+    def format_result(self, count, total_votes):
+        """Format an option's share of the votes as a progress bar"""
+        percentage = (count / total_votes * 100) if total_votes > 0 else 0
+        
+        bar_length = 20
+        filled_length = int(bar_length * percentage / 100) if percentage > 0 else 0
+        bar = "█" * filled_length + "░" * (bar_length - filled_length)
+        
+        return f"{bar} {count} votes ({percentage:.1f}%)"
+    
+    def build_poll_embed(self, guild, poll_id, poll_data):
+        """Build the poll embed with live results"""
+        tally = self.get_tally(poll_id, poll_data)
+        total_votes = sum(tally)
+        
+        embed = discord.Embed(
+            title=f"📊 {poll_data['question']}",
+            description=self.get_voting_hint(poll_data),
+            color=CONFIG['colors']['info'],
+            timestamp=datetime.datetime.fromisoformat(poll_data["created_at"]).replace(tzinfo=datetime.timezone.utc)
+        )
+        
+        for i, option in enumerate(poll_data["options"]):
+            marker = poll_data["emojis"][i] if i < len(poll_data["emojis"]) else f"**{i+1}.**"
+            embed.add_field(
+                name=f"Option {i+1}",
+                value=f"{marker} {option}\n{self.format_result(tally[i], total_votes)}",
+                inline=False
+            )
+        
+        if poll_data["timed"] and poll_data["end_time"]:
+            end_time = datetime.datetime.fromisoformat(poll_data["end_time"])
+            embed.add_field(
+                name="Poll Ends",
+                value=f"📆 {end_time.strftime('%Y-%m-%d %H:%M UTC')}",
+                inline=False
+            )
+        
+        author = guild.get_member(int(poll_data["author_id"])) if guild else None
+        author_text = f" | Created by {author}" if author else ""
+        embed.set_footer(text=f"Poll ID: {poll_id} | {total_votes} votes{author_text}")
+        
+        return embed
+    
+    def get_voting_hint(self, poll_data):
+        """Get the voting instructions shown on a poll"""
+        if poll_data.get("mode") != "buttons":
+            return "React with the corresponding emoji to vote!"
+        if poll_data.get("multi"):
+            return "Click the buttons below to vote! You can pick several options."
+        return "Click a button below to vote! Click it again to take your vote back."
+    
+    async def record_button_vote(self, interaction, poll_id, option):
+        """Record a button vote in the poll's ledger and confirm it to the voter"""
+        poll_data = self.active_polls.get(str(interaction.guild_id), {}).get(poll_id)
+        if not poll_data or option >= len(poll_data["options"]):
+            await interaction.response.send_message("This poll has ended.", ephemeral=True)
+            return
+        
+        user_id = str(interaction.user.id)
+        votes = poll_data["votes"]
+        tally = self.get_tally(poll_id, poll_data)
+        option_name = poll_data["options"][option]
+        
+        if poll_data.get("multi"):
+            choices = votes.setdefault(user_id, [])
+            if option in choices:
+                choices.remove(option)
+                tally[option] -= 1
+                if not choices:
+                    del votes[user_id]
+                response = f"Removed your vote for **{option_name}**."
+            else:
+                choices.append(option)
+                tally[option] += 1
+                response = f"Added your vote for **{option_name}**."
+        else:
+            previous = votes.get(user_id)
+            if previous == option:
+                del votes[user_id]
+                tally[option] -= 1
+                response = f"Removed your vote for **{option_name}**."
+            else:
+                votes[user_id] = option
+                tally[option] += 1
+                if previous is not None:
+                    tally[previous] -= 1
+                response = f"You voted for **{option_name}**."
+        
+        self.dirty = True
+        self.schedule_refresh(str(interaction.guild_id), poll_id)
+        await interaction.response.send_message(response, ephemeral=True)
+    
+    def schedule_refresh(self, guild_id, poll_id):
+        """Update a poll's live results, at most once per refresh interval"""
+        if poll_id not in self.refresh_tasks:
+            self.refresh_tasks[poll_id] = asyncio.create_task(self.refresh_poll(guild_id, poll_id))
+    
+    async def refresh_poll(self, guild_id, poll_id):
+        """Edit a poll message to show the current results"""
+        try:
+            delay = self.last_refresh.get(poll_id, 0) + self.refresh_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            # Votes arriving from here on schedule the next refresh
+            self.refresh_tasks.pop(poll_id, None)
+        
+        poll_data = self.active_polls.get(guild_id, {}).get(poll_id)
+        guild = self.bot.get_guild(int(guild_id))
+        channel = guild.get_channel(int(poll_data["channel_id"])) if guild and poll_data else None
+        if not channel:
+            return
+        
+        self.last_refresh[poll_id] = time.monotonic()
+        try:
+            await channel.get_partial_message(int(poll_id)).edit(
+                embed=self.build_poll_embed(guild, poll_id, poll_data)
+            )
+        except discord.HTTPException as e:
+            logger.error(f"Error updating poll {poll_id} results: {e}")
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        """Record a vote, replacing the voter's previous vote"""
+        if payload.user_id == self.bot.user.id:
+            return
+        
+        guild_id, poll_id = str(payload.guild_id), str(payload.message_id)
+        poll_data = self.active_polls.get(guild_id, {}).get(poll_id)
+        if not poll_data or "votes" not in poll_data or str(payload.emoji) not in poll_data["emojis"]:
+            return
+        
+        option = poll_data["emojis"].index(str(payload.emoji))
+        votes = poll_data["votes"]
+        tally = self.get_tally(poll_id, poll_data)
+        
+        previous = votes.get(str(payload.user_id))
+        if previous == option:
+            return
+        
+        votes[str(payload.user_id)] = option
+        tally[option] += 1
+        if previous is not None:
+            tally[previous] -= 1
+        
+        self.dirty = True
+        self.schedule_refresh(guild_id, poll_id)
+        
+        # One vote per user: take back the reaction of the previous vote
+        channel = self.bot.get_channel(payload.channel_id)
+        if previous is not None and channel:
+            try:
+                await channel.get_partial_message(payload.message_id).remove_reaction(
+                    poll_data["emojis"][previous], discord.Object(id=payload.user_id)
+                )
+            except discord.HTTPException:
+                pass
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        """Withdraw a vote when its reaction is removed"""
+        guild_id, poll_id = str(payload.guild_id), str(payload.message_id)
+        poll_data = self.active_polls.get(guild_id, {}).get(poll_id)
+        if not poll_data or "votes" not in poll_data or str(payload.emoji) not in poll_data["emojis"]:
+            return
+        
+        option = poll_data["emojis"].index(str(payload.emoji))
+        votes = poll_data["votes"]
+        
+        # Ignore the removal of a reaction that was replaced by a newer vote
+        if votes.get(str(payload.user_id)) != option:
+            return
+        
+        del votes[str(payload.user_id)]
+        self.get_tally(poll_id, poll_data)[option] -= 1
+        
+        self.dirty = True
+        self.schedule_refresh(guild_id, poll_id)
+    
     @commands.group(name="poll", invoke_without_command=True)
     async def poll(self, ctx):
         """Poll commands"""
@@ -59,6 +354,7 @@ class Polls(commands.Cog):
         commands = [
             f"`{CONFIG['prefix']}poll create \"Question?\" \"Option 1\" \"Option 2\" ...` - Create a poll",
             f"`{CONFIG['prefix']}poll timed \"Question?\" 1h \"Option 1\" \"Option 2\" ...` - Create a timed poll",
+            f"`{CONFIG['prefix']}poll buttons [multi] \"Question?\" \"Option 1\" \"Option 2\" ...` - Create a poll with vote buttons",
             f"`{CONFIG['prefix']}poll end <poll_id>` - End a poll early and show results",
             f"`{CONFIG['prefix']}poll list` - View active polls in this server",
             f"`{CONFIG['prefix']}poll quick \"Question?\"` - Create a quick yes/no poll"
@@ -72,7 +368,7 @@ class Polls(commands.Cog):
         
         embed.add_field(
             name="How to Vote",
-            value="React to the poll message with the corresponding emoji.",
+            value="React to the poll message with the corresponding emoji, or click a button on button polls.",
             inline=False
         )
         
@@ -147,8 +443,10 @@ class Polls(commands.Cog):
             "author_id": str(ctx.author.id),
             "created_at": datetime.datetime.utcnow().isoformat(),
             "timed": False,
-            "end_time": None
+            "end_time": None,
+            "votes": {}
         }
+        self.tallies[str(poll_message.id)] = [0] * len(options)
         
         self.save_polls()
     
@@ -269,13 +567,84 @@ class Polls(commands.Cog):
             "author_id": str(ctx.author.id),
             "created_at": datetime.datetime.utcnow().isoformat(),
             "timed": True,
-            "end_time": end_time.isoformat()
+            "end_time": end_time.isoformat(),
+            "votes": {}
         }
+        self.tallies[str(poll_message.id)] = [0] * len(options)
         
         self.save_polls()
         
         # Schedule poll end
-        self.bot.loop.create_task(self.end_poll_after(ctx.guild.id, poll_message.id, seconds))
+        scheduler.schedule('poll_end', end_time.replace(tzinfo=datetime.timezone.utc).timestamp(), {
+            "guild_id": guild_id,
+            "poll_id": str(poll_message.id)
+        }, job_id=self.get_poll_job_id(poll_message.id))
+    
+    @poll.command(name="buttons")
+    @commands.has_permissions(manage_messages=True)
+    async def button_poll(self, ctx, *args):
+        """Create a poll voted on with buttons
+        
+        Args:
+            args: An optional "multi" flag to allow picking several options,
+                then the poll question and options (min 2, max 25)
+        """
+        multi = bool(args) and args[0].lower() == "multi"
+        if multi:
+            args = args[1:]
+        question, options = (args[0], args[1:]) if args else ("", ())
+        
+        # Validate options
+        if len(options) < 2:
+            embed = discord.Embed(
+                title="❌ Not Enough Options",
+                description="You need to provide at least 2 options for a poll.",
+                color=CONFIG['colors']['error']
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        if len(options) > 25:
+            embed = discord.Embed(
+                title="❌ Too Many Options",
+                description="You can only have up to 25 options in a button poll.",
+                color=CONFIG['colors']['error']
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        poll_data = {
+            "question": question,
+            "options": list(options),
+            "emojis": [],
+            "channel_id": str(ctx.channel.id),
+            "author_id": str(ctx.author.id),
+            "created_at": datetime.datetime.utcnow().isoformat(),
+            "timed": False,
+            "end_time": None,
+            "mode": "buttons",
+            "multi": multi,
+            "votes": {}
+        }
+        
+        # Send poll with its vote buttons
+        view = PollButtonView(options)
+        poll_message = await ctx.send(embed=self.build_poll_embed(ctx.guild, "pending", poll_data), view=view)
+        
+        # Store poll in active polls
+        guild_id = str(ctx.guild.id)
+        poll_id = str(poll_message.id)
+        if guild_id not in self.active_polls:
+            self.active_polls[guild_id] = {}
+        
+        self.active_polls[guild_id][poll_id] = poll_data
+        self.tallies[poll_id] = [0] * len(options)
+        self.poll_views[poll_id] = view
+        
+        self.save_polls()
+        
+        # Show the real poll ID
+        self.schedule_refresh(guild_id, poll_id)
     
     @poll.command(name="quick")
     async def quick_poll(self, ctx, *, question: str):
@@ -337,16 +706,13 @@ class Polls(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        # Get the poll message
+        # End the poll in its channel
         try:
             channel = ctx.guild.get_channel(int(poll_data["channel_id"]))
             if not channel:
                 raise ValueError("Channel not found")
-                
-            message = await channel.fetch_message(poll_id)
             
-            # End the poll
-            await self.end_poll_message(ctx.guild.id, poll_id, message)
+            await self.end_poll_message(ctx.guild.id, poll_id, channel)
             
         except Exception as e:
             logger.error(f"Error ending poll: {e}")
@@ -354,6 +720,7 @@ class Polls(commands.Cog):
             # Remove from active polls anyway
             del self.active_polls[guild_id][str(poll_id)]
             self.save_polls()
+            self.forget_poll(str(poll_id))
             
             embed = discord.Embed(
                 title="❌ Error",
@@ -416,22 +783,26 @@ class Polls(commands.Cog):
         
         await ctx.send(embed=embed)
     
-    async def end_poll_message(self, guild_id, poll_id, message):
-        """End a poll and show results"""
+    async def end_poll_message(self, guild_id, poll_id, channel):
+        """End a poll and post its results in the poll's channel"""
         guild_id = str(guild_id)
         poll_id = str(poll_id)
         
         # Get poll data
         poll_data = self.active_polls[guild_id][poll_id]
         
-        # Get the poll results
-        results = []
-        for i, emoji in enumerate(poll_data["emojis"]):
-            # Get reaction count
-            reaction = discord.utils.get(message.reactions, emoji=emoji)
-            count = reaction.count - 1 if reaction else 0  # Subtract bot's reaction
-            
-            results.append((poll_data["options"][i], count))
+        # Get the poll results from the recorded votes
+        if "votes" in poll_data:
+            tally = self.get_tally(poll_id, poll_data)
+        else:
+            # Polls created before votes were recorded: count the reactions
+            message = await channel.fetch_message(int(poll_id))
+            tally = []
+            for emoji in poll_data["emojis"]:
+                reaction = discord.utils.get(message.reactions, emoji=emoji)
+                tally.append(reaction.count - 1 if reaction else 0)  # Subtract bot's reaction
+        
+        results = list(zip(poll_data["options"], tally))
         
         # Sort results by vote count (descending)
         results.sort(key=lambda x: x[1], reverse=True)
@@ -449,17 +820,9 @@ class Polls(commands.Cog):
         
         # Add results
         for i, (option, count) in enumerate(results):
-            # Calculate percentage
-            percentage = (count / total_votes * 100) if total_votes > 0 else 0
-            
-            # Create progress bar
-            bar_length = 20
-            filled_length = int(bar_length * percentage / 100) if percentage > 0 else 0
-            bar = "█" * filled_length + "░" * (bar_length - filled_length)
-            
             embed.add_field(
                 name=f"{i+1}. {option}",
-                value=f"{bar} {count} votes ({percentage:.1f}%)",
+                value=self.format_result(count, total_votes),
                 inline=False
             )
         
@@ -467,18 +830,38 @@ class Polls(commands.Cog):
         embed.set_footer(text=f"Poll ID: {poll_id}")
         
         # Send results
-        await message.channel.send(embed=embed)
+        await channel.send(embed=embed)
+        
+        # Take the vote buttons off ended button polls
+        if poll_id in self.poll_views:
+            try:
+                await channel.get_partial_message(int(poll_id)).edit(view=None)
+            except discord.HTTPException as e:
+                logger.error(f"Error removing buttons from poll {poll_id}: {e}")
         
         # Remove from active polls
         del self.active_polls[guild_id][poll_id]
         self.save_polls()
+        self.forget_poll(poll_id)
+    
+    def forget_poll(self, poll_id):
+        """Drop the in-memory state and pending jobs of a removed poll"""
+        self.tallies.pop(poll_id, None)
+        self.last_refresh.pop(poll_id, None)
+        task = self.refresh_tasks.pop(poll_id, None)
+        if task:
+            task.cancel()
+        view = self.poll_views.pop(poll_id, None)
+        if view:
+            view.stop()
+        scheduler.cancel(self.get_poll_job_id(poll_id))
     
-    async def end_poll_after(self, guild_id, poll_id, seconds):
-        """End a poll after a specified duration"""
-        await asyncio.sleep(seconds)
+    async def end_timed_poll(self, job):
+        """End a timed poll when its time is up (scheduler job)"""
+        await self.bot.wait_until_ready()
         
-        guild_id = str(guild_id)
-        poll_id = str(poll_id)
+        guild_id = job['payload']["guild_id"]
+        poll_id = job['payload']["poll_id"]
         
         # Check if poll still exists
         if (guild_id not in self.active_polls or
@@ -497,11 +880,9 @@ class Polls(commands.Cog):
             channel = guild.get_channel(int(poll_data["channel_id"]))
             if not channel:
                 raise ValueError("Channel not found")
-                
-            message = await channel.fetch_message(int(poll_id))
             
             # End the poll
-            await self.end_poll_message(guild_id, poll_id, message)
+            await self.end_poll_message(guild_id, poll_id, channel)
             
         except Exception as e:
             logger.error(f"Error ending timed poll: {e}")
@@ -510,6 +891,7 @@ class Polls(commands.Cog):
             if guild_id in self.active_polls and poll_id in self.active_polls[guild_id]:
                 del self.active_polls[guild_id][poll_id]
                 self.save_polls()
+                self.forget_poll(poll_id)
 
 async def setup(bot):
     await bot.add_cog(Polls(bot))
\ No newline at end of file
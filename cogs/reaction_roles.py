@@ -2,6 +2,9 @@ import discord
 from discord.ext import commands
 import logging
 import asyncio
+import hashlib
+import json
+import os
 
 from utils.database import db
 from utils.embed_creator import EmbedCreator
@@ -9,6 +12,17 @@ from config import CONFIG
 
 logger = logging.getLogger('discord_bot')
 
+ROLE_SELECT_ID = "reaction_roles:select"
+
+def get_view_version(roles_data):
+    """Get a fingerprint of the dropdown a reaction role message should show
+    
+    Messages sent before the dropdown had a fixed custom ID have no stored
+    version, so they never match.
+    """
+    definition = json.dumps([ROLE_SELECT_ID, [[role['role_id'], role['emoji']] for role in roles_data]])
+    return hashlib.sha1(definition.encode()).hexdigest()[:16]
+
 class RoleSelect(discord.ui.Select):
     """Dropdown for selecting roles"""
     
@@ -29,77 +43,17 @@ class RoleSelect(discord.ui.Select):
             placeholder="Select roles...",
             min_values=0,
             max_values=min(len(options), 25),  # Max 25 options in a select
-            options=options
+            options=options,
+            custom_id=ROLE_SELECT_ID  # Fixed so the view can be registered after a restart
         )
     
     async def callback(self, interaction: discord.Interaction):
         """Handle role selection"""
-        # Get selected role IDs
-        selected_role_ids = [int(value) for value in self.values]
-        
-        try:
-            # Get the member
-            member = interaction.user
-            
-            # Get all selectable roles
-            selectable_roles = [int(option.value) for option in self.options]
-            
-            # Get member's current roles
-            current_role_ids = [role.id for role in member.roles]
-            
-            # Determine roles to add and remove
-            roles_to_add = [
-                interaction.guild.get_role(role_id) 
-                for role_id in selected_role_ids 
-                if role_id not in current_role_ids
-            ]
-            
-            roles_to_remove = [
-                interaction.guild.get_role(role_id) 
-                for role_id in selectable_roles 
-                if role_id not in selected_role_ids and role_id in current_role_ids
-            ]
-            
-            # Remove roles that are None (not found in the guild)
-            roles_to_add = [role for role in roles_to_add if role is not None]
-            roles_to_remove = [role for role in roles_to_remove if role is not None]
-            
-            # Apply role changes
-            if roles_to_add:
-                await member.add_roles(*roles_to_add, reason="Reaction role selection")
-            
-            if roles_to_remove:
-                await member.remove_roles(*roles_to_remove, reason="Reaction role selection")
-            
-            # Create response message
-            response = []
-            if roles_to_add:
-                role_names = [role.name for role in roles_to_add]
-                response.append(f"Added roles: {', '.join(role_names)}")
-            
-            if roles_to_remove:
-                role_names = [role.name for role in roles_to_remove]
-                response.append(f"Removed roles: {', '.join(role_names)}")
-            
-            if not response:
-                response.append("No role changes were made.")
-            
-            await interaction.response.send_message(
-                "\n".join(response),
-                ephemeral=True
-            )
-            
-        except discord.Forbidden:
-            await interaction.response.send_message(
-                "I don't have permission to manage your roles.",
-                ephemeral=True
-            )
-        except Exception as e:
-            logger.error(f"Error updating roles: {e}")
-            await interaction.response.send_message(
-                "An error occurred while updating your roles.",
-                ephemeral=True
-            )
+        await apply_role_selection(
+            interaction,
+            [int(value) for value in self.values],
+            [int(option.value) for option in self.options]
+        )
 
 class RoleView(discord.ui.View):
     """View containing the role selection dropdown"""
@@ -108,54 +62,239 @@ class RoleView(discord.ui.View):
         super().__init__(timeout=None)  # Persistent view
         self.add_item(RoleSelect(roles))
 
+async def send_ephemeral(interaction, content):
+    """Answer an interaction, or follow up if it was already answered"""
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True)
+    else:
+        await interaction.response.send_message(content, ephemeral=True)
+
+async def apply_role_selection(interaction, selected_role_ids, selectable_roles):
+    """Give a member the selected roles and take away the other selectable ones
+    
+    Args:
+        interaction: The dropdown interaction, answered (or followed up if it
+            was already answered) with an ephemeral summary
+        selected_role_ids: IDs of the roles the member picked
+        selectable_roles: IDs of every role in the dropdown
+    """
+    try:
+        # Get the member
+        member = interaction.user
+        
+        # Get member's current roles
+        current_role_ids = {role.id for role in member.roles}
+        
+        # Determine roles to add and remove
+        roles_to_add = [
+            interaction.guild.get_role(role_id) 
+            for role_id in selected_role_ids 
+            if role_id not in current_role_ids
+        ]
+        
+        roles_to_remove = [
+            interaction.guild.get_role(role_id) 
+            for role_id in selectable_roles 
+            if role_id not in selected_role_ids and role_id in current_role_ids
+        ]
+        
+        # Remove roles that are None (not found in the guild)
+        roles_to_add = [role for role in roles_to_add if role is not None]
+        roles_to_remove = [role for role in roles_to_remove if role is not None]
+        
+        # Apply role changes
+        if roles_to_add:
+            await member.add_roles(*roles_to_add, reason="Reaction role selection")
+        
+        if roles_to_remove:
+            await member.remove_roles(*roles_to_remove, reason="Reaction role selection")
+        
+        # Create response message
+        response = []
+        if roles_to_add:
+            role_names = [role.name for role in roles_to_add]
+            response.append(f"Added roles: {', '.join(role_names)}")
+        
+        if roles_to_remove:
+            role_names = [role.name for role in roles_to_remove]
+            response.append(f"Removed roles: {', '.join(role_names)}")
+        
+        if not response:
+            response.append("No role changes were made.")
+        
+        await send_ephemeral(interaction, "\n".join(response))
+    
+    except discord.Forbidden:
+        await send_ephemeral(interaction, "I don't have permission to manage your roles.")
+    except Exception as e:
+        logger.error(f"Error updating roles: {e}")
+        await send_ephemeral(interaction, "An error occurred while updating your roles.")
+
 class ReactionRoles(commands.Cog):
     """Reaction roles system"""
     
     def __init__(self, bot):
         self.bot = bot
+        self.data_file = 'data/reaction_role_views.json'
+        # Message ID -> {'channel_id', 'view_version'} of the dropdown each message shows
+        self.message_views = {}
+        self.views_synced = False
+        
+        # Create data directory if it doesn't exist
+        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        self.load_settings()
+        
         logger.info("ReactionRoles cog initialized")
         
-        # Register persistent view
-        # This will be populated when the bot starts
+        # Register persistent views
         self.register_views()
     
-    def register_views(self):
-        """Register persistent views for reaction roles"""
-        # This will be called on bot startup to register all existing reaction role messages
-        # We'll actually do this in the on_ready event to ensure the bot is fully ready
+    async def cog_load(self):
+        # Cogs loaded after the bot is ready never see on_ready
+        if self.bot.is_ready():
+            asyncio.create_task(self.sync_views())
+    
+    def load_settings(self):
+        """Load the stored dropdown versions of reaction role messages"""
+        try:
+            if os.path.exists(self.data_file):
+                with open(self.data_file, 'r') as f:
+                    self.message_views = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading reaction role views: {e}")
+            self.message_views = {}
+    
+    def save_settings(self):
+        """Save the dropdown versions of reaction role messages"""
+        try:
+            with open(self.data_file, 'w') as f:
+                json.dump(self.message_views, f, indent=4)
+        except Exception as e:
+            logger.error(f"Error saving reaction role views: {e}")
+    
+    def build_view(self, guild, roles_data):
+        """Build the dropdown shown on a reaction role message from stored roles
+        
+        Role names come from the guild cache; descriptions were never stored,
+        so every option gets the default one.
+        """
+        roles = []
+        for role_data in roles_data:
+            role = guild.get_role(int(role_data['role_id']))
+            name = role.name if role else str(role_data['role_id'])
+            roles.append({
+                'id': int(role_data['role_id']),
+                'name': name,
+                'description': f"Get the {name} role",
+                'emoji': role_data['emoji']
+            })
+        return RoleView(roles)
     
     @commands.Cog.listener()
     async def on_ready(self):
-        """Register all existing reaction role views when the bot starts"""
-        # Get all reaction role messages from the database
-        all_reaction_roles = db.data.get('reaction_roles', {})
+        """Update outdated reaction role messages when the bot starts"""
+        await self.sync_views()
+    
+    async def sync_views(self):
+        """Put the current dropdown on messages whose stored version is outdated
         
-        for guild_id, guild_data in all_reaction_roles.items():
+        Runs once per process, with one message edit per outdated message.
+        Messages sent before channels were recorded can't be edited without
+        searching for them; they are updated on their first interaction.
+        """
+        if self.views_synced:
+            return
+        self.views_synced = True
+        
+        updated = 0
+        unknown = 0
+        for guild_id, guild_data in db.get_all_reaction_roles().items():
+            guild = self.bot.get_guild(int(guild_id))
+            if not guild:
+                continue
+            
             for message_id, roles_data in guild_data.items():
-                # Format roles data for the view
-                roles = []
+                version = get_view_version(roles_data)
+                stored = self.message_views.get(message_id)
+                if not stored:
+                    unknown += 1
+                    continue
+                if stored.get('view_version') == version:
+                    continue
                 
-                for role_data in roles_data:
-                    role_id = int(role_data['role_id'])
-                    emoji = role_data['emoji']
-                    
-                    # Try to get the guild to find role information
-                    guild = self.bot.get_guild(int(guild_id))
-                    if guild:
-                        role = guild.get_role(role_id)
-                        if role:
-                            roles.append({
-                                'id': role_id,
-                                'name': role.name,
-                                'description': f"Click to get the {role.name} role",
-                                'emoji': emoji
-                            })
+                channel = guild.get_channel(int(stored['channel_id']))
+                if not channel:
+                    continue
+                
+                try:
+                    await channel.get_partial_message(int(message_id)).edit(view=self.build_view(guild, roles_data))
+                    stored['view_version'] = version
+                    updated += 1
+                except discord.HTTPException as e:
+                    logger.error(f"Error updating reaction role message {message_id} in guild {guild_id}: {e}")
+        
+        if updated:
+            self.save_settings()
+            logger.info(f"Updated {updated} outdated reaction role messages")
+        if unknown:
+            logger.info(f"{unknown} older reaction role messages will be updated on their next use")
+    
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction):
+        """Handle dropdowns of messages sent before the dropdown had a fixed custom ID
+        
+        No persistent view matches their custom ID, so the selection is applied
+        here. The interaction is answered first by putting the current dropdown
+        on the message, and the role summary follows up.
+        """
+        if interaction.type != discord.InteractionType.component or not interaction.message or not interaction.guild:
+            return
+        if interaction.data.get('custom_id') == ROLE_SELECT_ID:
+            return
+        
+        message_id = str(interaction.message.id)
+        roles_data = db.get_reaction_roles(interaction.guild.id, message_id)
+        if not roles_data:
+            return
+        
+        try:
+            await interaction.response.edit_message(view=self.build_view(interaction.guild, roles_data))
+            self.message_views[message_id] = {
+                'channel_id': str(interaction.channel.id),
+                'view_version': get_view_version(roles_data)
+            }
+            self.save_settings()
+        except discord.HTTPException as e:
+            logger.error(f"Error updating reaction role message {message_id}: {e}")
+        
+        await apply_role_selection(
+            interaction,
+            [int(value) for value in interaction.data.get('values', [])],
+            [int(role_data['role_id']) for role_data in roles_data]
+        )
+    
+    def register_views(self):
+        """Register persistent views for all stored reaction role messages
+        
+        Views are built from the stored role IDs alone. Handling a selection
+        only needs the option values, so no guild lookups or API calls are made.
+        """
+        registered = 0
+        
+        for guild_id, guild_data in db.get_all_reaction_roles().items():
+            for message_id, roles_data in guild_data.items():
+                roles = [{
+                    'id': int(role_data['role_id']),
+                    'name': str(role_data['role_id']),
+                    'description': None,
+                    'emoji': role_data['emoji']
+                } for role_data in roles_data]
                 
-                # Register the view if we have roles
                 if roles:
-                    view = RoleView(roles)
-                    self.bot.add_view(view, message_id=int(message_id))
-                    logger.info(f"Registered reaction role view for message {message_id} in guild {guild_id}")
+                    self.bot.add_view(RoleView(roles), message_id=int(message_id))
+                    registered += 1
+        
+        logger.info(f"Registered {registered} reaction role views")
     
     @commands.hybrid_group(name="reactionrole", description="Manage reaction roles")
     @commands.has_permissions(manage_roles=True)
@@ -306,6 +445,13 @@ class ReactionRoles(commands.Cog):
                     role['emoji']
                 )
             
+            # Remember where the message is and which dropdown it shows
+            self.message_views[str(reaction_message.id)] = {
+                'channel_id': str(ctx.channel.id),
+                'view_version': get_view_version(db.get_reaction_roles(ctx.guild.id, reaction_message.id))
+            }
+            self.save_settings()
+            
             # Confirm
             await ctx.send("Reaction role message created successfully!")
             
@@ -325,7 +471,7 @@ class ReactionRoles(commands.Cog):
         """
         try:
             # Check if message exists in the database
-            reaction_roles = db.data.get('reaction_roles', {}).get(str(ctx.guild.id), {}).get(message_id)
+            reaction_roles = db.get_reaction_roles(ctx.guild.id, message_id)
             
             if not reaction_roles:
                 embed = EmbedCreator.create_error_embed(
@@ -337,21 +483,23 @@ class ReactionRoles(commands.Cog):
             
             # Try to delete the message
             try:
-                for channel in ctx.guild.text_channels:
-                    try:
-                        message = await channel.fetch_message(int(message_id))
-                        await message.delete()
-                        break
-                    except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                        continue
+                # Older messages have no stored channel; they are usually
+                # deleted from the channel they were posted in
+                stored = self.message_views.get(message_id)
+                channel = ctx.guild.get_channel(int(stored['channel_id'])) if stored else ctx.channel
+                try:
+                    await channel.get_partial_message(int(message_id)).delete()
+                except discord.NotFound:
+                    if not stored:
+                        await ctx.send("Could not find the message in this channel; delete it by hand if it still exists.")
             except Exception as e:
                 logger.error(f"Error deleting message: {e}")
                 await ctx.send("Could not delete the message, but will remove it from the database.")
             
             # Remove from database
-            if str(ctx.guild.id) in db.data.get('reaction_roles', {}) and message_id in db.data['reaction_roles'][str(ctx.guild.id)]:
-                del db.data['reaction_roles'][str(ctx.guild.id)][message_id]
-                db._save_data()
+            db.delete_reaction_role_message(ctx.guild.id, message_id)
+            if self.message_views.pop(message_id, None):
+                self.save_settings()
             
             embed = EmbedCreator.create_success_embed(
                 "Deleted",
@@ -371,7 +519,7 @@ class ReactionRoles(commands.Cog):
     @commands.has_permissions(manage_roles=True)
     async def list(self, ctx):
         """List all reaction role messages in the server"""
-        reaction_roles = db.data.get('reaction_roles', {}).get(str(ctx.guild.id), {})
+        reaction_roles = db.get_guild_reaction_roles(ctx.guild.id)
         
         if not reaction_roles:
             embed = EmbedCreator.create_info_embed(
@@ -390,17 +538,9 @@ class ReactionRoles(commands.Cog):
         for message_id, roles in reaction_roles.items():
             role_count = len(roles)
             
-            # Try to get the channel
-            channel_id = None
-            for channel in ctx.guild.text_channels:
-                try:
-                    message = await channel.fetch_message(int(message_id))
-                    channel_id = channel.id
-                    break
-                except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                    continue
-            
-            channel_text = f"<#{channel_id}>" if channel_id else "Unknown channel"
+            # Older messages get their channel recorded on their next use
+            stored = self.message_views.get(message_id)
+            channel_text = f"<#{stored['channel_id']}>" if stored else "Unknown channel"
             
             embed.add_field(
                 name=f"Message ID: {message_id}",
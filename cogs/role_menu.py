@@ -3,9 +3,11 @@ from discord.ext import commands
 import logging
 import json
 import os
+import hashlib
 from discord import ui, SelectOption
 from config import CONFIG
 from utils.embed_creator import EmbedCreator
+from utils.role_index import role_index
 
 logger = logging.getLogger('discord_bot')
 
@@ -14,7 +16,7 @@ import asyncio
 class RoleDropdown(ui.Select):
     """Dropdown menu for role selection"""
     
-    def __init__(self, roles_data):
+    def __init__(self, roles_data, multiple=True):
         self.roles_data = roles_data
         
         # Create options for the dropdown
@@ -29,12 +31,14 @@ class RoleDropdown(ui.Select):
                 )
             )
         
-        # Initialize the select with options
+        # Initialize the select with options; the fixed custom ID lets the
+        # view be registered for its message after a restart
         super().__init__(
             placeholder="Select roles to add/remove...",
             min_values=0,
-            max_values=len(options),
-            options=options
+            max_values=len(options) if multiple else 1,
+            options=options,
+            custom_id="role_menu:select"
         )
     
     async def callback(self, interaction: discord.Interaction):
@@ -51,35 +55,57 @@ class RoleDropdown(ui.Select):
         unchanged_roles = []
         missing_permissions = False
         
+        # Work out the changes against the member's role IDs
+        current_role_ids = {role.id for role in member.roles}
+        roles_to_add = []
+        roles_to_remove = []
+        
         for role_id, role_info in self.roles_data.items():
             role = guild.get_role(int(role_id))
             if not role:
                 continue
-                
+            
             # Check if role was selected
             if role_id in self.values:
-                # Add role if user doesn't have it
-                if role not in member.roles:
+                if role.id not in current_role_ids:
+                    roles_to_add.append(role)
+                else:
+                    unchanged_roles.append(f"{role.name} (already had)")
+            elif role.id in current_role_ids:
+                roles_to_remove.append(role)
+        
+        if roles_to_add or roles_to_remove:
+            # Apply every change with a single request
+            remove_ids = {role.id for role in roles_to_remove}
+            new_roles = [
+                role for role in member.roles
+                if not role.is_default() and role.id not in remove_ids
+            ] + roles_to_add
+            
+            try:
+                await member.edit(roles=new_roles, reason="Role menu selection")
+                added_roles = [role.name for role in roles_to_add]
+                removed_roles = [role.name for role in roles_to_remove]
+            except discord.Forbidden:
+                # Some role is out of reach; apply the others one by one
+                for role in roles_to_add:
                     try:
                         await member.add_roles(role)
                         added_roles.append(role.name)
                     except Exception as e:
                         missing_permissions = True
                         logger.error(f"Failed to add role {role.name}: {e}")
-                else:
-                    unchanged_roles.append(f"{role.name} (already had)")
-            else:
-                # Remove role if user has it
-                if role in member.roles:
+                
+                for role in roles_to_remove:
                     try:
                         await member.remove_roles(role)
                         removed_roles.append(role.name)
                     except Exception as e:
                         missing_permissions = True
                         logger.error(f"Failed to remove role {role.name}: {e}")
-                else:
-                    # Role was not selected and user doesn't have it - nothing to do
-                    pass
+            except discord.HTTPException as e:
+                missing_permissions = True
+                logger.error(f"Failed to update roles of {member}: {e}")
         
         # Create response message
         response = ""
@@ -105,11 +131,11 @@ class RoleDropdown(ui.Select):
 class RoleMenuView(ui.View):
     """View containing role dropdown menu"""
     
-    def __init__(self, roles_data):
+    def __init__(self, roles_data, multiple=True):
         super().__init__(timeout=None)  # Make the view persistent
         
         # Add the dropdown to the view
-        self.add_item(RoleDropdown(roles_data))
+        self.add_item(RoleDropdown(roles_data, multiple))
 
 
 class RoleMenu(commands.Cog):
@@ -120,13 +146,23 @@ class RoleMenu(commands.Cog):
         self.role_menus = {}
         self.data_file = 'data/role_menus.json'
         
+        # Dropdown views of stored menus, and whether outdated menus were updated
+        self.menu_views = {}
+        self.menus_synced = False
+        
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         
         # Load settings
         self.load_settings()
+        self.register_menu_views()
         
         logger.info("RoleMenu cog initialized")
+    
+    async def cog_load(self):
+        # Cogs loaded after the bot is ready never see on_ready
+        if self.bot.is_ready():
+            asyncio.create_task(self.sync_menus())
         
     def load_settings(self):
         """Load role menu settings from file"""
@@ -149,30 +185,56 @@ class RoleMenu(commands.Cog):
         except Exception as e:
             logger.error(f"Error saving role menu settings: {e}")
     
+    @staticmethod
+    def get_menu_version(menu_data):
+        """Get a fingerprint of the stored settings a menu's dropdown is built from"""
+        definition = json.dumps([menu_data["roles"], menu_data.get("multiple", True)], sort_keys=True)
+        return hashlib.sha1(definition.encode()).hexdigest()[:16]
+    
+    def register_menu_views(self):
+        """Register the dropdowns of stored menus as persistent views, without any API calls"""
+        for guild_menus in self.role_menus.values():
+            for message_id, menu_data in guild_menus.items():
+                view = RoleMenuView(menu_data["roles"], menu_data.get("multiple", True))
+                self.menu_views[message_id] = view
+                self.bot.add_view(view, message_id=int(message_id))
+    
     @commands.Cog.listener()
     async def on_ready(self):
-        """Re-create active role menus when the bot starts"""
+        """Update outdated role menus when the bot starts"""
+        await self.sync_menus()
+    
+    async def sync_menus(self):
+        """Put the current dropdown on menus whose message shows an older one
+        
+        Runs once per process. Menus whose stored settings match the dropdown
+        they were last sent with cost no API calls.
+        """
+        if self.menus_synced:
+            return
+        self.menus_synced = True
+        
+        updated = 0
         for guild_id, menus in self.role_menus.items():
             for message_id, menu_data in menus.items():
-                # Try to get the message
+                version = self.get_menu_version(menu_data)
+                if menu_data.get("view_version") == version:
+                    continue
+                
+                channel = self.bot.get_channel(int(menu_data["channel_id"]))
+                if not channel:
+                    continue
+                
                 try:
-                    channel = self.bot.get_channel(int(menu_data["channel_id"]))
-                    if not channel:
-                        continue
-                        
-                    message = await channel.fetch_message(int(message_id))
-                    if not message:
-                        continue
-                        
-                    # Create a new view for the message
-                    view = RoleMenuView(menu_data["roles"])
-                    
-                    # Update the message with the new view
-                    await message.edit(view=view)
-                    
-                    logger.info(f"Restored role menu for message {message_id} in guild {guild_id}")
-                except Exception as e:
-                    logger.error(f"Error restoring role menu: {e}")
+                    await channel.get_partial_message(int(message_id)).edit(view=self.menu_views[message_id])
+                    menu_data["view_version"] = version
+                    updated += 1
+                except discord.HTTPException as e:
+                    logger.error(f"Error updating role menu {message_id} in guild {guild_id}: {e}")
+        
+        if updated:
+            self.save_settings()
+            logger.info(f"Updated {updated} outdated role menus")
     
     @commands.group(name="rolemenu", invoke_without_command=True)
     @commands.has_permissions(manage_roles=True)
@@ -375,13 +437,7 @@ class RoleMenu(commands.Cog):
             )
             
             # Create the view with the dropdown, handling single/multi selection
-            view = RoleMenuView(roles_data)
-            
-            # Adjust max_values for the dropdown
-            if not allow_multiple:
-                for item in view.children:
-                    if isinstance(item, RoleDropdown):
-                        item.max_values = 1
+            view = RoleMenuView(roles_data, allow_multiple)
             
             # Send the menu to the target channel
             try:
@@ -401,6 +457,9 @@ class RoleMenu(commands.Cog):
                     "author_id": str(ctx.author.id),
                     "multiple": allow_multiple
                 }
+                menu_data = self.role_menus[guild_id][str(menu_message.id)]
+                menu_data["view_version"] = self.get_menu_version(menu_data)
+                self.menu_views[str(menu_message.id)] = view
                 
                 self.save_settings()
                 
@@ -465,14 +524,17 @@ class RoleMenu(commands.Cog):
             channel = ctx.guild.get_channel(int(menu_data["channel_id"]))
             if channel:
                 try:
-                    message = await channel.fetch_message(int(message_id))
-                    if message:
-                        await message.delete()
+                    await channel.get_partial_message(int(message_id)).delete()
                 except:
                     pass
         except Exception as e:
             logger.error(f"Error deleting role menu message: {e}")
         
+        # Stop handling the menu's dropdown
+        view = self.menu_views.pop(message_id, None)
+        if view:
+            view.stop()
+        
         # Remove the menu from settings
         del self.role_menus[guild_id][message_id]
         if not self.role_menus[guild_id]:
@@ -518,8 +580,15 @@ class RoleMenu(commands.Cog):
             author = ctx.guild.get_member(int(author_id))
             author_name = author.display_name if author else "Unknown User"
             
-            # Get role count
+            # Get role count and how many members hold each role
             role_count = len(menu_data["roles"])
+            holders = []
+            for role_id, role_info in menu_data["roles"].items():
+                role = ctx.guild.get_role(int(role_id))
+                holders.append(f"{role_info['name']} ({role_index.count(role) if role else 0})")
+            holders = ", ".join(holders)
+            if len(holders) > 500:
+                holders = holders[:497] + "..."
             
             # Create field
             embed.add_field(
@@ -527,6 +596,7 @@ class RoleMenu(commands.Cog):
                 value=f"**ID:** {message_id}\n"
                       f"**Channel:** {channel_mention}\n"
                       f"**Roles:** {role_count}\n"
+                      f"**Members:** {holders}\n"
                       f"**Created by:** {author_name}\n"
                       f"`{CONFIG['prefix']}rolemenu delete {message_id}` to delete",
                 inline=False
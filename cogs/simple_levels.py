@@ -1,12 +1,18 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
 import random
 import json
 import os
 import logging
 import math
+from collections import OrderedDict
 from datetime import datetime
 
+from config import CONFIG
+from utils.message_pipeline import pipeline
+from utils.ranking import RankIndex
+
 # Set up logging
 logger = logging.getLogger('discord_bot')
 
@@ -42,13 +48,36 @@ class SimpleLevels(commands.Cog):
         self.data_file = "data/levels.json"
         self.cooldowns = {}  # Store user cooldowns
         self.level_up_channels = {}  # Store guild-specific level up channels
-        self.load_data()
+        
+        # Per-guild level tables, loaded once and kept in LRU order.
+        # Changes are written back by flush_levels on a timer.
+        self.guild_cache = OrderedDict()
+        self.dirty_guilds = set()
+        # Leaderboard rankings of cached guilds: (board, guild ID) -> RankIndex
+        self.rankings = {}
+        self.max_cached_guilds = CONFIG['levels'].get('cache_max_guilds', 200)
         
         # Ensure the data directory exists
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         
+        self.load_data()
+        self.flush_levels.change_interval(seconds=CONFIG['levels'].get('flush_interval', 30))
+        self.flush_levels.start()
+        
+        pipeline.register(bot, 'simple_levels.cooldown', self.check_cooldown, order=20)
+        pipeline.register(bot, 'simple_levels.xp', self.award_xp, order=30)
+        
         logger.info("SimpleLevels cog initialized")
     
+    def cog_unload(self):
+        pipeline.unregister('simple_levels.cooldown')
+        pipeline.unregister('simple_levels.xp')
+        self.flush_levels.cancel()
+        # Write everything still pending before the cog goes away
+        for guild_id in list(self.dirty_guilds):
+            self.write_guild_file(guild_id, self.serialize_guild(guild_id))
+        self.dirty_guilds.clear()
+    
     def load_data(self):
         """Load level data from JSON file"""
         try:
@@ -75,50 +104,124 @@ class SimpleLevels(commands.Cog):
         except Exception as e:
             logger.error(f"Error saving level data: {e}")
     
-    def get_user_data(self, guild_id, user_id):
-        """Get user data from the database or create a new entry"""
-        guild_data_file = f"data/guild_{guild_id}_levels.json"
+    def get_guild_file(self, guild_id):
+        """Get the path of a guild's level data file"""
+        return f"data/guild_{guild_id}_levels.json"
+    
+    def get_guild_data(self, guild_id):
+        """Get the cached level table for a guild, loading it from disk on first use
+        
+        Returns:
+            dict: SimpleLevel objects keyed by user ID string
+        """
+        guild_id = str(guild_id)
         
+        if guild_id in self.guild_cache:
+            self.guild_cache.move_to_end(guild_id)
+            return self.guild_cache[guild_id]
+        
+        guild_data = {}
+        guild_data_file = self.get_guild_file(guild_id)
         try:
             if os.path.exists(guild_data_file):
                 with open(guild_data_file, 'r') as f:
                     all_data = json.load(f)
-                    user_data = all_data.get(str(user_id))
-                    if user_data:
-                        return SimpleLevel.from_dict(user_data)
-            else:
-                # Create a new guild data file
-                with open(guild_data_file, 'w') as f:
-                    json.dump({}, f, indent=4)
+                guild_data = {
+                    user_id: SimpleLevel.from_dict({**user_data, "user_id": int(user_id)})
+                    for user_id, user_data in all_data.items()
+                }
         except Exception as e:
-            logger.error(f"Error retrieving user data: {e}")
+            logger.error(f"Error loading level data for guild {guild_id}: {e}")
+        
+        self.guild_cache[guild_id] = guild_data
+        self.evict_cold_guilds()
+        return guild_data
+    
+    def evict_cold_guilds(self):
+        """Drop least recently used guilds once the cache is over capacity
+        
+        Guilds with unsaved changes stay cached until flush_levels writes them.
+        """
+        for guild_id in list(self.guild_cache):
+            if len(self.guild_cache) <= self.max_cached_guilds:
+                break
+            if guild_id not in self.dirty_guilds:
+                del self.guild_cache[guild_id]
+                for board in ('level', 'messages'):
+                    self.rankings.pop((board, guild_id), None)
+    
+    def get_user_data(self, guild_id, user_id):
+        """Get user data from the cache or create a new entry"""
+        user_data = self.get_guild_data(guild_id).get(str(user_id))
         
         # Return a new user object if not found
-        return SimpleLevel(user_id=user_id)
+        return user_data or SimpleLevel(user_id=user_id)
     
     def save_user_data(self, guild_id, user_data):
-        """Save user data to the database"""
-        guild_data_file = f"data/guild_{guild_id}_levels.json"
+        """Store user data in the cache and mark the guild for the next flush"""
+        self.get_guild_data(guild_id)[str(user_data.user_id)] = user_data
+        self.dirty_guilds.add(str(guild_id))
+        
+        for board in ('level', 'messages'):
+            ranking = self.rankings.get((board, str(guild_id)))
+            if ranking is not None:
+                ranking.update(str(user_data.user_id), self.get_rank_score(user_data, board))
+        return True
+    
+    def get_rank_score(self, user_data, board):
+        """Get the score a user is ranked by on a leaderboard"""
+        if board == 'messages':
+            return user_data.messages
+        return (user_data.level, user_data.xp)
+    
+    def get_ranking(self, guild_id, board='level'):
+        """Get a cached guild's leaderboard ranking, building it on first use
+        
+        Args:
+            guild_id: The guild to rank
+            board: 'level' (level, then XP) or 'messages'
+        """
+        guild_id = str(guild_id)
+        guild_data = self.get_guild_data(guild_id)
+        
+        ranking = self.rankings.get((board, guild_id))
+        if ranking is None:
+            ranking = self.rankings[(board, guild_id)] = RankIndex({
+                user_id: self.get_rank_score(user_data, board) for user_id, user_data in guild_data.items()
+            })
+        return ranking
+    
+    def serialize_guild(self, guild_id):
+        """Serialize a cached guild table to JSON"""
+        guild_data = self.guild_cache.get(str(guild_id), {})
+        return json.dumps({user_id: user.to_dict() for user_id, user in guild_data.items()}, indent=4)
+    
+    def write_guild_file(self, guild_id, payload):
+        """Atomically replace a guild's level data file"""
+        guild_data_file = self.get_guild_file(guild_id)
+        tmp_file = f"{guild_data_file}.tmp"
         
         try:
-            # Load existing data
-            all_data = {}
-            if os.path.exists(guild_data_file):
-                with open(guild_data_file, 'r') as f:
-                    all_data = json.load(f)
-            
-            # Update user data
-            all_data[str(user_data.user_id)] = user_data.to_dict()
-            
-            # Save back to file
-            with open(guild_data_file, 'w') as f:
-                json.dump(all_data, f, indent=4)
-                
+            with open(tmp_file, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_file, guild_data_file)
             return True
         except Exception as e:
-            logger.error(f"Error saving user data: {e}")
+            logger.error(f"Error saving level data for guild {guild_id}: {e}")
             return False
     
+    @tasks.loop(seconds=30)
+    async def flush_levels(self):
+        """Write changed guild level tables to disk"""
+        for guild_id in list(self.dirty_guilds):
+            # Serialize on the loop, write in a worker thread
+            self.dirty_guilds.discard(guild_id)
+            payload = self.serialize_guild(guild_id)
+            if not await asyncio.to_thread(self.write_guild_file, guild_id, payload):
+                self.dirty_guilds.add(guild_id)
+        
+        self.evict_cold_guilds()
+    
     def get_level_from_xp(self, xp):
         """Calculate level based on XP"""
         # Simple formula: level = sqrt(xp / 100)
@@ -156,20 +259,18 @@ class SimpleLevels(commands.Cog):
         # Return None if no channel is configured
         return None
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Award XP for messages"""
-        # Don't process commands or bot messages
-        if message.author.bot or not message.guild:
-            return
-        
+    async def check_cooldown(self, context):
+        """Skip the XP stage while the author is on cooldown (message pipeline stage)"""
+        # Check cooldown to prevent XP farming
+        if self.is_on_cooldown(context.author.id):
+            context.skip('simple_levels.xp')
+    
+    async def award_xp(self, context):
+        """Award XP for messages (message pipeline stage)"""
+        message = context.message
         user_id = message.author.id
         guild_id = message.guild.id
         
-        # Check cooldown to prevent XP farming
-        if self.is_on_cooldown(user_id):
-            return
-        
         # Get current user data
         user_data = self.get_user_data(guild_id, user_id)
         
@@ -262,40 +363,34 @@ class SimpleLevels(commands.Cog):
         await ctx.send(embed=embed)
     
     @commands.command(name="leaderboard", aliases=["lb", "top"])
-    async def leaderboard_command(self, ctx, type="level"):
+    async def leaderboard_command(self, ctx, type="level", page: int = 1):
         """Show the server leaderboard
         
         Args:
             type: The type of leaderboard (level or messages)
+            page: The page of the leaderboard to show
         """
-        guild_id = ctx.guild.id
-        guild_data_file = f"data/guild_{guild_id}_levels.json"
+        guild_data = self.get_guild_data(ctx.guild.id)
+        page = max(page, 1)
         
-        if not os.path.exists(guild_data_file):
+        if not guild_data:
             await ctx.send("No leveling data found for this server.")
             return
             
         try:
-            with open(guild_data_file, 'r') as f:
-                data = json.load(f)
-                
-            # Convert to list of user data objects
-            users = [SimpleLevel.from_dict({**user_data, "user_id": int(user_id)}) 
-                    for user_id, user_data in data.items()]
-            
-            # Sort based on type
+            # Pick the ranking based on type
             if type.lower() in ["message", "messages", "msg"]:
-                users.sort(key=lambda x: x.messages, reverse=True)
+                ranking = self.get_ranking(ctx.guild.id, 'messages')
                 title = "Messages Leaderboard"
                 value_key = "messages"
             else:
-                # Sort by level and then by XP
-                users.sort(key=lambda x: (x.level, x.xp), reverse=True)
+                # Ranked by level and then by XP
+                ranking = self.get_ranking(ctx.guild.id, 'level')
                 title = "Levels Leaderboard"
                 value_key = "level"
             
-            # Take top 10
-            top_users = users[:10]
+            # Take the requested page of 10
+            top_users = [guild_data[user_id] for user_id, score in ranking.page(page, 10)]
             
             # Create embed
             embed = discord.Embed(
@@ -307,7 +402,7 @@ class SimpleLevels(commands.Cog):
             
             # Generate leaderboard text
             lb_text = ""
-            for i, user in enumerate(top_users):
+            for i, user in enumerate(top_users, (page - 1) * 10):
                 # Get medal emoji based on position
                 if i == 0:
                     medal = "🥇"
@@ -328,7 +423,11 @@ class SimpleLevels(commands.Cog):
                 embed.add_field(name="No Data", value="No users have gained XP yet.", inline=False)
                 
             # Set footer
-            embed.set_footer(text=f"Requested by {ctx.author}", icon_url=ctx.author.display_avatar.url)
+            footer = f"Requested by {ctx.author} • Page {page}"
+            rank = ranking.rank(str(ctx.author.id))
+            if rank:
+                footer += f" • Your rank: #{rank}"
+            embed.set_footer(text=footer, icon_url=ctx.author.display_avatar.url)
             
             await ctx.send(embed=embed)
             
@@ -23,17 +23,19 @@ class TicketButton(discord.ui.Button):
     async def callback(self, interaction: discord.Interaction):
         """Handle button click"""
         # Check if user already has an open ticket
-        guild_tickets = db.data.get('tickets', {}).get(str(interaction.guild.id), {})
-        for channel_id, ticket_data in guild_tickets.items():
-            if ticket_data.get('user_id') == str(interaction.user.id) and ticket_data.get('status') == 'open':
-                # User already has an open ticket
-                channel = interaction.guild.get_channel(int(channel_id))
-                if channel:
-                    await interaction.response.send_message(
-                        f"You already have an open ticket: {channel.mention}",
-                        ephemeral=True
-                    )
-                    return
+        open_ticket_id = db.get_open_ticket(interaction.guild.id, interaction.user.id)
+        if open_ticket_id:
+            # User already has an open ticket
+            channel = interaction.guild.get_channel(int(open_ticket_id))
+            if channel:
+                await interaction.response.send_message(
+                    f"You already have an open ticket: {channel.mention}",
+                    ephemeral=True
+                )
+                return
+            
+            # The ticket channel was deleted without closing the ticket
+            db.close_ticket(interaction.guild.id, open_ticket_id)
         
         # Create new ticket channel
         try:
@@ -1,5 +1,5 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
 import json
 import os
@@ -9,6 +9,11 @@ import random
 import platform
 import time
 from config import CONFIG
+from utils.scheduler import scheduler
+from utils.guild_stats import guild_stats
+from utils.join_order import join_order
+from utils.role_index import role_index
+from utils.channel_activity import channel_activity, describe_activity
 
 logger = logging.getLogger('discord_bot')
 
@@ -18,17 +23,84 @@ class Utility(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.start_time = datetime.datetime.utcnow()
+        
+        # Reminders are persisted by the scheduler, so they survive restarts
+        scheduler.register('reminder', self.send_reminder)
+        
+        # Member counters are kept by events; sample them for the stats history
+        self.record_stats.change_interval(seconds=CONFIG.get('guild_stats', {}).get('sample_interval', 300))
+        self.record_stats.start()
+        
         logger.info("Utility cog initialized")
     
+    def cog_unload(self):
+        scheduler.unregister('reminder')
+        self.record_stats.cancel()
+    
+    @tasks.loop(seconds=300)
+    async def record_stats(self):
+        """Append a sample of every guild's member counters to its history"""
+        for guild in self.bot.guilds:
+            guild_stats.record(guild)
+    
+    @record_stats.before_loop
+    async def before_record_stats(self):
+        await self.bot.wait_until_ready()
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """Keep the guild's member counters, join order and role index current"""
+        guild_stats.member_join(member)
+        join_order.member_join(member)
+        role_index.member_join(member)
+    
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        """Keep the guild's member counters, join order and role index current"""
+        guild_stats.member_remove(member)
+        join_order.member_remove(member)
+        role_index.member_remove(member)
+    
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        """Keep the guild's status counters current"""
+        guild_stats.member_update(before, after)
+    
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        """Keep the guild's booster counter and role index current"""
+        guild_stats.member_update(before, after)
+        role_index.member_update(before, after)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        """Drop a deleted role from the role index"""
+        role_index.role_delete(role)
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        """Drop the member indexes of a guild the bot left"""
+        guild_stats.forget(guild.id)
+        join_order.forget(guild.id)
+        role_index.forget(guild.id)
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Rebuild member indexes after a reconnect, since events may have been missed"""
+        guild_stats.invalidate()
+        join_order.invalidate()
+        role_index.invalidate()
+    
     @commands.command(name="serverinfo")
     async def server_info(self, ctx):
         """Show information about the server"""
         guild = ctx.guild
         
-        # Get member counts
+        # Get member counts (kept current by member events)
+        stats = guild_stats.get(guild)
         total_members = guild.member_count
-        online_members = len([m for m in guild.members if m.status != discord.Status.offline])
-        bot_count = len([m for m in guild.members if m.bot])
+        online_members = stats.online
+        bot_count = stats.bots
         human_count = total_members - bot_count
         
         # Get channel counts
@@ -69,7 +141,7 @@ class Utility(commands.Cog):
         # Add boost status
         boost_level = guild.premium_tier
         boost_count = guild.premium_subscription_count
-        boost_info = f"Level {boost_level} ({boost_count} boosts)"
+        boost_info = f"Level {boost_level} ({boost_count} boosts from {stats.boosters} members)"
         
         embed.add_field(
             name="🚀 Boost Status",
@@ -109,6 +181,17 @@ class Utility(commands.Cog):
             inline=True
         )
         
+        # Add member trend from the stats history
+        history = guild_stats.get_history(guild.id)
+        if history:
+            since, oldest = history[0]
+            change = total_members - oldest['members']
+            embed.add_field(
+                name="📈 Trend",
+                value=f"{change:+} members since <t:{int(since)}:R>",
+                inline=True
+            )
+        
         # Add channels section
         embed.add_field(
             name="💬 Channels",
@@ -146,7 +229,7 @@ class Utility(commands.Cog):
         member = member or ctx.author
         
         # Get join position
-        join_position = sorted(ctx.guild.members, key=lambda m: m.joined_at or datetime.datetime.utcnow()).index(member) + 1
+        join_position = join_order.position(member)
         
         # Create embed
         embed = discord.Embed(
@@ -189,7 +272,7 @@ class Utility(commands.Cog):
             
             embed.add_field(
                 name="📥 Joined Server",
-                value=f"{joined_date}\n(#{join_position} to join)",
+                value=f"{joined_date}\n(#{join_position} to join)" if join_position else joined_date,
                 inline=True
             )
         
@@ -264,6 +347,44 @@ class Utility(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.command(name="joinpos")
+    async def join_position(self, ctx, position: int):
+        """Show which member joined the server at a position
+        
+        Args:
+            position: The join position (1 is the earliest member)
+        """
+        found = join_order.member_at(ctx.guild, position) if position > 0 else None
+        if found is None:
+            embed = discord.Embed(
+                title="❌ Invalid Position",
+                description=f"Please choose a position between 1 and {len(join_order.get(ctx.guild))}.",
+                color=CONFIG['colors']['error']
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        member_id, joined_at = found
+        member = ctx.guild.get_member(member_id)
+        joined_timestamp = int(joined_at)
+        
+        embed = discord.Embed(
+            title=f"📥 Member #{position}",
+            description=f"{member.mention if member else f'<@{member_id}>'} was member #{position} to join.",
+            color=CONFIG['colors']['info']
+        )
+        
+        embed.add_field(
+            name="Joined Server",
+            value=f"<t:{joined_timestamp}:F>\n<t:{joined_timestamp}:R>",
+            inline=False
+        )
+        
+        if member:
+            embed.set_thumbnail(url=member.display_avatar.url)
+        
+        await ctx.send(embed=embed)
+    
     @commands.command(name="avatar")
     async def avatar(self, ctx, member: discord.Member = None):
         """Show a user's avatar
@@ -438,7 +559,7 @@ class Utility(commands.Cog):
             role: The role to show info for
         """
         # Get member count with this role
-        member_count = len(role.members)
+        member_count = role_index.count(role)
         
         # Create embed
         embed = discord.Embed(
@@ -534,6 +655,39 @@ class Utility(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.command(name="rolecounts")
+    async def role_counts(self, ctx, page: int = 1):
+        """Show how many members hold each role
+        
+        Args:
+            page: The page of roles to show
+        """
+        counts = role_index.counts(ctx.guild)
+        if not counts:
+            embed = discord.Embed(
+                title="👑 Role Counts",
+                description="This server has no roles.",
+                color=CONFIG['colors']['info']
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        per_page = 20
+        pages = (len(counts) + per_page - 1) // per_page
+        page = min(max(page, 1), pages)
+        start = (page - 1) * per_page
+        
+        lines = [f"{role.mention}: **{count:,}**" for role, count in counts[start:start + per_page]]
+        
+        embed = discord.Embed(
+            title="👑 Role Counts",
+            description="\n".join(lines),
+            color=CONFIG['colors']['info']
+        )
+        embed.set_footer(text=f"Page {page}/{pages} • {len(counts)} roles")
+        
+        await ctx.send(embed=embed)
+    
     @commands.command(name="channelinfo")
     async def channel_info(self, ctx, channel: discord.TextChannel = None):
         """Show information about a channel
@@ -625,6 +779,13 @@ class Utility(commands.Cog):
                 inline=True
             )
         
+        # Add message counts (kept by the message pipeline, no API calls)
+        embed.add_field(
+            name="💬 Messages",
+            value=describe_activity(channel_activity.get_counts(ctx.guild.id, channel.id)),
+            inline=True
+        )
+        
         await ctx.send(embed=embed)
     
     @commands.command(name="emojis")
@@ -873,7 +1034,7 @@ class Utility(commands.Cog):
             return
         
         # Calculate when the reminder will be triggered
-        now = datetime.datetime.utcnow()
+        now = datetime.datetime.now(datetime.timezone.utc)
         remind_time = now + datetime.timedelta(seconds=seconds)
         
         # Format times
@@ -896,15 +1057,38 @@ class Utility(commands.Cog):
         
         await ctx.send(embed=embed)
         
-        # Wait for the specified time
-        await asyncio.sleep(seconds)
+        # Hand the reminder to the scheduler
+        scheduler.schedule('reminder', remind_time.timestamp(), {
+            'user_id': ctx.author.id,
+            'channel_id': ctx.channel.id,
+            'guild_id': ctx.guild.id if ctx.guild else None,
+            'reminder': reminder,
+            'seconds': seconds,
+            'set_at': now.timestamp()
+        })
+    
+    async def send_reminder(self, job):
+        """Deliver a reminder when it is due (scheduler job)"""
+        await self.bot.wait_until_ready()
+        
+        payload = job['payload']
+        seconds = payload['seconds']
+        
+        user = self.bot.get_user(payload['user_id'])
+        if user is None:
+            try:
+                user = await self.bot.fetch_user(payload['user_id'])
+            except discord.HTTPException as e:
+                logger.error(f"Could not find user {payload['user_id']} for reminder: {e}")
+                return
+        channel = self.bot.get_channel(payload['channel_id']) if payload['guild_id'] else None
         
         # Create reminder embed
         reminder_embed = discord.Embed(
             title="⏰ Reminder",
-            description=reminder,
+            description=payload['reminder'],
             color=CONFIG['colors']['info'],
-            timestamp=now  # When the reminder was set
+            timestamp=datetime.datetime.fromtimestamp(payload['set_at'], datetime.timezone.utc)  # When the reminder was set
         )
         
         reminder_embed.add_field(
@@ -915,21 +1099,27 @@ class Utility(commands.Cog):
         
         # Send the reminder
         try:
-            await ctx.author.send(f"{ctx.author.mention} Here's your reminder!", embed=reminder_embed)
+            await user.send(f"{user.mention} Here's your reminder!", embed=reminder_embed)
             
             # If the reminder was set in a guild, also send a message there
-            if ctx.guild:
-                await ctx.send(f"{ctx.author.mention} I've sent your reminder to your DMs!")
+            if channel:
+                await channel.send(f"{user.mention} I've sent your reminder to your DMs!")
                 
         except discord.Forbidden:
             # Can't DM the user
-            if ctx.guild:
-                await ctx.send(f"{ctx.author.mention} Here's your reminder!", embed=reminder_embed)
+            if channel:
+                try:
+                    await channel.send(f"{user.mention} Here's your reminder!", embed=reminder_embed)
+                except discord.HTTPException as e:
+                    logger.error(f"Error sending reminder: {e}")
             
         except Exception as e:
             logger.error(f"Error sending reminder: {e}")
-            if ctx.guild:
-                await ctx.send(f"{ctx.author.mention} I tried to send your reminder, but something went wrong.")
+            if channel:
+                try:
+                    await channel.send(f"{user.mention} I tried to send your reminder, but something went wrong.")
+                except discord.HTTPException:
+                    pass
 
 def seconds_to_time_string(seconds):
     """Convert seconds to a human-readable time string"""
@@ -47,6 +47,40 @@ CONFIG = {
     'placeholders': {
         'thumbnail_url': 'https://cdn.discordapp.com/emojis/964566755781476473.png'
     },
+    'database': {
+        'backend': 'json',         # Storage backend: 'json' or 'sqlite' (run migrate_database.py first)
+        'file': 'bot_database.json',
+        'sqlite_file': 'bot_database.sqlite3',
+        'write_behind': True,      # Batch changes in memory instead of saving on every update
+        'flush_interval': 5,       # Seconds between background saves
+        'flush_threshold': 100,    # Save early once this many changes are pending
+        'journal_max_bytes': 1024 * 1024  # Compact the journal into a snapshot past this size
+    },
+    'invites': {
+        'join_batch_window': 2.0,  # Seconds to collect a burst of joins before one invites fetch
+        'warmup_concurrency': 5,   # Guilds whose invites are fetched at the same time at startup
+        'min_confidence': 0.9      # Joins attributed with less confidence are not saved to invite stats
+    },
+    'scheduler': {
+        'file': 'data/scheduled_jobs.json'  # Pending reminders, unmutes, poll and giveaway ends
+    },
+    'polls': {
+        'live_results_interval': 5,  # Minimum seconds between live result edits of a poll message
+        'save_interval': 10          # Seconds between saves of recorded votes
+    },
+    'permission_updates': {
+        'concurrency': 5,  # Channels whose overwrites are written at the same time
+        'retries': 3       # Attempts per channel when a write is rate limited or fails
+    },
+    'guild_stats': {
+        'sample_interval': 300,  # Seconds between samples of each guild's member counters
+        'history_size': 288      # Samples kept per guild (24 hours at the default interval)
+    },
+    'channel_activity': {
+        'save_interval': 30,    # Seconds between saves of per-channel message counters
+        'backfill': False,      # Count messages sent before the bot started tracking a channel
+        'backfill_delay': 2.0   # Seconds between history pages read by the backfill
+    },
     'custom_gifs': {
         'welcome': 'assets/images/welcome.gif'
     },
@@ -56,6 +90,8 @@ CONFIG = {
         'xp_cooldown': 60,         # Seconds between XP awards
         'level_up_channel_id': None,  # Set to a specific channel ID to send all level up notifications
                                       # If None, uses guild-specific settings from the database
-        'level_roles': {}           # Roles awarded at specific levels - format: {level: role_id}
+        'level_roles': {},          # Roles awarded at specific levels - format: {level: role_id}
+        'flush_interval': 30,       # Seconds between saves of cached level data
+        'cache_max_guilds': 200     # Guild level tables kept in memory (least recently used are dropped)
     }
 }
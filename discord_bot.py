@@ -4,6 +4,7 @@ import asyncio
 import logging
 from discord.ext import commands
 from config import CONFIG
+from utils.database import db
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -70,6 +71,9 @@ async def main():
         await bot.start(token)
     except Exception as e:
         logger.critical(f"Failed to start bot: {e}")
+    finally:
+        # Persist anything still buffered by the write-behind flusher
+        db.flush()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
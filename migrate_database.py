@@ -0,0 +1,26 @@
+import sys
+import logging
+
+from config import CONFIG
+from utils.database import JsonDatabase
+from utils.sqlite_database import SqliteDatabase
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, 
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('discord_bot')
+
+def migrate(json_file=None, sqlite_file=None):
+    """Copy everything from the JSON database (snapshot plus journal) into SQLite"""
+    source = JsonDatabase(json_file)
+    target = SqliteDatabase(sqlite_file)
+    
+    target.import_json(source.data)
+    target.close()
+    
+    logger.info(f"Migrated {source.db_file} to {target.db_file}")
+    logger.info("Set CONFIG['database']['backend'] to 'sqlite' in config.py to use it")
+
+if __name__ == "__main__":
+    # Usage: python migrate_database.py [bot_database.json] [bot_database.sqlite3]
+    migrate(*sys.argv[1:3])
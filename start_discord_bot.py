@@ -4,6 +4,7 @@ import asyncio
 import logging
 from discord.ext import commands
 from config import CONFIG
+from utils.database import db
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -65,4 +66,8 @@ if __name__ == "__main__":
     if not token:
         logger.critical("No Discord token found in environment variables!")
     else:
-        bot.run(token)
\ No newline at end of file
+        try:
+            bot.run(token)
+        finally:
+            # Persist anything still buffered by the write-behind flusher
+            db.flush()
\ No newline at end of file
@@ -0,0 +1,258 @@
+import asyncio
+import bisect
+import logging
+
+import discord
+
+from config import CONFIG
+
+logger = logging.getLogger('discord_bot')
+
+class GuildBans:
+    """Banned users of one guild, indexed by ID and by case-folded name"""
+    
+    def __init__(self):
+        self.users = {}
+        # Case-folded name -> set of user IDs
+        self.names = {}
+        # Sorted names for prefix search, rebuilt on the first search after a change
+        self._sorted_names = None
+    
+    def __len__(self):
+        return len(self.users)
+    
+    @staticmethod
+    def _keys(user):
+        """Get the names a user can be looked up by"""
+        keys = {user.name.casefold(), str(user).casefold()}
+        if getattr(user, 'global_name', None):
+            keys.add(user.global_name.casefold())
+        return keys
+    
+    def add(self, user):
+        """Add or refresh a banned user"""
+        if user.id in self.users:
+            self.remove(user.id)
+        
+        self.users[user.id] = user
+        for key in self._keys(user):
+            if key not in self.names:
+                self._sorted_names = None
+            self.names.setdefault(key, set()).add(user.id)
+    
+    def remove(self, user_id):
+        """Remove a user, returning them if they were banned"""
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return None
+        
+        for key in self._keys(user):
+            ids = self.names.get(key)
+            if ids is None:
+                continue
+            ids.discard(user_id)
+            if not ids:
+                del self.names[key]
+                self._sorted_names = None
+        return user
+    
+    def find(self, query):
+        """Find banned users by ID, mention or exact name (case-insensitive)"""
+        query = query.strip()
+        user_id = query.strip('<@!>')
+        if user_id.isdigit() and int(user_id) in self.users:
+            return [self.users[int(user_id)]]
+        
+        return [self.users[user_id] for user_id in sorted(self.names.get(query.casefold(), ()))]
+    
+    def search(self, prefix, limit=10):
+        """Find up to limit banned users whose name starts with prefix"""
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.names)
+        
+        prefix = prefix.strip().casefold()
+        found = {}
+        i = bisect.bisect_left(self._sorted_names, prefix)
+        while i < len(self._sorted_names) and len(found) < limit:
+            name = self._sorted_names[i]
+            if not name.startswith(prefix):
+                break
+            for user_id in sorted(self.names[name]):
+                found.setdefault(user_id, self.users[user_id])
+            i += 1
+        return list(found.values())[:limit]
+
+class BanCache:
+    """Per-guild cache of ban lists
+    
+    Each guild's ban list is paged in from the API once, on the first lookup,
+    and then kept current from member ban and unban events, so unban lookups
+    are dictionary hits instead of a walk through every ban.
+    """
+    
+    def __init__(self):
+        self.guilds = {}
+        # Guild ID -> bans still being paged in, so events during the load apply to them
+        self._loading = {}
+        self._locks = {}
+        self._bots = set()
+    
+    def attach(self, bot):
+        """Register the listeners keeping the cache current on a bot (only once)"""
+        if id(bot) not in self._bots:
+            bot.add_listener(self.on_member_ban, 'on_member_ban')
+            bot.add_listener(self.on_member_unban, 'on_member_unban')
+            bot.add_listener(self.on_guild_remove, 'on_guild_remove')
+            bot.add_listener(self.on_ready, 'on_ready')
+            self._bots.add(id(bot))
+    
+    async def on_member_ban(self, guild, user):
+        """Keep the cached ban list current"""
+        self.add(guild.id, user)
+    
+    async def on_member_unban(self, guild, user):
+        """Keep the cached ban list current"""
+        self.remove(guild.id, user.id)
+    
+    async def on_guild_remove(self, guild):
+        """Drop the cached ban list of a guild the bot left"""
+        self.forget(guild.id)
+    
+    async def on_ready(self):
+        """Drop cached ban lists after a reconnect, since ban events may have been missed"""
+        self.clear()
+    
+    async def get(self, guild):
+        """Get the bans of a guild, loading them on first use
+        
+        Raises:
+            discord.Forbidden: If the bot cannot read the guild's bans
+        """
+        bans = self.guilds.get(guild.id)
+        if bans is not None:
+            return bans
+        
+        lock = self._locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            # Another lookup may have loaded the guild while we waited
+            bans = self.guilds.get(guild.id)
+            if bans is not None:
+                return bans
+            
+            bans = self._loading[guild.id] = GuildBans()
+            try:
+                async for entry in guild.bans(limit=None):
+                    bans.add(entry.user)
+            finally:
+                self._loading.pop(guild.id, None)
+            
+            self.guilds[guild.id] = bans
+            logger.info(f"Cached {len(bans)} bans for guild {guild.id}")
+            return bans
+    
+    def add(self, guild_id, user):
+        """Record a ban in a guild that has been loaded or is loading"""
+        bans = self.guilds.get(guild_id, self._loading.get(guild_id))
+        if bans is not None:
+            bans.add(user)
+    
+    def remove(self, guild_id, user_id):
+        """Record an unban in a guild that has been loaded or is loading"""
+        bans = self.guilds.get(guild_id, self._loading.get(guild_id))
+        if bans is not None:
+            bans.remove(user_id)
+    
+    def forget(self, guild_id):
+        """Drop a guild's cached bans so the next lookup reloads them"""
+        self.guilds.pop(guild_id, None)
+    
+    def clear(self):
+        """Drop every cached ban list, e.g. after events may have been missed"""
+        self.guilds.clear()
+    
+    async def unban(self, ctx, user_name):
+        """Unban a banned user found by ID, mention or name, and report the result
+        
+        Shared by the prefixed and direct unban commands.
+        
+        Args:
+            ctx: The command context
+            user_name: The username, ID or mention of the banned member (e.g. User#1234)
+        """
+        # Get ban list (paged in once, then kept current from ban events)
+        try:
+            bans = await self.get(ctx.guild)
+        except discord.HTTPException as e:
+            error_embed = discord.Embed(
+                title="❌ Error",
+                description=f"Could not read the ban list: {str(e)}",
+                color=CONFIG['colors']['error']
+            )
+            await ctx.send(embed=error_embed)
+            return
+        
+        # Find user by ID, mention or name
+        matches = bans.find(user_name)
+        if len(matches) > 1:
+            embed = discord.Embed(
+                title="❓ Multiple Matches",
+                description=f"Several banned users are named '{user_name}'. Unban one of them by ID:\n" +
+                            "\n".join(f"{user} (`{user.id}`)" for user in matches[:10]),
+                color=CONFIG['colors']['warning']
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        if matches:
+            user = matches[0]
+            
+            # Unban the user
+            try:
+                await ctx.guild.unban(user)
+                self.remove(ctx.guild.id, user.id)
+                
+                embed = discord.Embed(
+                    title=f"✅ User Unbanned",
+                    description=f"{user} has been unbanned from the server.",
+                    color=CONFIG['colors']['success']
+                )
+                
+                await ctx.send(embed=embed)
+            except discord.NotFound:
+                # Unbanned while we weren't listening
+                self.remove(ctx.guild.id, user.id)
+                
+                embed = discord.Embed(
+                    title="❌ Not Banned",
+                    description=f"{user} is no longer banned from the server.",
+                    color=CONFIG['colors']['error']
+                )
+                await ctx.send(embed=embed)
+            except Exception as e:
+                error_embed = discord.Embed(
+                    title="❌ Error",
+                    description=f"Could not unban {user}: {str(e)}",
+                    color=CONFIG['colors']['error']
+                )
+                await ctx.send(embed=error_embed)
+            return
+        
+        # User not found
+        embed = discord.Embed(
+            title="❌ Not Found",
+            description=f"Could not find a banned user with the name '{user_name}'. Please check the spelling.",
+            color=CONFIG['colors']['error']
+        )
+        
+        suggestions = bans.search(user_name, limit=5)
+        if suggestions:
+            embed.add_field(
+                name="Did you mean",
+                value="\n".join(f"{user} (`{user.id}`)" for user in suggestions),
+                inline=False
+            )
+        
+        await ctx.send(embed=embed)
+
+# Create a global instance of the ban cache
+ban_cache = BanCache()
@@ -0,0 +1,187 @@
+import copy
+import logging
+import time
+
+from utils.database import db
+
+logger = logging.getLogger('discord_bot')
+
+# Channel counters keep a ring of this many recent hours, enough for the
+# last 24 hours and the last 7 days, so their size doesn't grow with history
+ACTIVITY_HOURS = 7 * 24
+
+def new_activity_counter(now=None):
+    """Create an empty channel activity counter starting at now"""
+    now = now or time.time()
+    
+    return {
+        'all_time': 0,
+        'hour': int(now // 3600),
+        'hours': [0] * ACTIVITY_HOURS,
+        # Live counting started here; history before it is only known after a backfill
+        'since': now,
+        'backfill_before': None,
+        'backfilled': False
+    }
+
+def roll_activity_counter(counter, hour):
+    """Move an activity counter forward to an hour, clearing the slots in between"""
+    elapsed = hour - counter['hour']
+    if elapsed <= 0:
+        return
+    
+    if elapsed >= ACTIVITY_HOURS:
+        counter['hours'] = [0] * ACTIVITY_HOURS
+    else:
+        for passed in range(counter['hour'] + 1, hour + 1):
+            counter['hours'][passed % ACTIVITY_HOURS] = 0
+    counter['hour'] = hour
+
+def add_activity(counter, timestamp, count=1):
+    """Count messages sent at a timestamp, live or from history"""
+    hour = int(timestamp // 3600)
+    roll_activity_counter(counter, hour)
+    
+    counter['all_time'] += count
+    if counter['hour'] - ACTIVITY_HOURS < hour <= counter['hour']:
+        counter['hours'][hour % ACTIVITY_HOURS] += count
+
+def read_activity_counter(counter, now=None):
+    """Read the all-time, last 24 hours and last 7 days counts of a counter"""
+    current = int((now or time.time()) // 3600)
+    oldest = max(current - ACTIVITY_HOURS, counter['hour'] - ACTIVITY_HOURS)
+    
+    day = week = 0
+    for hour in range(oldest + 1, min(current, counter['hour']) + 1):
+        count = counter['hours'][hour % ACTIVITY_HOURS]
+        week += count
+        if hour > current - 24:
+            day += count
+    
+    return {
+        'all_time': counter['all_time'],
+        'day': day,
+        'week': week,
+        'since': counter['since'],
+        'backfilled': counter['backfilled']
+    }
+
+class ChannelActivity:
+    """In-memory per-channel message counters in front of the database
+    
+    Counters are fed by the message pipeline and optionally by a history
+    backfill, and written back by flush() with one batched call per guild.
+    Reads never touch the Discord API.
+    """
+    
+    def __init__(self, database):
+        """Initialize the counters
+        
+        Args:
+            database: The database persisting the counters
+        """
+        self.database = database
+        # Guild ID -> channel ID -> activity counter, loaded on first use
+        self.guilds = {}
+        # Guild ID -> set of channel IDs changed since the last flush
+        self.dirty = {}
+    
+    def _get_guild(self, guild_id):
+        """Get a guild's counters, loading them from the database on first use"""
+        counters = self.guilds.get(guild_id)
+        if counters is None:
+            counters = self.guilds[guild_id] = copy.deepcopy(self.database.get_channel_activity(guild_id))
+        return counters
+    
+    def _get_counter(self, guild_id, channel_id, create=True):
+        """Get a channel's counter"""
+        counters = self._get_guild(str(guild_id))
+        counter = counters.get(str(channel_id))
+        if counter is None and create:
+            counter = counters[str(channel_id)] = new_activity_counter()
+        return counter
+    
+    def _mark_dirty(self, guild_id, channel_id):
+        """Remember a channel to write on the next flush"""
+        self.dirty.setdefault(str(guild_id), set()).add(str(channel_id))
+    
+    def record(self, guild_id, channel_id, timestamp=None):
+        """Count one live message"""
+        add_activity(self._get_counter(guild_id, channel_id), timestamp or time.time())
+        self._mark_dirty(guild_id, channel_id)
+    
+    def get_counts(self, guild_id, channel_id, now=None):
+        """Get a channel's all-time, 24 hour and 7 day counts
+        
+        Returns:
+            dict: The counts with since and backfilled, or None if the channel was never counted
+        """
+        counter = self._get_counter(guild_id, channel_id, create=False)
+        if counter is None:
+            return None
+        return read_activity_counter(counter, now)
+    
+    def get_backfill_cursor(self, guild_id, channel_id):
+        """Get the ID to read a channel's history before, or None if the backfill is done
+        
+        Returns:
+            tuple: (message ID or None, timestamp live counting started at)
+        """
+        counter = self._get_counter(guild_id, channel_id)
+        if counter['backfilled']:
+            return None
+        return counter['backfill_before'], counter['since']
+    
+    def add_history(self, guild_id, channel_id, timestamps, before, done):
+        """Count one page of messages read from a channel's history
+        
+        Args:
+            timestamps: Send times of the counted messages
+            before: ID of the oldest message read, where the next page starts
+            done: Whether the start of the channel was reached
+        """
+        counter = self._get_counter(guild_id, channel_id)
+        for timestamp in timestamps:
+            add_activity(counter, timestamp)
+        counter['backfill_before'] = before
+        counter['backfilled'] = done
+        self._mark_dirty(guild_id, channel_id)
+    
+    def forget_channel(self, guild_id, channel_id):
+        """Drop the counter of a deleted channel"""
+        guild_id, channel_id = str(guild_id), str(channel_id)
+        self._get_guild(guild_id).pop(channel_id, None)
+        self.dirty.get(guild_id, set()).discard(channel_id)
+        self.database.remove_channel_activity(guild_id, channel_id)
+    
+    def flush(self):
+        """Write changed counters to the database
+        
+        Returns:
+            int: The number of channel counters written
+        """
+        written = 0
+        dirty, self.dirty = self.dirty, {}
+        for guild_id, channel_ids in dirty.items():
+            counters = self.guilds.get(guild_id, {})
+            changed = {channel_id: counters[channel_id] for channel_id in channel_ids if channel_id in counters}
+            if changed:
+                self.database.save_channel_activity(guild_id, copy.deepcopy(changed))
+                written += len(changed)
+        
+        if written:
+            logger.debug(f"Saved message counters of {written} channels")
+        return written
+
+def describe_activity(counts):
+    """Format channel counts for an embed field"""
+    if counts is None:
+        return "No messages counted yet"
+    
+    description = f"Total: {counts['all_time']:,}\nLast 24h: {counts['day']:,}\nLast 7d: {counts['week']:,}"
+    if not counts['backfilled']:
+        description += f"\nCounted since <t:{int(counts['since'])}:d>"
+    return description
+
+# Create a global instance of the channel counters
+channel_activity = ChannelActivity(db)
@@ -14,6 +14,7 @@ class DataManager:
         """
         self.file_path = file_path
         self.data = {}
+        self.dirty = False
         self.lock = asyncio.Lock()
         
         # Ensure the directory exists
@@ -41,6 +42,7 @@ class DataManager:
         try:
             with open(self.file_path, 'w') as f:
                 json.dump(self.data, f, indent=4)
+            self.dirty = False
         except Exception as e:
             logger.error(f"Failed to save data to {self.file_path}: {e}")
     
@@ -57,16 +59,33 @@ class DataManager:
         async with self.lock:
             return self.data.get(str(key), default)
     
-    async def set(self, key, value):
+    async def set(self, key, value, save=True):
         """Set a value in the data dictionary.
         
         Args:
             key: The key to set
             value: The value to associate with the key
+            save: Write the file right away. Pass False to batch several
+                changes and call commit() afterwards.
         """
         async with self.lock:
             self.data[str(key)] = value
+            if save:
+                self._save_data()
+            else:
+                self.dirty = True
+    
+    async def commit(self):
+        """Write changes made with save=False to the file.
+        
+        Returns:
+            bool: True if there was anything to write
+        """
+        async with self.lock:
+            if not self.dirty:
+                return False
             self._save_data()
+            return True
     
     async def delete(self, key):
         """Delete a key from the data dictionary.
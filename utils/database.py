@@ -1,29 +1,173 @@
 import json
 import os
 import logging
+import asyncio
+import threading
+import time
 from datetime import datetime, timedelta
 
+from config import CONFIG
+from utils.ranking import RankIndex
+
 logger = logging.getLogger('discord_bot')
 
+# Message counters keep a ring of this many recent days plus rollups for the
+# current week and month, so their size doesn't grow with history
+MESSAGE_HISTORY_DAYS = 30
+MESSAGE_PERIODS = ('all_time', 'today', 'week', 'month')
+
+# Leaderboards ranked by an in-memory index, per data section
+LEADERBOARDS = {
+    'levels': ('levels',),
+    'invites': ('invites',),
+    'message_counts': tuple(f"message_counts:{period}" for period in MESSAGE_PERIODS)
+}
+
+def new_message_counter(now=None):
+    """Create an empty compact message counter"""
+    now = now or datetime.now()
+    today = now.toordinal()
+    
+    return {
+        'all_time': 0,
+        'day': today,
+        'days': [0] * MESSAGE_HISTORY_DAYS,
+        'week_start': today - now.weekday(),
+        'week': 0,
+        'month_id': now.strftime("%Y-%m"),
+        'month': 0
+    }
+
+def roll_message_counter(counter, now):
+    """Move a message counter forward to the current day, week and month
+    
+    Ring slots for days that passed without messages are cleared, and the
+    week and month rollups restart when a new week or month begins.
+    """
+    today = now.toordinal()
+    
+    elapsed = today - counter['day']
+    if elapsed >= MESSAGE_HISTORY_DAYS or elapsed < 0:
+        counter['days'] = [0] * MESSAGE_HISTORY_DAYS
+    else:
+        for day in range(counter['day'] + 1, today + 1):
+            counter['days'][day % MESSAGE_HISTORY_DAYS] = 0
+    counter['day'] = today
+    
+    week_start = today - now.weekday()
+    if counter['week_start'] != week_start:
+        counter['week_start'] = week_start
+        counter['week'] = 0
+    
+    month_id = now.strftime("%Y-%m")
+    if counter['month_id'] != month_id:
+        counter['month_id'] = month_id
+        counter['month'] = 0
+
+def read_message_counter(counter, now):
+    """Read the all-time, today, week and month counts of a message counter"""
+    today = now.toordinal()
+    
+    return {
+        'all_time': counter.get('all_time', 0),
+        'today': counter['days'][today % MESSAGE_HISTORY_DAYS] if counter.get('day') == today else 0,
+        'week': counter['week'] if counter.get('week_start') == today - now.weekday() else 0,
+        'month': counter['month'] if counter.get('month_id') == now.strftime("%Y-%m") else 0
+    }
+
+def message_counter_from_daily(legacy, now):
+    """Build a compact message counter from a legacy {'all_time', 'daily'} record"""
+    counter = new_message_counter(now)
+    counter['all_time'] = legacy.get('all_time', 0)
+    today = counter['day']
+    
+    for date, count in legacy.get('daily', {}).items():
+        try:
+            day = datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            continue
+        
+        if 0 <= today - day.toordinal() < MESSAGE_HISTORY_DAYS:
+            counter['days'][day.toordinal() % MESSAGE_HISTORY_DAYS] += count
+        if day.toordinal() >= counter['week_start'] and day.toordinal() <= today:
+            counter['week'] += count
+        if day.strftime("%Y-%m") == counter['month_id']:
+            counter['month'] += count
+    
+    return counter
+
 class JsonDatabase:
-    """Simple JSON file-based database for storing bot data"""
+    """Simple JSON file-based database for storing bot data
+    
+    Changes are recorded as one compact line per mutation in an append-only
+    journal next to the snapshot file. When the journal grows past
+    journal_max_bytes it is compacted into a fresh snapshot. On load the
+    snapshot is read and the journal tail replayed on top of it.
+    """
     
-    def __init__(self):
-        """Initialize the database"""
+    def __init__(self, db_file=None, journal_file=None):
+        """Initialize the database
+        
+        Args:
+            db_file: Path to the JSON snapshot. Defaults to the configured database file.
+            journal_file: Path to the journal. Defaults to the snapshot path with a .journal extension.
+        """
+        settings = CONFIG.get('database', {})
+        
         self.data = {
             'autoroles': {},
             'levels': {},
             'tickets': {},
+            'ticket_archive': {},
             'invites': {},
             'message_counts': {},
+            'channel_activity': {},
             'reaction_roles': {},
             'giveaways': {}
         }
-        self.db_file = 'bot_database.json'
+        self.db_file = db_file or settings.get('file', 'bot_database.json')
+        self.journal_file = journal_file or f"{os.path.splitext(self.db_file)[0]}.journal"
+        self.journal_max_bytes = settings.get('journal_max_bytes', 1024 * 1024)
+        
+        # Write-behind settings: mutations only mark the store dirty and a
+        # background task persists them every flush_interval seconds, or
+        # sooner once flush_threshold unsaved changes have piled up
+        self.write_behind = settings.get('write_behind', True)
+        self.flush_interval = settings.get('flush_interval', 5)
+        self.flush_threshold = settings.get('flush_threshold', 100)
+        self._flusher = None
+        self._flush_event = None
+        self._write_lock = threading.Lock()
+        
+        # Journal state: every mutation gets a sequence number. The snapshot
+        # remembers the last sequence it contains so replay can skip entries
+        # that were already compacted into it.
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._snapshot_gen = 0
+        self._written_gen = 0
+        self._pending_ops = []
+        self._snapshot_requested = False
+        self._journal_size = 0
+        
+        # Reverse invite index: guild ID -> invitee ID -> (inviter ID, join record)
+        self.invitee_index = {}
+        
+        # Open ticket index: guild ID -> user ID -> ticket channel ID
+        self.open_tickets = {}
+        
+        # Participant sets of giveaways, built on first use:
+        # (guild ID, message ID) -> set of user IDs
+        self.giveaway_participants = {}
+        
+        # Leaderboard ranking indexes, built on first use:
+        # (board, guild ID) -> (period ID, RankIndex)
+        self.leaderboards = {}
+        
         self._load_data()
     
     def _load_data(self):
-        """Load data from the JSON file"""
+        """Load the snapshot and replay the journal on top of it"""
         if os.path.exists(self.db_file):
             try:
                 with open(self.db_file, 'r') as f:
@@ -35,19 +179,327 @@ class JsonDatabase:
                 logger.error(f"Error loading database: {e}")
         else:
             logger.info(f"Database file {self.db_file} not found, creating new database")
-            self._save_data()
+        
+        self._seq = self._snapshot_seq = self.data.pop('_journal_seq', 0)
+        self._replay_journal()
+        
+        # Older databases kept one entry per date forever; fold them into
+        # compact counters and write the result out with the next snapshot
+        converted = self._upgrade_message_counts()
+        if converted:
+            logger.info(f"Converted message history of {converted} users to compact counters")
+            self._snapshot_requested = True
+        
+        # Closed tickets used to stay next to the open ones forever
+        archived = self._archive_closed_tickets()
+        if archived:
+            logger.info(f"Moved {archived} closed tickets to the ticket archive")
+            self._snapshot_requested = True
+        
+        self._rebuild_invitee_index()
+        self._rebuild_open_tickets()
+        
+        if (not os.path.exists(self.db_file) or self._snapshot_requested
+                or self._journal_size >= self.journal_max_bytes):
+            self.compact()
+    
+    def _replay_journal(self):
+        """Apply journal entries newer than the snapshot"""
+        if not os.path.exists(self.journal_file):
+            return
+        
+        started = time.perf_counter()
+        entries = []
+        try:
+            with open(self.journal_file, 'r') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash while appending can only tear the last line.
+                        # Compact right away so new entries aren't appended after it.
+                        logger.warning(f"Ignoring corrupt journal entry at {self.journal_file}:{line_number}")
+                        self._snapshot_requested = True
+                        break
+                    if entry['seq'] > self._snapshot_seq:
+                        entries.append(entry)
+            self._journal_size = os.path.getsize(self.journal_file)
+        except Exception as e:
+            logger.error(f"Error reading journal: {e}")
+            return
+        
+        # Entries from concurrent flushes may be appended out of order
+        entries.sort(key=lambda entry: entry['seq'])
+        for entry in entries:
+            self._apply(entry['op'], entry['path'], entry.get('value'))
+        if entries:
+            self._seq = entries[-1]['seq']
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        logger.info(f"Replayed {len(entries)} journal entries from {self.journal_file} in {elapsed:.1f}ms")
+    
+    def _apply(self, op, path, value=None):
+        """Apply a single journal operation to the in-memory data"""
+        target = self.data
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        key = path[-1]
+        
+        if op == 'set':
+            target[key] = value
+        elif op == 'del':
+            target.pop(key, None)
+        elif op == 'update':
+            target.setdefault(key, {}).update(value)
+        elif op == 'append':
+            target.setdefault(key, []).append(value)
+        elif op == 'remove':
+            if value in target.get(key, []):
+                target[key].remove(value)
+        elif op == 'extend':
+            target.setdefault(key, []).extend(value)
+        elif op == 'discard':
+            removed = set(value)
+            target[key] = [item for item in target.get(key, []) if item not in removed]
+        else:
+            logger.warning(f"Unknown journal operation: {op}")
+    
+    def _journal(self, op, path, value=None):
+        """Record a mutation that was already applied to self.data
+        
+        Args:
+            op: One of set, del, update, append, remove, extend or discard
+            path: List of keys leading to the changed value
+            value: The new value, merged fields, list item or list of items
+        """
+        self._seq += 1
+        entry = {'seq': self._seq, 'op': op, 'path': path}
+        if value is not None:
+            entry['value'] = value
+        self._pending_ops.append(json.dumps(entry, separators=(',', ':')))
+        return self._schedule_flush()
     
     def _save_data(self):
-        """Save data to the JSON file"""
+        """Persist the whole data set
+        
+        Mutators journal their changes instead; this is for code that edits
+        self.data directly and forces a full snapshot on the next flush.
+        """
+        self._snapshot_requested = True
+        return self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """Hand pending changes to the background flusher
+        
+        Without a running event loop (scripts, shell) or with write-behind
+        disabled, the changes are written immediately.
+        """
+        if not self.write_behind or not self._ensure_flusher():
+            return self.flush()
+        
+        if len(self._pending_ops) >= self.flush_threshold or self._snapshot_requested:
+            self._flush_event.set()
+        return True
+    
+    def _ensure_flusher(self):
+        """Start the background flusher on the running event loop if needed"""
         try:
-            with open(self.db_file, 'w') as f:
-                json.dump(self.data, f, indent=4)
-            logger.info(f"Database saved to {self.db_file}")
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        
+        if self._flusher is None or self._flusher.done() or self._flusher.get_loop() is not loop:
+            self._flush_event = asyncio.Event()
+            self._flusher = loop.create_task(self._flush_loop())
+        return True
+    
+    async def _flush_loop(self):
+        """Persist pending changes periodically without blocking the event loop"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            
+            if not self._pending_ops and not self._snapshot_requested:
+                continue
+            
+            # Serialize on the loop so the snapshot is consistent, then hand
+            # the disk writes to a worker thread
+            batch = self._take_batch()
+            if batch is None:
+                continue
+            if not await asyncio.to_thread(self._write_batch, *batch):
+                self._requeue_batch(*batch)
+    
+    def _take_batch(self):
+        """Collect pending journal lines and, if due, a serialized snapshot"""
+        lines, self._pending_ops = self._pending_ops, []
+        snapshot = None
+        snapshot_seq = self._seq
+        
+        if self._snapshot_requested or self._journal_size >= self.journal_max_bytes:
+            try:
+                snapshot = json.dumps({**self.data, '_journal_seq': self._seq}, indent=4)
+            except Exception as e:
+                logger.error(f"Error serializing database: {e}")
+                self._pending_ops[:0] = lines
+                return None
+            self._snapshot_requested = False
+            self._snapshot_gen += 1
+        
+        return lines, snapshot, self._snapshot_gen, snapshot_seq
+    
+    def _requeue_batch(self, lines, snapshot, gen, snapshot_seq):
+        """Put a batch that failed to write back in line for the next flush"""
+        self._pending_ops[:0] = lines
+        if snapshot is not None:
+            self._snapshot_requested = True
+    
+    def _write_batch(self, lines, snapshot, gen, snapshot_seq):
+        """Append journal lines and, when given, replace the snapshot
+        
+        Returns:
+            bool: True if everything was written successfully
+        """
+        try:
+            with self._write_lock:
+                if lines:
+                    payload = '\n'.join(lines) + '\n'
+                    with open(self.journal_file, 'a') as f:
+                        f.write(payload)
+                    self._journal_size += len(payload)
+                
+                # A newer snapshot already reached the disk, don't roll it back
+                if snapshot is not None and gen > self._written_gen:
+                    tmp_file = f"{self.db_file}.tmp"
+                    with open(tmp_file, 'w') as f:
+                        f.write(snapshot)
+                    os.replace(tmp_file, self.db_file)
+                    self._written_gen = gen
+                    
+                    # Drop the journal entries the snapshot holds. A flush() that
+                    # ran while this batch was being written may have appended
+                    # newer ones, which must stay. If we crash before rewriting,
+                    # replay skips the old ones by seq.
+                    self._journal_size = self._trim_journal(snapshot_seq)
+                    logger.info(f"Database compacted into {self.db_file}")
             return True
         except Exception as e:
             logger.error(f"Error saving database: {e}")
             return False
     
+    def _trim_journal(self, snapshot_seq):
+        """Rewrite the journal without the entries up to snapshot_seq
+        
+        Returns:
+            int: The size of the remaining journal in bytes
+        """
+        kept = []
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        if json.loads(line)['seq'] > snapshot_seq:
+                            kept.append(line)
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+        
+        payload = ''.join(kept)
+        tmp_file = f"{self.journal_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_file, self.journal_file)
+        return len(payload)
+    
+    def flush(self):
+        """Write all pending changes to disk right away
+        
+        Call this on shutdown (and in tests) to make sure nothing buffered by
+        the write-behind flusher is lost.
+        
+        Returns:
+            bool: True if the data was saved successfully
+        """
+        batch = self._take_batch()
+        if batch is None:
+            return False
+        if not self._write_batch(*batch):
+            self._requeue_batch(*batch)
+            return False
+        return True
+    
+    def compact(self):
+        """Fold the journal into a fresh snapshot right away
+        
+        Returns:
+            bool: True if the snapshot was saved successfully
+        """
+        self._snapshot_requested = True
+        return self.flush()
+    
+    # Leaderboard indexes
+    def _leaderboard_period(self, board, now):
+        """Get the ID of the period a leaderboard covers, so indexes of past periods are rebuilt"""
+        if board == 'message_counts:today':
+            return now.toordinal()
+        if board == 'message_counts:week':
+            return now.toordinal() - now.weekday()
+        if board == 'message_counts:month':
+            return now.strftime("%Y-%m")
+        return None
+    
+    def _leaderboard_score(self, board, guild_id, user_id, now):
+        """Get a user's score on a leaderboard, or None if they have no record"""
+        section = board.split(':')[0]
+        record = self.data.get(section, {}).get(guild_id, {}).get(user_id)
+        if record is None:
+            return None
+        
+        if section == 'levels':
+            return (record['level'], record['xp'])
+        if section == 'invites':
+            return max(record['joins'] - record['left'] - record['fake'], 0)
+        return read_message_counter(record, now)[board.split(':')[1]]
+    
+    def _get_leaderboard(self, board, guild_id, now):
+        """Get the ranking index of a guild leaderboard, building it on first use"""
+        period = self._leaderboard_period(board, now)
+        entry = self.leaderboards.get((board, guild_id))
+        
+        if entry is None or entry[0] != period:
+            users = self.data.get(board.split(':')[0], {}).get(guild_id, {})
+            index = RankIndex({
+                user_id: self._leaderboard_score(board, guild_id, user_id, now)
+                for user_id in users
+            })
+            entry = self.leaderboards[(board, guild_id)] = (period, index)
+        
+        return entry[1]
+    
+    def _update_leaderboards(self, section, guild_id, user_id):
+        """Move a user in the already built leaderboard indexes of a data section"""
+        now = datetime.now()
+        
+        for board in LEADERBOARDS[section]:
+            entry = self.leaderboards.get((board, guild_id))
+            if entry is None:
+                continue
+            
+            if entry[0] != self._leaderboard_period(board, now):
+                # A new day, week or month began; rebuild on the next read
+                del self.leaderboards[(board, guild_id)]
+                continue
+            
+            score = self._leaderboard_score(board, guild_id, user_id, now)
+            if score is None:
+                entry[1].remove(user_id)
+            else:
+                entry[1].update(user_id, score)
+    
     # Autorole methods
     def set_autorole(self, guild_id, role_id):
         """Set an autorole for a guild"""
@@ -55,7 +507,7 @@ class JsonDatabase:
         if 'autoroles' not in self.data:
             self.data['autoroles'] = {}
         self.data['autoroles'][guild_id] = role_id
-        return self._save_data()
+        return self._journal('set', ['autoroles', guild_id], role_id)
     
     def get_autorole(self, guild_id):
         """Get the autorole for a guild"""
@@ -67,7 +519,7 @@ class JsonDatabase:
         guild_id = str(guild_id)
         if guild_id in self.data.get('autoroles', {}):
             del self.data['autoroles'][guild_id]
-            return self._save_data()
+            return self._journal('del', ['autoroles', guild_id])
         return False
     
     # Levels methods
@@ -98,24 +550,23 @@ class JsonDatabase:
         new_level = user_data['xp'] // 100
         user_data['level'] = new_level
         
-        self._save_data()
+        self._journal('set', ['levels', guild_id, user_id], user_data)
+        self._update_leaderboards('levels', guild_id, user_id)
         
         # Return True if user leveled up
         return new_level > old_level
     
-    def get_level_leaderboard(self, guild_id, limit=10):
-        """Get the level leaderboard for a guild"""
+    def get_level_leaderboard(self, guild_id, limit=10, page=1):
+        """Get a page of the level leaderboard for a guild, ranked by level and then XP"""
         guild_id = str(guild_id)
         guild_levels = self.data.get('levels', {}).get(guild_id, {})
         
-        # Sort users by level and then by XP
-        sorted_users = sorted(
-            guild_levels.items(),
-            key=lambda x: (x[1]['level'], x[1]['xp']),
-            reverse=True
-        )
-        
-        return sorted_users[:limit]
+        index = self._get_leaderboard('levels', guild_id, datetime.now())
+        return [(user_id, guild_levels[user_id]) for user_id, score in index.page(page, limit)]
+    
+    def get_level_rank(self, guild_id, user_id):
+        """Get a user's 1-based position on the level leaderboard, or None if unranked"""
+        return self._get_leaderboard('levels', str(guild_id), datetime.now()).rank(str(user_id))
     
     # Ticket methods
     def create_ticket(self, guild_id, channel_id, user_id):
@@ -132,24 +583,67 @@ class JsonDatabase:
             'created_at': datetime.now().isoformat(),
             'status': 'open'
         }
+        self.open_tickets.setdefault(guild_id, {})[user_id] = channel_id
         
-        return self._save_data()
+        return self._journal('set', ['tickets', guild_id, channel_id], self.data['tickets'][guild_id][channel_id])
     
     def close_ticket(self, guild_id, channel_id):
-        """Close a ticket"""
+        """Close a ticket and move it to the ticket archive"""
         guild_id, channel_id = str(guild_id), str(channel_id)
         
-        if channel_id in self.data.get('tickets', {}).get(guild_id, {}):
-            self.data['tickets'][guild_id][channel_id]['status'] = 'closed'
-            self.data['tickets'][guild_id][channel_id]['closed_at'] = datetime.now().isoformat()
-            return self._save_data()
+        ticket_data = self.data.get('tickets', {}).get(guild_id, {}).pop(channel_id, None)
+        if ticket_data is None:
+            return False
         
-        return False
+        ticket_data['status'] = 'closed'
+        ticket_data['closed_at'] = datetime.now().isoformat()
+        self.data.setdefault('ticket_archive', {}).setdefault(guild_id, {})[channel_id] = ticket_data
+        
+        guild_open = self.open_tickets.get(guild_id, {})
+        if guild_open.get(ticket_data['user_id']) == channel_id:
+            del guild_open[ticket_data['user_id']]
+        
+        self._journal('del', ['tickets', guild_id, channel_id])
+        return self._journal('set', ['ticket_archive', guild_id, channel_id], ticket_data)
     
     def get_ticket(self, guild_id, channel_id):
-        """Get ticket information"""
+        """Get ticket information, including archived tickets"""
         guild_id, channel_id = str(guild_id), str(channel_id)
-        return self.data.get('tickets', {}).get(guild_id, {}).get(channel_id)
+        
+        ticket_data = self.data.get('tickets', {}).get(guild_id, {}).get(channel_id)
+        if ticket_data is None:
+            ticket_data = self.data.get('ticket_archive', {}).get(guild_id, {}).get(channel_id)
+        return ticket_data
+    
+    def get_open_ticket(self, guild_id, user_id):
+        """Get the channel ID of a user's open ticket, if they have one"""
+        return self.open_tickets.get(str(guild_id), {}).get(str(user_id))
+    
+    def _archive_closed_tickets(self):
+        """Move closed tickets out of the open ticket data
+        
+        Returns:
+            int: The number of archived tickets
+        """
+        archived = 0
+        archive = self.data.setdefault('ticket_archive', {})
+        
+        for guild_id, guild_tickets in self.data.get('tickets', {}).items():
+            for channel_id in [channel_id for channel_id, ticket_data in guild_tickets.items()
+                               if ticket_data.get('status') != 'open']:
+                archive.setdefault(guild_id, {})[channel_id] = guild_tickets.pop(channel_id)
+                archived += 1
+        
+        return archived
+    
+    def _rebuild_open_tickets(self):
+        """Rebuild the user -> open ticket index from the ticket data"""
+        self.open_tickets = {}
+        
+        for guild_id, guild_tickets in self.data.get('tickets', {}).items():
+            guild_open = self.open_tickets.setdefault(guild_id, {})
+            for channel_id, ticket_data in guild_tickets.items():
+                guild_open[ticket_data['user_id']] = channel_id
     
     # Invite methods
     def track_invite(self, guild_id, inviter_id, invitee_id, is_fake=False, is_rejoin=False):
@@ -181,28 +675,82 @@ class JsonDatabase:
             inviter_data['rejoins'] += 1
         
         # Add the invitee to the list
-        inviter_data['invitees'].append({
+        invitee = {
             'user_id': invitee_id,
             'joined_at': datetime.now().isoformat(),
             'is_fake': is_fake,
             'is_rejoin': is_rejoin
+        }
+        inviter_data['invitees'].append(invitee)
+        self.invitee_index.setdefault(guild_id, {})[invitee_id] = (inviter_id, invitee)
+        
+        self._journal('update', ['invites', guild_id, inviter_id], {
+            'joins': inviter_data['joins'],
+            'left': inviter_data['left'],
+            'fake': inviter_data['fake'],
+            'rejoins': inviter_data['rejoins']
         })
+        self._update_leaderboards('invites', guild_id, inviter_id)
+        return self._journal('append', ['invites', guild_id, inviter_id, 'invitees'], invitee)
+    
+    def _rebuild_invitee_index(self):
+        """Rebuild the invitee -> inviter index from the invite data"""
+        self.invitee_index = {}
         
-        return self._save_data()
+        for guild_id, guild_invites in self.data.get('invites', {}).items():
+            guild_index = self.invitee_index.setdefault(guild_id, {})
+            for inviter_id, inviter_data in guild_invites.items():
+                for invitee in inviter_data.get('invitees', []):
+                    # Keep the most recent join when a user was invited more than once
+                    indexed = guild_index.get(invitee['user_id'])
+                    if indexed is None or invitee.get('joined_at', '') >= indexed[1].get('joined_at', ''):
+                        guild_index[invitee['user_id']] = (inviter_id, invitee)
+    
+    def get_inviter(self, guild_id, user_id):
+        """Get who invited a user and the record of that join
+        
+        Returns:
+            tuple: (inviter ID, join record) of the user's most recent tracked join, or None
+        """
+        return self.invitee_index.get(str(guild_id), {}).get(str(user_id))
     
     def track_leave(self, guild_id, user_id):
         """Track a user leaving"""
         guild_id, user_id = str(guild_id), str(user_id)
         
         # Find which inviter invited this user
-        for inviter_id, inviter_data in self.data.get('invites', {}).get(guild_id, {}).items():
-            for invitee in inviter_data.get('invitees', []):
-                if invitee['user_id'] == user_id:
-                    # Found the inviter, increment left count
-                    self.data['invites'][guild_id][inviter_id]['left'] += 1
-                    return self._save_data()
+        invite = self.get_inviter(guild_id, user_id)
+        if invite is None:
+            return False
         
-        return False
+        inviter_id = invite[0]
+        inviter_data = self.data.get('invites', {}).get(guild_id, {}).get(inviter_id)
+        if inviter_data is None:
+            return False
+        
+        # Found the inviter, increment left count
+        inviter_data['left'] += 1
+        self._update_leaderboards('invites', guild_id, inviter_id)
+        return self._journal('update', ['invites', guild_id, inviter_id], {
+            'left': inviter_data['left']
+        })
+    
+    def has_joined_before(self, guild_id, user_id):
+        """Check whether a user has been tracked as an invitee in a guild before"""
+        return self.get_inviter(guild_id, user_id) is not None
+    
+    def get_last_join_times(self):
+        """Get when each guild's most recent tracked join happened
+        
+        Returns:
+            dict: Guild ID -> ISO timestamp of the latest tracked join
+        """
+        last_joins = {}
+        for guild_id, guild_index in self.invitee_index.items():
+            joined = [invitee.get('joined_at', '') for inviter_id, invitee in guild_index.values()]
+            if any(joined):
+                last_joins[guild_id] = max(joined)
+        return last_joins
     
     def get_invite_stats(self, guild_id, user_id):
         """Get invite statistics for a user"""
@@ -229,26 +777,14 @@ class JsonDatabase:
             'rejoins': inviter_data['rejoins']
         }
     
-    def get_invite_leaderboard(self, guild_id, limit=10):
-        """Get the invite leaderboard for a guild"""
-        guild_id = str(guild_id)
-        guild_invites = self.data.get('invites', {}).get(guild_id, {})
-        
-        # Calculate total invites for each user
-        leaderboard = []
-        for user_id, data in guild_invites.items():
-            total = data['joins'] - data['left'] - data['fake']
-            if total < 0:
-                total = 0
-            leaderboard.append({
-                'user_id': user_id,
-                'total': total
-            })
-        
-        # Sort by total invites
-        leaderboard.sort(key=lambda x: x['total'], reverse=True)
-        
-        return leaderboard[:limit]
+    def get_invite_leaderboard(self, guild_id, limit=10, page=1):
+        """Get a page of the invite leaderboard for a guild, ranked by total real invites"""
+        index = self._get_leaderboard('invites', str(guild_id), datetime.now())
+        return [{'user_id': user_id, 'total': total} for user_id, total in index.page(page, limit)]
+    
+    def get_invite_rank(self, guild_id, user_id):
+        """Get a user's 1-based position on the invite leaderboard, or None if unranked"""
+        return self._get_leaderboard('invites', str(guild_id), datetime.now()).rank(str(user_id))
     
     # Message tracking methods
     def increment_message_count(self, guild_id, user_id):
@@ -260,71 +796,110 @@ class JsonDatabase:
         if guild_id not in self.data['message_counts']:
             self.data['message_counts'][guild_id] = {}
         if user_id not in self.data['message_counts'][guild_id]:
-            self.data['message_counts'][guild_id][user_id] = {
-                'all_time': 0,
-                'daily': {},
-            }
-        
-        # Increment all-time counter
-        self.data['message_counts'][guild_id][user_id]['all_time'] += 1
+            self.data['message_counts'][guild_id][user_id] = new_message_counter()
         
-        # Increment today's counter
-        today = datetime.now().strftime("%Y-%m-%d")
-        if 'daily' not in self.data['message_counts'][guild_id][user_id]:
-            self.data['message_counts'][guild_id][user_id]['daily'] = {}
+        counter = self.data['message_counts'][guild_id][user_id]
+        roll_message_counter(counter, datetime.now())
         
-        if today not in self.data['message_counts'][guild_id][user_id]['daily']:
-            self.data['message_counts'][guild_id][user_id]['daily'][today] = 0
+        # Increment all-time, today's, this week's and this month's counters
+        counter['all_time'] += 1
+        counter['days'][counter['day'] % MESSAGE_HISTORY_DAYS] += 1
+        counter['week'] += 1
+        counter['month'] += 1
         
-        self.data['message_counts'][guild_id][user_id]['daily'][today] += 1
-        
-        return self._save_data()
+        self._update_leaderboards('message_counts', guild_id, user_id)
+        return self._journal('set', ['message_counts', guild_id, user_id], counter)
     
     def get_message_stats(self, guild_id, user_id):
         """Get message statistics for a user"""
         guild_id, user_id = str(guild_id), str(user_id)
         
-        user_data = self.data.get('message_counts', {}).get(guild_id, {}).get(user_id, {
-            'all_time': 0,
-            'daily': {}
-        })
+        counter = self.data.get('message_counts', {}).get(guild_id, {}).get(user_id, new_message_counter())
+        return read_message_counter(counter, datetime.now())
+    
+    def reset_message_stats(self, guild_id, user_id):
+        """Reset message statistics for a user
         
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_count = user_data.get('daily', {}).get(today, 0)
+        Returns:
+            bool: False if the user has no message statistics
+        """
+        guild_id, user_id = str(guild_id), str(user_id)
         
-        return {
-            'all_time': user_data.get('all_time', 0),
-            'today': today_count
-        }
+        if user_id not in self.data.get('message_counts', {}).get(guild_id, {}):
+            return False
+        
+        self.data['message_counts'][guild_id][user_id] = new_message_counter()
+        self._update_leaderboards('message_counts', guild_id, user_id)
+        return self._journal('set', ['message_counts', guild_id, user_id], self.data['message_counts'][guild_id][user_id])
     
-    def get_message_leaderboard(self, guild_id, limit=10, period='all_time'):
-        """Get the message leaderboard for a guild"""
+    def get_channel_activity(self, guild_id):
+        """Get the message activity counters of every channel in a guild
+        
+        Returns:
+            dict: Channel ID -> activity counter
+        """
+        return self.data.get('channel_activity', {}).get(str(guild_id), {})
+    
+    def save_channel_activity(self, guild_id, counters):
+        """Store the activity counters of some channels in a guild
+        
+        Args:
+            counters: Channel ID -> activity counter
+        """
         guild_id = str(guild_id)
-        guild_messages = self.data.get('message_counts', {}).get(guild_id, {})
-        
-        leaderboard = []
-        
-        if period == 'all_time':
-            # Get all-time message counts
-            for user_id, data in guild_messages.items():
-                leaderboard.append({
-                    'user_id': user_id,
-                    'count': data.get('all_time', 0)
-                })
-        elif period == 'today':
-            # Get today's message counts
-            today = datetime.now().strftime("%Y-%m-%d")
-            for user_id, data in guild_messages.items():
-                count = data.get('daily', {}).get(today, 0)
-                leaderboard.append({
-                    'user_id': user_id,
-                    'count': count
-                })
-        
-        # Sort by message count
-        leaderboard.sort(key=lambda x: x['count'], reverse=True)
-        
-        return leaderboard[:limit]
+        
+        self.data.setdefault('channel_activity', {}).setdefault(guild_id, {}).update(counters)
+        return self._journal('update', ['channel_activity', guild_id], counters)
+    
+    def remove_channel_activity(self, guild_id, channel_id):
+        """Delete the activity counter of a channel"""
+        guild_id, channel_id = str(guild_id), str(channel_id)
+        
+        if channel_id not in self.data.get('channel_activity', {}).get(guild_id, {}):
+            return False
+        
+        del self.data['channel_activity'][guild_id][channel_id]
+        return self._journal('del', ['channel_activity', guild_id, channel_id])
+    
+    def get_message_leaderboard(self, guild_id, limit=10, period='all_time', page=1):
+        """Get the message leaderboard for a guild
+        
+        Args:
+            guild_id: The guild to rank
+            limit: Number of entries per page
+            period: One of all_time, today, week or month
+            page: 1-based page of the leaderboard
+        """
+        if period not in MESSAGE_PERIODS:
+            return []
+        
+        index = self._get_leaderboard(f"message_counts:{period}", str(guild_id), datetime.now())
+        return [{'user_id': user_id, 'count': count} for user_id, count in index.page(page, limit)]
+    
+    def get_message_rank(self, guild_id, user_id, period='all_time'):
+        """Get a user's 1-based position on the message leaderboard, or None if unranked"""
+        if period not in MESSAGE_PERIODS:
+            return None
+        
+        index = self._get_leaderboard(f"message_counts:{period}", str(guild_id), datetime.now())
+        return index.rank(str(user_id))
+    
+    def _upgrade_message_counts(self):
+        """Convert legacy per-date message dicts into compact counters
+        
+        Returns:
+            int: The number of converted users
+        """
+        converted = 0
+        now = datetime.now()
+        
+        for guild_messages in self.data.get('message_counts', {}).values():
+            for user_id, counter in guild_messages.items():
+                if 'daily' in counter:
+                    guild_messages[user_id] = message_counter_from_daily(counter, now)
+                    converted += 1
+        
+        return converted
     
     # Reaction roles methods
     def set_reaction_role(self, guild_id, message_id, role_id, emoji):
@@ -343,7 +918,7 @@ class JsonDatabase:
             if role['emoji'] == emoji:
                 # Update existing role
                 self.data['reaction_roles'][guild_id][message_id][i]['role_id'] = role_id
-                return self._save_data()
+                return self._journal('set', ['reaction_roles', guild_id, message_id], self.data['reaction_roles'][guild_id][message_id])
         
         # Add new role
         self.data['reaction_roles'][guild_id][message_id].append({
@@ -351,13 +926,32 @@ class JsonDatabase:
             'emoji': emoji
         })
         
-        return self._save_data()
+        return self._journal('set', ['reaction_roles', guild_id, message_id], self.data['reaction_roles'][guild_id][message_id])
     
     def get_reaction_roles(self, guild_id, message_id):
         """Get reaction roles for a message"""
         guild_id, message_id = str(guild_id), str(message_id)
         return self.data.get('reaction_roles', {}).get(guild_id, {}).get(message_id, [])
     
+    def get_guild_reaction_roles(self, guild_id):
+        """Get all reaction role messages for a guild, keyed by message ID"""
+        guild_id = str(guild_id)
+        return self.data.get('reaction_roles', {}).get(guild_id, {})
+    
+    def get_all_reaction_roles(self):
+        """Get all reaction role messages, keyed by guild ID and message ID"""
+        return self.data.get('reaction_roles', {})
+    
+    def delete_reaction_role_message(self, guild_id, message_id):
+        """Remove every reaction role attached to a message"""
+        guild_id, message_id = str(guild_id), str(message_id)
+        
+        if message_id in self.data.get('reaction_roles', {}).get(guild_id, {}):
+            del self.data['reaction_roles'][guild_id][message_id]
+            return self._journal('del', ['reaction_roles', guild_id, message_id])
+        
+        return False
+    
     def remove_reaction_role(self, guild_id, message_id, emoji):
         """Remove a reaction role"""
         guild_id, message_id = str(guild_id), str(message_id)
@@ -367,7 +961,7 @@ class JsonDatabase:
             for i, role in enumerate(roles):
                 if role['emoji'] == emoji:
                     del self.data['reaction_roles'][guild_id][message_id][i]
-                    return self._save_data()
+                    return self._journal('set', ['reaction_roles', guild_id, message_id], roles)
         
         return False
     
@@ -382,6 +976,7 @@ class JsonDatabase:
         if guild_id not in self.data['giveaways']:
             self.data['giveaways'][guild_id] = {}
         
+        self.giveaway_participants.pop((guild_id, message_id), None)
         self.data['giveaways'][guild_id][message_id] = {
             'channel_id': channel_id,
             'prize': prize,
@@ -391,49 +986,105 @@ class JsonDatabase:
             'participants': []
         }
         
-        return self._save_data()
+        return self._journal('set', ['giveaways', guild_id, message_id], self.data['giveaways'][guild_id][message_id])
     
     def add_giveaway_participant(self, guild_id, message_id, user_id):
         """Add a participant to a giveaway"""
-        guild_id, message_id, user_id = str(guild_id), str(message_id), str(user_id)
-        
-        if message_id in self.data.get('giveaways', {}).get(guild_id, {}):
-            if user_id not in self.data['giveaways'][guild_id][message_id]['participants']:
-                self.data['giveaways'][guild_id][message_id]['participants'].append(user_id)
-                return self._save_data()
-        
-        return False
+        return self.add_giveaway_participants(guild_id, message_id, [user_id]) > 0
     
     def remove_giveaway_participant(self, guild_id, message_id, user_id):
         """Remove a participant from a giveaway"""
-        guild_id, message_id, user_id = str(guild_id), str(message_id), str(user_id)
+        return self.remove_giveaway_participants(guild_id, message_id, [user_id]) > 0
+    
+    def add_giveaway_participants(self, guild_id, message_id, user_ids):
+        """Add a batch of participants to a giveaway with a single journal entry
+        
+        Returns:
+            int: The number of users that weren't participating yet
+        """
+        guild_id, message_id = str(guild_id), str(message_id)
+        
+        participants = self._get_giveaway_participants(guild_id, message_id)
+        if participants is None:
+            return 0
+        
+        added = []
+        for user_id in map(str, user_ids):
+            if user_id not in participants:
+                participants.add(user_id)
+                added.append(user_id)
+        
+        if added:
+            self.data['giveaways'][guild_id][message_id]['participants'].extend(added)
+            self._journal('extend', ['giveaways', guild_id, message_id, 'participants'], added)
+        return len(added)
+    
+    def remove_giveaway_participants(self, guild_id, message_id, user_ids):
+        """Remove a batch of participants from a giveaway with a single journal entry
+        
+        Returns:
+            int: The number of removed participants
+        """
+        guild_id, message_id = str(guild_id), str(message_id)
+        
+        participants = self._get_giveaway_participants(guild_id, message_id)
+        if participants is None:
+            return 0
+        
+        removed = {user_id for user_id in map(str, user_ids) if user_id in participants}
+        if removed:
+            participants.difference_update(removed)
+            giveaway = self.data['giveaways'][guild_id][message_id]
+            giveaway['participants'][:] = [user_id for user_id in giveaway['participants'] if user_id not in removed]
+            self._journal('discard', ['giveaways', guild_id, message_id, 'participants'], sorted(removed))
+        return len(removed)
+    
+    def _get_giveaway_participants(self, guild_id, message_id):
+        """Get the participant set of a giveaway, building it on first use"""
+        participants = self.giveaway_participants.get((guild_id, message_id))
+        if participants is None:
+            giveaway = self.data.get('giveaways', {}).get(guild_id, {}).get(message_id)
+            if giveaway is None:
+                return None
+            participants = self.giveaway_participants[(guild_id, message_id)] = set(giveaway['participants'])
+        return participants
+    
+    def set_giveaway_bonus(self, guild_id, message_id, bonus):
+        """Set the bonus entry rules of a giveaway
+        
+        Args:
+            bonus: List of {'type', 'target', 'multiplier'} rules
+        """
+        guild_id, message_id = str(guild_id), str(message_id)
         
         if message_id in self.data.get('giveaways', {}).get(guild_id, {}):
-            if user_id in self.data['giveaways'][guild_id][message_id]['participants']:
-                self.data['giveaways'][guild_id][message_id]['participants'].remove(user_id)
-                return self._save_data()
+            self.data['giveaways'][guild_id][message_id]['bonus'] = bonus
+            return self._journal('update', ['giveaways', guild_id, message_id], {'bonus': bonus})
         
         return False
     
+    def is_giveaway_running(self, guild_id, message_id):
+        """Check whether a giveaway exists and has not ended"""
+        giveaway = self.get_giveaway(guild_id, message_id)
+        return giveaway is not None and not giveaway.get('ended')
+    
     def get_giveaway(self, guild_id, message_id):
         """Get giveaway information"""
         guild_id, message_id = str(guild_id), str(message_id)
         return self.data.get('giveaways', {}).get(guild_id, {}).get(message_id)
     
     def get_active_giveaways(self):
-        """Get all active giveaways"""
+        """Get all giveaways that have not been ended yet, including overdue ones"""
         active_giveaways = []
-        now = datetime.now()
         
         for guild_id, guild_giveaways in self.data.get('giveaways', {}).items():
             for message_id, giveaway in guild_giveaways.items():
-                end_time = datetime.fromisoformat(giveaway['end_time'])
-                if end_time > now:
+                if not giveaway.get('ended'):
                     active_giveaways.append({
                         'guild_id': guild_id,
                         'message_id': message_id,
                         'channel_id': giveaway['channel_id'],
-                        'end_time': end_time,
+                        'end_time': datetime.fromisoformat(giveaway['end_time']),
                         'data': giveaway
                     })
         
@@ -444,11 +1095,26 @@ class JsonDatabase:
         guild_id, message_id = str(guild_id), str(message_id)
         
         if message_id in self.data.get('giveaways', {}).get(guild_id, {}):
+            # Ended giveaways only need their list for rerolls
+            self.giveaway_participants.pop((guild_id, message_id), None)
             self.data['giveaways'][guild_id][message_id]['ended'] = True
             self.data['giveaways'][guild_id][message_id]['end_time'] = datetime.now().isoformat()
-            return self._save_data()
+            return self._journal('update', ['giveaways', guild_id, message_id], {
+                'ended': True,
+                'end_time': self.data['giveaways'][guild_id][message_id]['end_time']
+            })
         
         return False
 
+def create_database():
+    """Create the database for the configured storage backend"""
+    backend = CONFIG.get('database', {}).get('backend', 'json')
+    
+    if backend == 'sqlite':
+        from utils.sqlite_database import SqliteDatabase
+        return SqliteDatabase()
+    
+    return JsonDatabase()
+
 # Create a global instance of the database
-db = JsonDatabase()
+db = create_database()
@@ -139,12 +139,13 @@ class EmbedCreator:
         return EmbedCreator.create_embed(title, description, color)
         
     @staticmethod
-    def create_leaderboard_embed(leaderboard_type, entries):
+    def create_leaderboard_embed(leaderboard_type, entries, start=1):
         """Create a leaderboard embed
         
         Args:
             leaderboard_type: The type of leaderboard (Levels, Messages, etc.)
             entries: List of user entries to display
+            start: Rank of the first entry, for pages after the first
             
         Returns:
             discord.Embed: The leaderboard embed
@@ -162,7 +163,7 @@ class EmbedCreator:
             
         # Format leaderboard entries
         value = ""
-        for i, entry in enumerate(entries):
+        for i, entry in enumerate(entries, start - 1):
             medal = ""
             if i == 0:
                 medal = "🥇"
@@ -0,0 +1,75 @@
+import logging
+
+logger = logging.getLogger('discord_bot')
+
+class GiveawayEntryBuffer:
+    """In-memory buffer of giveaway entries in front of the database
+    
+    Reaction adds and removes are collected per giveaway as the latest state
+    of each user and written by flush() with one batched call per giveaway.
+    Repeated or cancelling reactions collapse in memory, so each reaction
+    costs O(1) no matter how many users already entered.
+    """
+    
+    def __init__(self, database, max_pending=1000):
+        """Initialize the buffer
+        
+        Args:
+            database: The database holding the giveaways
+            max_pending: Flush early from add() and remove() once this many entries are pending
+        """
+        self.database = database
+        self.max_pending = max_pending
+        # (guild ID, message ID) -> user ID -> True if entered, False if left
+        self.pending = {}
+        self.pending_count = 0
+    
+    def add(self, guild_id, message_id, user_id):
+        """Buffer a user entering a giveaway"""
+        self._set(guild_id, message_id, user_id, True)
+    
+    def remove(self, guild_id, message_id, user_id):
+        """Buffer a user leaving a giveaway"""
+        self._set(guild_id, message_id, user_id, False)
+    
+    def _set(self, guild_id, message_id, user_id, entered):
+        """Record the latest entry state of a user"""
+        changes = self.pending.setdefault((str(guild_id), str(message_id)), {})
+        user_id = str(user_id)
+        
+        if user_id not in changes:
+            self.pending_count += 1
+        changes[user_id] = entered
+        
+        if self.pending_count >= self.max_pending:
+            self.flush()
+    
+    def flush(self, guild_id=None, message_id=None):
+        """Write pending entries to the database, for one giveaway or for all
+        
+        Returns:
+            int: The number of entry changes written
+        """
+        if guild_id is not None:
+            keys = [(str(guild_id), str(message_id))]
+        else:
+            keys = list(self.pending)
+        
+        written = 0
+        for key in keys:
+            changes = self.pending.pop(key, None)
+            if not changes:
+                continue
+            self.pending_count -= len(changes)
+            
+            added = [user_id for user_id, entered in changes.items() if entered]
+            removed = [user_id for user_id, entered in changes.items() if not entered]
+            if added:
+                self.database.add_giveaway_participants(*key, added)
+            if removed:
+                self.database.remove_giveaway_participants(*key, removed)
+            written += len(changes)
+        
+        if written:
+            logger.debug(f"Flushed {written} buffered giveaway entries")
+        return written
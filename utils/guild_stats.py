@@ -0,0 +1,136 @@
+import collections
+import time
+
+from config import CONFIG
+
+STATUS_BUCKETS = ('online', 'idle', 'dnd', 'offline')
+
+class GuildStats:
+    """Member counters of one guild, built in one pass and then kept by events"""
+    
+    def __init__(self, members=()):
+        self.humans = 0
+        self.bots = 0
+        self.boosters = 0
+        self.statuses = dict.fromkeys(STATUS_BUCKETS, 0)
+        
+        for member in members:
+            self.add(member)
+    
+    @staticmethod
+    def status_bucket(member):
+        """Get the status counter a member falls in"""
+        status = str(member.status)
+        return status if status in STATUS_BUCKETS else 'offline'
+    
+    @property
+    def online(self):
+        """Members with any status other than offline"""
+        return sum(self.statuses.values()) - self.statuses['offline']
+    
+    def add(self, member, sign=1):
+        """Count a member in, or out with sign=-1"""
+        if member.bot:
+            self.bots += sign
+        else:
+            self.humans += sign
+        if member.premium_since is not None:
+            self.boosters += sign
+        self.statuses[self.status_bucket(member)] += sign
+    
+    def remove(self, member):
+        """Count a member out"""
+        self.add(member, -1)
+    
+    def update(self, before, after):
+        """Move a member between counters after a presence or member update"""
+        old_status, new_status = self.status_bucket(before), self.status_bucket(after)
+        if old_status != new_status:
+            self.statuses[old_status] -= 1
+            self.statuses[new_status] += 1
+        
+        if (before.premium_since is None) != (after.premium_since is None):
+            self.boosters += 1 if after.premium_since is not None else -1
+    
+    def snapshot(self):
+        """Get the counters as a plain dict"""
+        return {
+            'humans': self.humans,
+            'bots': self.bots,
+            'boosters': self.boosters,
+            'active': self.online,
+            **self.statuses
+        }
+
+class GuildStatsCache:
+    """Per-guild member counters with a rolling history of samples
+    
+    A guild's counters are built from its member cache on first use, in O(n),
+    and then moved by member join, leave, presence and update events, so
+    reads are O(1). Events for guilds that were never read are ignored.
+    """
+    
+    def __init__(self, history_size=None):
+        """Initialize the cache
+        
+        Args:
+            history_size: Samples kept per guild by record()
+        """
+        self.history_size = history_size or CONFIG.get('guild_stats', {}).get('history_size', 288)
+        self.guilds = {}
+        # Guild ID -> deque of (timestamp, snapshot)
+        self.history = {}
+    
+    def get(self, guild):
+        """Get a guild's counters, building them on first use"""
+        stats = self.guilds.get(guild.id)
+        if stats is None:
+            stats = self.guilds[guild.id] = GuildStats(guild.members)
+        return stats
+    
+    def member_join(self, member):
+        """Count a member who joined"""
+        stats = self.guilds.get(member.guild.id)
+        if stats is not None:
+            stats.add(member)
+    
+    def member_remove(self, member):
+        """Count out a member who left"""
+        stats = self.guilds.get(member.guild.id)
+        if stats is not None:
+            stats.remove(member)
+    
+    def member_update(self, before, after):
+        """Apply a member's presence or boost change"""
+        stats = self.guilds.get(after.guild.id)
+        if stats is not None:
+            stats.update(before, after)
+    
+    def record(self, guild, now=None):
+        """Append a sample of a guild's counters to its history"""
+        samples = self.history.get(guild.id)
+        if samples is None:
+            samples = self.history[guild.id] = collections.deque(maxlen=self.history_size)
+        
+        snapshot = self.get(guild).snapshot()
+        snapshot['members'] = guild.member_count
+        samples.append((now or time.time(), snapshot))
+    
+    def get_history(self, guild_id):
+        """Get a guild's samples, oldest first"""
+        return list(self.history.get(guild_id, ()))
+    
+    def forget(self, guild_id):
+        """Drop a guild's counters and history"""
+        self.guilds.pop(guild_id, None)
+        self.history.pop(guild_id, None)
+    
+    def invalidate(self):
+        """Drop every guild's counters so they are rebuilt from the member cache
+        
+        History is kept; only the live counters may have drifted.
+        """
+        self.guilds.clear()
+
+# Create a global instance of the guild stats cache
+guild_stats = GuildStatsCache()
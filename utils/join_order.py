@@ -0,0 +1,70 @@
+import time
+
+from utils.ranking import RankIndex
+
+class JoinOrderCache:
+    """Per-guild order in which members joined
+    
+    Each guild's members are indexed by join time in a RankIndex (a bucketed
+    sorted list searched with bisect), built from the member cache on first
+    use and then kept by join and leave events. A member's join position and
+    the member at a given position are both O(log n).
+    """
+    
+    def __init__(self):
+        self.guilds = {}
+    
+    @staticmethod
+    def _score(member):
+        """Get a member's index score; earlier joins rank higher
+        
+        Members without a join time are placed as if they joined now.
+        """
+        joined_at = member.joined_at.timestamp() if member.joined_at else time.time()
+        return -joined_at
+    
+    def get(self, guild):
+        """Get a guild's join order, building it on first use"""
+        index = self.guilds.get(guild.id)
+        if index is None:
+            index = self.guilds[guild.id] = RankIndex({member.id: self._score(member) for member in guild.members})
+        return index
+    
+    def position(self, member):
+        """Get a member's 1-based join position, or None if they aren't cached"""
+        return self.get(member.guild).rank(member.id)
+    
+    def member_at(self, guild, position):
+        """Get the member who joined at a 1-based position
+        
+        Returns:
+            tuple: (member ID, join timestamp), or None if out of range
+        """
+        found = self.get(guild).slice(position - 1, position)
+        if not found:
+            return None
+        member_id, score = found[0]
+        return member_id, -score
+    
+    def member_join(self, member):
+        """Add a member who joined"""
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.update(member.id, self._score(member))
+    
+    def member_remove(self, member):
+        """Remove a member who left"""
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index.remove(member.id)
+    
+    def forget(self, guild_id):
+        """Drop a guild's join order"""
+        self.guilds.pop(guild_id, None)
+    
+    def invalidate(self):
+        """Drop every guild's join order so it is rebuilt from the member cache"""
+        self.guilds.clear()
+
+# Create a global instance of the join order cache
+join_order = JoinOrderCache()
@@ -0,0 +1,182 @@
+import inspect
+import logging
+import time
+
+logger = logging.getLogger('discord_bot')
+
+class MessageContext:
+    """State shared by the pipeline stages for a single message"""
+    
+    def __init__(self, message, settings):
+        self.message = message
+        self.guild = message.guild
+        self.author = message.author
+        self.settings = settings
+        self.skipped = set()
+        self.stores = []
+    
+    def skip(self, stage_name):
+        """Prevent a later stage from running for this message"""
+        self.skipped.add(stage_name)
+    
+    def commit(self, store):
+        """Ask the pipeline to commit a store once all stages have run
+        
+        Args:
+            store: An object with a commit() method (sync or async). Stores
+                touched by several stages are committed only once.
+        """
+        if not any(existing is store for existing in self.stores):
+            self.stores.append(store)
+
+class MessagePipeline:
+    """Single on_message listener that fans out to registered stages
+    
+    Bot and DM messages are filtered once, guild settings are resolved once
+    per guild and cached, and every stage is timed so the per-message cost of
+    each feature can be inspected.
+    """
+    
+    def __init__(self):
+        self.stages = []
+        self.settings_providers = {}
+        self.settings_cache = {}
+        self.stats = {}
+        self.messages_processed = 0
+        self._bots = set()
+    
+    def attach(self, bot):
+        """Register the pipeline's on_message listener on a bot (only once)"""
+        if id(bot) not in self._bots:
+            bot.add_listener(self.on_message, 'on_message')
+            self._bots.add(id(bot))
+    
+    def register(self, bot, name, handler, order=100):
+        """Register a stage
+        
+        Args:
+            bot: The bot to attach the listener to
+            name: Unique stage name, e.g. "messages.count"
+            handler: Coroutine function called as handler(context)
+            order: Stages run in ascending order
+        """
+        self.attach(bot)
+        self.unregister(name)
+        self.stages.append((order, name, handler))
+        self.stages.sort(key=lambda stage: (stage[0], stage[1]))
+        self.stats.setdefault(name, {'calls': 0, 'total': 0.0, 'max': 0.0})
+    
+    def unregister(self, name):
+        """Remove a stage"""
+        self.stages = [stage for stage in self.stages if stage[1] != name]
+    
+    def register_settings(self, namespace, provider):
+        """Register a guild settings provider
+        
+        Args:
+            namespace: Key under which the settings appear in context.settings
+            provider: Function (sync or async) taking a guild ID and returning a dict
+        """
+        self.settings_providers[namespace] = provider
+        self.settings_cache.clear()
+    
+    def unregister_settings(self, namespace):
+        """Remove a guild settings provider"""
+        self.settings_providers.pop(namespace, None)
+        self.settings_cache.clear()
+    
+    def invalidate_settings(self, guild_id):
+        """Drop cached settings for a guild after they were changed"""
+        self.settings_cache.pop(guild_id, None)
+    
+    async def get_settings(self, guild_id):
+        """Resolve the settings of every provider for a guild, using the cache"""
+        settings = self.settings_cache.get(guild_id)
+        if settings is not None:
+            return settings
+        
+        settings = {}
+        for namespace, provider in self.settings_providers.items():
+            try:
+                result = provider(guild_id)
+                if inspect.isawaitable(result):
+                    result = await result
+                settings[namespace] = result or {}
+            except Exception as e:
+                logger.error(f"Error loading {namespace} settings for guild {guild_id}: {e}")
+                settings[namespace] = {}
+        
+        self.settings_cache[guild_id] = settings
+        return settings
+    
+    async def on_message(self, message):
+        """Run every registered stage for a guild message"""
+        # Skip if message is from a bot or in DMs
+        if message.author.bot or not message.guild:
+            return
+        
+        if not self.stages:
+            return
+        
+        context = MessageContext(message, await self.get_settings(message.guild.id))
+        
+        for order, name, handler in list(self.stages):
+            if name in context.skipped:
+                continue
+            
+            started = time.perf_counter()
+            try:
+                await handler(context)
+            except Exception as e:
+                logger.error(f"Error in message stage {name}: {e}")
+            self._record(name, time.perf_counter() - started)
+        
+        # One commit per touched store, no matter how many stages wrote to it
+        started = time.perf_counter()
+        for store in context.stores:
+            try:
+                result = store.commit()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error committing message pipeline store: {e}")
+        if context.stores:
+            self._record('commit', time.perf_counter() - started)
+        
+        self.messages_processed += 1
+    
+    def _record(self, name, elapsed):
+        """Add a timing sample for a stage"""
+        stats = self.stats.setdefault(name, {'calls': 0, 'total': 0.0, 'max': 0.0})
+        stats['calls'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+    
+    def get_stats(self):
+        """Get timing statistics per stage
+        
+        Returns:
+            list: Dicts with name, calls, avg_ms, max_ms and total_ms, most expensive first
+        """
+        result = []
+        for name, stats in self.stats.items():
+            calls = stats['calls']
+            result.append({
+                'name': name,
+                'calls': calls,
+                'avg_ms': stats['total'] / calls * 1000 if calls else 0.0,
+                'max_ms': stats['max'] * 1000,
+                'total_ms': stats['total'] * 1000
+            })
+        
+        result.sort(key=lambda stats: stats['total_ms'], reverse=True)
+        return result
+    
+    def reset_stats(self):
+        """Clear all timing statistics"""
+        for name in self.stats:
+            self.stats[name] = {'calls': 0, 'total': 0.0, 'max': 0.0}
+        self.messages_processed = 0
+
+# Create a global instance of the pipeline
+pipeline = MessagePipeline()
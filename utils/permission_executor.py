@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from config import CONFIG
+
+logger = logging.getLogger('discord_bot')
+
+def set_overwrite(**permissions):
+    """Build an update that sets some permissions of an overwrite and keeps the rest
+    
+    Permissions set to None are cleared; an overwrite left empty is removed.
+    """
+    def update(overwrite):
+        overwrite = discord.PermissionOverwrite.from_pair(*overwrite.pair())
+        overwrite.update(**permissions)
+        return None if overwrite.is_empty() else overwrite
+    return update
+
+class PermissionOverwriteExecutor:
+    """Applies one permission overwrite change across many channels
+    
+    Writes run in a pool shared by every caller, so a lockdown and a Muted role
+    setup in different guilds together stay under the configured concurrency.
+    Rate-limited and server-side failures are retried with backoff. Channels
+    already holding the wanted overwrite are skipped. Discord doesn't pass a
+    category's overwrite changes on to its synced channels, so each one is
+    written too, with the overwrite computed for the category so it stays
+    synced.
+    """
+    
+    def __init__(self, concurrency=None, retries=None):
+        """Initialize the executor
+        
+        Args:
+            concurrency: Channels written at the same time
+            retries: Attempts per channel for rate-limited or failed writes
+        """
+        settings = CONFIG.get('permission_updates', {})
+        self.concurrency = concurrency or settings.get('concurrency', 5)
+        self.retries = retries or settings.get('retries', 3)
+        self._semaphore = None
+    
+    async def apply(self, channels, target, update, reason=None, progress=None, progress_interval=2.0):
+        """Apply an overwrite change for a role or member to many channels
+        
+        Args:
+            channels: The channels to update
+            target: The role or member whose overwrite changes
+            update: Function taking the channel's current overwrite for target
+                and returning the new one, or None to remove it
+            reason: Audit log reason
+            progress: Optional coroutine function called as progress(done, total)
+                at most every progress_interval seconds while writing
+        
+        Returns:
+            dict: Counts of updated, skipped and failed channels
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        
+        # Plan every write before the first one changes the cached overwrites
+        planned = {}
+        plans = []
+        for channel in sorted(channels, key=lambda channel: not isinstance(channel, discord.CategoryChannel)):
+            current = channel.overwrites_for(target)
+            category = channel.category
+            if category is not None and category.id in planned and channel.permissions_synced:
+                wanted = planned[category.id]
+            else:
+                wanted = update(current)
+            if isinstance(channel, discord.CategoryChannel):
+                planned[channel.id] = wanted
+            
+            if wanted == current or (wanted is None and current.is_empty()):
+                continue
+            plans.append((channel, wanted))
+        
+        result = {'updated': 0, 'skipped': len(channels) - len(plans), 'failed': 0}
+        last_report = time.monotonic()
+        
+        async def write(channel, overwrite):
+            nonlocal last_report
+            async with self._semaphore:
+                if await self._write(channel, target, overwrite, reason):
+                    result['updated'] += 1
+                else:
+                    result['failed'] += 1
+            
+            if progress and time.monotonic() - last_report >= progress_interval:
+                last_report = time.monotonic()
+                await progress(result['updated'] + result['failed'], len(plans))
+        
+        await asyncio.gather(*(write(channel, overwrite) for channel, overwrite in plans))
+        return result
+    
+    async def _write(self, channel, target, overwrite, reason):
+        """Write one overwrite, retrying rate-limited and server-side failures"""
+        for attempt in range(self.retries):
+            try:
+                await channel.set_permissions(target, overwrite=overwrite, reason=reason)
+                return True
+            except discord.Forbidden as e:
+                logger.warning(f"No permission to update overwrites in #{channel.name}: {e}")
+                return False
+            except discord.HTTPException as e:
+                if (e.status != 429 and e.status < 500) or attempt == self.retries - 1:
+                    logger.error(f"Error updating overwrites in #{channel.name}: {e}")
+                    return False
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+# Create a global instance of the executor
+permission_executor = PermissionOverwriteExecutor()
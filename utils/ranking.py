@@ -0,0 +1,171 @@
+import bisect
+
+class RankIndex:
+    """Order-statistic index of member scores, highest score first
+    
+    Keys are kept in a list of sorted buckets (the layout sortedcontainers
+    uses) with a table of bucket offsets. Updates cost O(log n) plus a shift
+    inside one bucket, and rank, top-N and page reads cost O(log n + k); the
+    first read after a write also refreshes the offsets in O(n / BUCKET_SIZE).
+    Members with equal scores are ordered by member ID so ranks are stable.
+    """
+    
+    BUCKET_SIZE = 512
+    
+    def __init__(self, scores=None):
+        """Initialize the index
+        
+        Args:
+            scores: Optional mapping of member -> score to load. Scores may be
+                numbers or tuples of numbers (e.g. (level, xp)).
+        """
+        self.scores = {}
+        self._buckets = []
+        self._maxes = []
+        self._offsets = None
+        
+        if scores:
+            self.rebuild(scores)
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def __contains__(self, member):
+        return member in self.scores
+    
+    @staticmethod
+    def _key(member, score):
+        """Get the sort key of a member (negated so ascending order is best first)"""
+        if isinstance(score, tuple):
+            return (tuple(-part for part in score), member)
+        return (-score, member)
+    
+    def rebuild(self, scores):
+        """Replace the contents of the index in one O(n log n) pass"""
+        self.scores = dict(scores)
+        keys = sorted(self._key(member, score) for member, score in self.scores.items())
+        
+        self._buckets = [keys[i:i + self.BUCKET_SIZE] for i in range(0, len(keys), self.BUCKET_SIZE)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._offsets = None
+    
+    def get(self, member, default=None):
+        """Get a member's score"""
+        return self.scores.get(member, default)
+    
+    def update(self, member, score):
+        """Set a member's score, inserting the member if needed"""
+        old_score = self.scores.get(member)
+        if old_score is not None:
+            if old_score == score:
+                return
+            self._remove_key(self._key(member, old_score))
+        
+        self.scores[member] = score
+        self._insert_key(self._key(member, score))
+    
+    def remove(self, member):
+        """Remove a member from the index
+        
+        Returns:
+            bool: False if the member wasn't indexed
+        """
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        
+        self._remove_key(self._key(member, score))
+        return True
+    
+    def rank(self, member):
+        """Get a member's 1-based rank, or None if the member isn't indexed"""
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        
+        key = self._key(member, score)
+        i = bisect.bisect_left(self._maxes, key)
+        return self._get_offsets()[i] + bisect.bisect_left(self._buckets[i], key) + 1
+    
+    def slice(self, start, stop):
+        """Get the members ranked start..stop-1 (0-based)
+        
+        Returns:
+            list: (member, score) tuples, best first
+        """
+        start = max(start, 0)
+        stop = min(stop, len(self.scores))
+        if start >= stop:
+            return []
+        
+        offsets = self._get_offsets()
+        i = bisect.bisect_right(offsets, start) - 1
+        j = start - offsets[i]
+        
+        result = []
+        while len(result) < stop - start:
+            bucket = self._buckets[i]
+            for key in bucket[j:j + stop - start - len(result)]:
+                member = key[1]
+                result.append((member, self.scores[member]))
+            i += 1
+            j = 0
+        
+        return result
+    
+    def top(self, limit=10):
+        """Get the best `limit` members as (member, score) tuples"""
+        return self.slice(0, limit)
+    
+    def page(self, page, per_page=10):
+        """Get a 1-based page of the ranking as (member, score) tuples"""
+        start = (max(page, 1) - 1) * per_page
+        return self.slice(start, start + per_page)
+    
+    def _get_offsets(self):
+        """Get the number of keys before each bucket, refreshing it after writes"""
+        if self._offsets is None:
+            offsets, total = [], 0
+            for bucket in self._buckets:
+                offsets.append(total)
+                total += len(bucket)
+            self._offsets = offsets
+        return self._offsets
+    
+    def _insert_key(self, key):
+        """Insert a sort key into its bucket, splitting buckets that grow too large"""
+        self._offsets = None
+        
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+        
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            # Larger than every key: append to the last bucket
+            i -= 1
+            self._buckets[i].append(key)
+            self._maxes[i] = key
+        else:
+            bisect.insort(self._buckets[i], key)
+        
+        bucket = self._buckets[i]
+        if len(bucket) > self.BUCKET_SIZE * 2:
+            half = len(bucket) // 2
+            self._buckets[i:i + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[i:i + 1] = [bucket[half - 1], bucket[-1]]
+    
+    def _remove_key(self, key):
+        """Remove a sort key, dropping buckets that become empty"""
+        self._offsets = None
+        
+        i = bisect.bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect.bisect_left(bucket, key)]
+        
+        if bucket:
+            self._maxes[i] = bucket[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
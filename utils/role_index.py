@@ -0,0 +1,95 @@
+class RoleIndexCache:
+    """Per-guild index of which members hold each role
+    
+    A guild's index is built from its member cache on first use, in one pass
+    over every member's roles, and then kept by member join, leave and update
+    events. Role member counts and membership checks are then O(1), where
+    discord.py's Role.members scans every member of the guild.
+    """
+    
+    def __init__(self):
+        # Guild ID -> role ID -> set of member IDs
+        self.guilds = {}
+    
+    @staticmethod
+    def _role_ids(member):
+        """Get the IDs of a member's roles, without @everyone"""
+        return {role.id for role in member.roles if role.id != member.guild.id}
+    
+    def get(self, guild):
+        """Get a guild's role index, building it on first use"""
+        roles = self.guilds.get(guild.id)
+        if roles is None:
+            roles = self.guilds[guild.id] = {}
+            for member in guild.members:
+                for role_id in self._role_ids(member):
+                    roles.setdefault(role_id, set()).add(member.id)
+        return roles
+    
+    def count(self, role):
+        """Get the number of members holding a role"""
+        if role.is_default():
+            return role.guild.member_count
+        return len(self.get(role.guild).get(role.id, ()))
+    
+    def member_ids(self, role):
+        """Get the IDs of the members holding a role"""
+        return set(self.get(role.guild).get(role.id, ()))
+    
+    def has_role(self, guild, member_id, role_id):
+        """Check whether a member holds a role"""
+        return member_id in self.get(guild).get(role_id, ())
+    
+    def counts(self, guild):
+        """Get the member count of every role in a guild
+        
+        Returns:
+            list: (role, count) tuples, most members first
+        """
+        roles = self.get(guild)
+        counts = [(role, len(roles.get(role.id, ()))) for role in guild.roles if not role.is_default()]
+        counts.sort(key=lambda item: (-item[1], -item[0].position))
+        return counts
+    
+    def member_join(self, member):
+        """Add the roles of a member who joined"""
+        roles = self.guilds.get(member.guild.id)
+        if roles is not None:
+            for role_id in self._role_ids(member):
+                roles.setdefault(role_id, set()).add(member.id)
+    
+    def member_remove(self, member):
+        """Remove the roles of a member who left"""
+        roles = self.guilds.get(member.guild.id)
+        if roles is not None:
+            for role_id in self._role_ids(member):
+                roles.get(role_id, set()).discard(member.id)
+    
+    def member_update(self, before, after):
+        """Apply the roles a member gained or lost"""
+        roles = self.guilds.get(after.guild.id)
+        if roles is None:
+            return
+        
+        old_roles, new_roles = self._role_ids(before), self._role_ids(after)
+        for role_id in new_roles - old_roles:
+            roles.setdefault(role_id, set()).add(after.id)
+        for role_id in old_roles - new_roles:
+            roles.get(role_id, set()).discard(after.id)
+    
+    def role_delete(self, role):
+        """Drop a deleted role"""
+        roles = self.guilds.get(role.guild.id)
+        if roles is not None:
+            roles.pop(role.id, None)
+    
+    def forget(self, guild_id):
+        """Drop a guild's role index"""
+        self.guilds.pop(guild_id, None)
+    
+    def invalidate(self):
+        """Drop every guild's role index so it is rebuilt from the member cache"""
+        self.guilds.clear()
+
+# Create a global instance of the role index
+role_index = RoleIndexCache()
@@ -0,0 +1,79 @@
+import random
+
+class AliasTable:
+    """Weighted sampler using Vose's alias method
+    
+    The table is built once in O(n) and every sample costs one random index
+    and one coin flip, no matter how the weights are spread. Items with a
+    weight of zero or less can never be drawn.
+    """
+    
+    def __init__(self, items, weights):
+        """Build the table
+        
+        Args:
+            items: The items to draw from
+            weights: One non-negative weight per item
+        """
+        pairs = [(item, weight) for item, weight in zip(items, weights) if weight > 0]
+        self.items = [item for item, weight in pairs]
+        self.weights = [weight for item, weight in pairs]
+        self.total_weight = sum(self.weights)
+        
+        size = len(self.items)
+        self.probabilities = [1.0] * size
+        self.aliases = list(range(size))
+        if not size:
+            return
+        
+        scaled = [weight * size / self.total_weight for weight in self.weights]
+        small = [i for i, probability in enumerate(scaled) if probability < 1.0]
+        large = [i for i, probability in enumerate(scaled) if probability >= 1.0]
+        
+        # Pair each under-full slot with an over-full one that tops it up
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        
+        # Whatever is left is full up to rounding error
+        for i in small + large:
+            self.probabilities[i] = 1.0
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def sample(self, rng=random):
+        """Draw one item, with replacement"""
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.probabilities[i] else self.items[self.aliases[i]]
+    
+    def draw(self, count, rng=random):
+        """Draw up to count distinct items, weighted, without replacement
+        
+        Repeats are rejected and drawn again. If rejections pile up because
+        the winners hold most of the weight, the rest is drawn from a table
+        rebuilt without them.
+        """
+        count = min(count, len(self.items))
+        chosen = []
+        seen = set()
+        table = self
+        rejections = 0
+        
+        while len(chosen) < count:
+            item = table.sample(rng)
+            if item in seen:
+                rejections += 1
+                if rejections > 8 * count + 32:
+                    pairs = [(other, weight) for other, weight in zip(self.items, self.weights) if other not in seen]
+                    table = AliasTable(*zip(*pairs))
+                    rejections = 0
+                continue
+            
+            seen.add(item)
+            chosen.append(item)
+        
+        return chosen
@@ -0,0 +1,211 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+
+from config import CONFIG
+
+logger = logging.getLogger('discord_bot')
+
+class Scheduler:
+    """Persisted timer service shared by every cog
+    
+    Jobs are typed (e.g. "reminder", "unmute") and carry a JSON payload. They
+    are kept in a min-heap ordered by their run time and saved to disk, so
+    timers survive restarts. A single background task sleeps until the
+    earliest job is due; cogs register one handler per job type.
+    
+    Jobs are removed from disk only after their handler finished, so a job
+    interrupted by a restart runs again. Handlers should be idempotent.
+    """
+    
+    def __init__(self, data_file=None):
+        """Initialize the scheduler
+        
+        Args:
+            data_file: JSON file the pending jobs are saved to
+        """
+        self.data_file = data_file or CONFIG.get('scheduler', {}).get('file', 'data/scheduled_jobs.json')
+        self.jobs = {}
+        self.heap = []
+        # Sequence number of each job's live heap entry; older entries are stale
+        self.entries = {}
+        self.handlers = {}
+        # Due jobs whose type has no handler yet, run once one is registered
+        self.waiting = {}
+        self._seq = 0
+        self._runner = None
+        self._wakeup = None
+        self._running = set()
+        
+        self.load_jobs()
+    
+    def load_jobs(self):
+        """Load pending jobs from file"""
+        try:
+            if os.path.exists(self.data_file):
+                with open(self.data_file, 'r') as f:
+                    self.jobs = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading scheduled jobs: {e}")
+            self.jobs = {}
+        
+        self.heap = []
+        self.entries = {}
+        for job in self.jobs.values():
+            self._push(job)
+        
+        if self.jobs:
+            logger.info(f"Loaded {len(self.jobs)} scheduled jobs")
+    
+    def save_jobs(self):
+        """Atomically save pending jobs to file"""
+        tmp_file = f"{self.data_file}.tmp"
+        
+        try:
+            os.makedirs(os.path.dirname(self.data_file) or '.', exist_ok=True)
+            with open(tmp_file, 'w') as f:
+                json.dump(self.jobs, f, indent=4)
+            os.replace(tmp_file, self.data_file)
+        except Exception as e:
+            logger.error(f"Error saving scheduled jobs: {e}")
+    
+    def register(self, job_type, handler):
+        """Register the handler of a job type and start the scheduler
+        
+        Args:
+            job_type: The job type, e.g. "reminder"
+            handler: Coroutine function called as handler(job) when a job is due.
+                job is a dict with id, type, run_at (Unix time) and payload.
+        """
+        self.handlers[job_type] = handler
+        
+        # Jobs that came due before the handler existed go back in line
+        for job_id in self.waiting.pop(job_type, []):
+            job = self.jobs.get(job_id)
+            if job is not None:
+                self._push(job)
+        
+        self._ensure_runner()
+    
+    def unregister(self, job_type):
+        """Remove the handler of a job type; its jobs wait until one is registered again"""
+        self.handlers.pop(job_type, None)
+    
+    def schedule(self, job_type, run_at, payload=None, job_id=None):
+        """Schedule a job, replacing any pending job with the same ID
+        
+        Args:
+            job_type: The job type
+            run_at: When to run, as Unix time in seconds
+            payload: JSON-serializable data handed to the handler
+            job_id: Optional stable ID, so the job can be cancelled or rescheduled
+        
+        Returns:
+            str: The job ID
+        """
+        if job_id is None:
+            job_id = f"{job_type}:{time.time_ns()}"
+        
+        job = {
+            'id': job_id,
+            'type': job_type,
+            'run_at': float(run_at),
+            'payload': payload or {}
+        }
+        self.jobs[job_id] = job
+        self.save_jobs()
+        
+        # A heap entry for a previous version of this job is skipped when popped
+        self._push(job)
+        self._ensure_runner()
+        if self.heap[0][2] == job_id and self._wakeup is not None:
+            self._wakeup.set()
+        
+        return job_id
+    
+    def cancel(self, job_id):
+        """Cancel a pending job
+        
+        Returns:
+            bool: False if there was no such job
+        """
+        if self.jobs.pop(job_id, None) is None:
+            return False
+        self.entries.pop(job_id, None)
+        
+        self.save_jobs()
+        return True
+    
+    def get(self, job_id):
+        """Get a pending job by ID"""
+        return self.jobs.get(job_id)
+    
+    def get_jobs(self, job_type=None):
+        """Get pending jobs, optionally only of one type, earliest first"""
+        jobs = [job for job in self.jobs.values() if job_type is None or job['type'] == job_type]
+        return sorted(jobs, key=lambda job: job['run_at'])
+    
+    def _push(self, job):
+        """Add a heap entry for a job"""
+        self._seq += 1
+        self.entries[job['id']] = self._seq
+        heapq.heappush(self.heap, (job['run_at'], self._seq, job['id']))
+    
+    def _ensure_runner(self):
+        """Start the background runner on the running event loop if needed"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        
+        if self._runner is None or self._runner.done() or self._runner.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._runner = loop.create_task(self._run())
+        return True
+    
+    async def _run(self):
+        """Sleep until the earliest job is due, then hand due jobs to their handlers"""
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            
+            while self.heap and self.heap[0][0] <= now:
+                run_at, seq, job_id = heapq.heappop(self.heap)
+                job = self.jobs.get(job_id)
+                
+                # Skip entries of cancelled or rescheduled jobs
+                if job is None or self.entries.get(job_id) != seq:
+                    continue
+                del self.entries[job_id]
+                
+                if job['type'] not in self.handlers:
+                    self.waiting.setdefault(job['type'], []).append(job_id)
+                    continue
+                
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            
+            delay = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _execute(self, job):
+        """Run a job's handler, then forget the job"""
+        try:
+            await self.handlers[job['type']](job)
+        except Exception as e:
+            logger.error(f"Error running scheduled {job['type']} job {job['id']}: {e}")
+        
+        # Keep the job if it was rescheduled while running
+        if self.jobs.get(job['id']) is job:
+            del self.jobs[job['id']]
+            self.save_jobs()
+
+# Create a global instance of the scheduler
+scheduler = Scheduler()
@@ -0,0 +1,899 @@
+import json
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+
+from config import CONFIG
+
+logger = logging.getLogger('discord_bot')
+
+# Days of per-day message counts to keep (matches JsonDatabase)
+MESSAGE_HISTORY_DAYS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS autoroles (
+    guild_id TEXT PRIMARY KEY,
+    role_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS levels (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    level INTEGER NOT NULL DEFAULT 0,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_levels_rank ON levels (guild_id, level DESC, xp DESC);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    guild_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at TEXT NOT NULL,
+    closed_at TEXT,
+    PRIMARY KEY (guild_id, channel_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_user ON tickets (guild_id, user_id, status);
+
+CREATE TABLE IF NOT EXISTS invites (
+    guild_id TEXT NOT NULL,
+    inviter_id TEXT NOT NULL,
+    joins INTEGER NOT NULL DEFAULT 0,
+    leaves INTEGER NOT NULL DEFAULT 0,
+    fakes INTEGER NOT NULL DEFAULT 0,
+    rejoins INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, inviter_id)
+);
+CREATE INDEX IF NOT EXISTS idx_invites_total ON invites (guild_id, MAX(joins - leaves - fakes, 0) DESC, inviter_id);
+
+CREATE TABLE IF NOT EXISTS invitees (
+    guild_id TEXT NOT NULL,
+    inviter_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    joined_at TEXT NOT NULL,
+    is_fake INTEGER NOT NULL DEFAULT 0,
+    is_rejoin INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_invitees_user ON invitees (guild_id, user_id);
+
+CREATE TABLE IF NOT EXISTS message_counts (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    all_time INTEGER NOT NULL DEFAULT 0,
+    week_start INTEGER NOT NULL DEFAULT 0,
+    week INTEGER NOT NULL DEFAULT 0,
+    month_id TEXT NOT NULL DEFAULT '',
+    month INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_message_counts_rank ON message_counts (guild_id, all_time DESC);
+CREATE INDEX IF NOT EXISTS idx_message_counts_week ON message_counts (guild_id, week_start, week DESC);
+CREATE INDEX IF NOT EXISTS idx_message_counts_month ON message_counts (guild_id, month_id, month DESC);
+
+CREATE TABLE IF NOT EXISTS message_daily (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_message_daily_rank ON message_daily (guild_id, day, count DESC);
+CREATE INDEX IF NOT EXISTS idx_message_daily_day ON message_daily (day);
+
+CREATE TABLE IF NOT EXISTS channel_activity (
+    guild_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    counter TEXT NOT NULL,
+    PRIMARY KEY (guild_id, channel_id)
+);
+
+CREATE TABLE IF NOT EXISTS reaction_roles (
+    guild_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    emoji TEXT NOT NULL,
+    role_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, message_id, emoji)
+);
+
+CREATE TABLE IF NOT EXISTS giveaways (
+    guild_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    prize TEXT NOT NULL,
+    host_id TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    winners INTEGER NOT NULL DEFAULT 1,
+    ended INTEGER NOT NULL DEFAULT 0,
+    bonus TEXT NOT NULL DEFAULT '[]',
+    PRIMARY KEY (guild_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_giveaways_end_time ON giveaways (end_time);
+
+CREATE TABLE IF NOT EXISTS giveaway_participants (
+    guild_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (guild_id, message_id, user_id)
+);
+"""
+
+class SqliteDatabase:
+    """SQLite-backed database with the same API as JsonDatabase
+    
+    Leaderboards, rejoin checks and ticket lookups are indexed queries. The
+    database runs in WAL mode so other processes (like the Flask app) can read
+    while the bot writes.
+    """
+    
+    def __init__(self, db_file=None):
+        """Initialize the database
+        
+        Args:
+            db_file: Path to the SQLite file. Defaults to the configured SQLite file.
+        """
+        settings = CONFIG.get('database', {})
+        self.db_file = db_file or settings.get('sqlite_file', 'bot_database.sqlite3')
+        
+        self.conn = sqlite3.connect(self.db_file)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate_schema()
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._pruned_day = None
+        logger.info(f"Database loaded from {self.db_file}")
+    
+    def _migrate_schema(self):
+        """Add columns introduced after a database file was created"""
+        for table, added_columns in (
+            ('message_counts', (
+                ('week_start', "INTEGER NOT NULL DEFAULT 0"),
+                ('week', "INTEGER NOT NULL DEFAULT 0"),
+                ('month_id', "TEXT NOT NULL DEFAULT ''"),
+                ('month', "INTEGER NOT NULL DEFAULT 0")
+            )),
+            ('giveaways', (
+                ('bonus', "TEXT NOT NULL DEFAULT '[]'"),
+            ))
+        ):
+            columns = {row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if not columns:
+                continue
+            
+            for column, definition in added_columns:
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        
+        # Replaced by idx_invites_total, which indexes the clamped total the queries rank by
+        self.conn.execute("DROP INDEX IF EXISTS idx_invites_rank")
+    
+    def _execute(self, query, params=()):
+        """Run a write query and commit it
+        
+        Returns:
+            bool: True if the query changed at least one row
+        """
+        try:
+            with self.conn:
+                cursor = self.conn.execute(query, params)
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Error saving database: {e}")
+            return False
+    
+    def _execute_many(self, query, rows):
+        """Run a write query for many rows in one transaction
+        
+        Returns:
+            int: The number of changed rows
+        """
+        try:
+            with self.conn:
+                cursor = self.conn.executemany(query, rows)
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error saving database: {e}")
+            return 0
+    
+    def flush(self):
+        """Checkpoint the write-ahead log into the main database file
+        
+        Every change is already committed, so this only matters on shutdown.
+        """
+        try:
+            self.conn.commit()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error checkpointing database: {e}")
+            return False
+    
+    def close(self):
+        """Flush and close the connection"""
+        self.flush()
+        self.conn.close()
+    
+    # Autorole methods
+    def set_autorole(self, guild_id, role_id):
+        """Set an autorole for a guild"""
+        return self._execute(
+            "INSERT INTO autoroles (guild_id, role_id) VALUES (?, ?) "
+            "ON CONFLICT (guild_id) DO UPDATE SET role_id = excluded.role_id",
+            (str(guild_id), role_id)
+        )
+    
+    def get_autorole(self, guild_id):
+        """Get the autorole for a guild"""
+        row = self.conn.execute(
+            "SELECT role_id FROM autoroles WHERE guild_id = ?", (str(guild_id),)
+        ).fetchone()
+        return row['role_id'] if row else None
+    
+    def remove_autorole(self, guild_id):
+        """Remove the autorole for a guild"""
+        return self._execute("DELETE FROM autoroles WHERE guild_id = ?", (str(guild_id),))
+    
+    # Levels methods
+    def get_user_level(self, guild_id, user_id):
+        """Get a user's level and XP"""
+        row = self.conn.execute(
+            "SELECT level, xp FROM levels WHERE guild_id = ? AND user_id = ?",
+            (str(guild_id), str(user_id))
+        ).fetchone()
+        return {'level': row['level'], 'xp': row['xp']} if row else {'level': 0, 'xp': 0}
+    
+    def add_user_xp(self, guild_id, user_id, xp_to_add=1):
+        """Add XP to a user and return whether they leveled up"""
+        old_level = self.get_user_level(guild_id, user_id)['level']
+        
+        # Simple level formula: level = xp // 100
+        self._execute(
+            "INSERT INTO levels (guild_id, user_id, level, xp) VALUES (?, ?, ? / 100, ?) "
+            "ON CONFLICT (guild_id, user_id) DO UPDATE SET "
+            "xp = xp + excluded.xp, level = (xp + excluded.xp) / 100",
+            (str(guild_id), str(user_id), xp_to_add, xp_to_add)
+        )
+        
+        return self.get_user_level(guild_id, user_id)['level'] > old_level
+    
+    def get_level_leaderboard(self, guild_id, limit=10, page=1):
+        """Get a page of the level leaderboard for a guild, ranked by level and then XP"""
+        rows = self.conn.execute(
+            "SELECT user_id, level, xp FROM levels WHERE guild_id = ? "
+            "ORDER BY level DESC, xp DESC, user_id LIMIT ? OFFSET ?",
+            (str(guild_id), limit, (max(page, 1) - 1) * limit)
+        ).fetchall()
+        return [(row['user_id'], {'level': row['level'], 'xp': row['xp']}) for row in rows]
+    
+    def get_level_rank(self, guild_id, user_id):
+        """Get a user's 1-based position on the level leaderboard, or None if unranked"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        row = self.conn.execute(
+            "SELECT level, xp FROM levels WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        ).fetchone()
+        if not row:
+            return None
+        
+        ahead = self.conn.execute(
+            "SELECT COUNT(*) FROM levels WHERE guild_id = ? AND "
+            "(level > ? OR (level = ? AND (xp > ? OR (xp = ? AND user_id < ?))))",
+            (guild_id, row['level'], row['level'], row['xp'], row['xp'], user_id)
+        ).fetchone()[0]
+        return ahead + 1
+    
+    # Ticket methods
+    def create_ticket(self, guild_id, channel_id, user_id):
+        """Create a new ticket"""
+        return self._execute(
+            "INSERT OR REPLACE INTO tickets (guild_id, channel_id, user_id, status, created_at) "
+            "VALUES (?, ?, ?, 'open', ?)",
+            (str(guild_id), str(channel_id), str(user_id), datetime.now().isoformat())
+        )
+    
+    def close_ticket(self, guild_id, channel_id):
+        """Close a ticket"""
+        return self._execute(
+            "UPDATE tickets SET status = 'closed', closed_at = ? WHERE guild_id = ? AND channel_id = ?",
+            (datetime.now().isoformat(), str(guild_id), str(channel_id))
+        )
+    
+    def get_ticket(self, guild_id, channel_id):
+        """Get ticket information"""
+        row = self.conn.execute(
+            "SELECT user_id, created_at, status, closed_at FROM tickets "
+            "WHERE guild_id = ? AND channel_id = ?",
+            (str(guild_id), str(channel_id))
+        ).fetchone()
+        if not row:
+            return None
+        
+        ticket = {'user_id': row['user_id'], 'created_at': row['created_at'], 'status': row['status']}
+        if row['closed_at']:
+            ticket['closed_at'] = row['closed_at']
+        return ticket
+    
+    def get_open_ticket(self, guild_id, user_id):
+        """Get the channel ID of a user's open ticket, if they have one"""
+        row = self.conn.execute(
+            "SELECT channel_id FROM tickets WHERE guild_id = ? AND user_id = ? AND status = 'open' LIMIT 1",
+            (str(guild_id), str(user_id))
+        ).fetchone()
+        return row['channel_id'] if row else None
+    
+    # Invite methods
+    def track_invite(self, guild_id, inviter_id, invitee_id, is_fake=False, is_rejoin=False):
+        """Track an invite"""
+        guild_id, inviter_id, invitee_id = str(guild_id), str(inviter_id), str(invitee_id)
+        
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO invites (guild_id, inviter_id, joins, fakes, rejoins) VALUES (?, ?, 1, ?, ?) "
+                    "ON CONFLICT (guild_id, inviter_id) DO UPDATE SET "
+                    "joins = joins + 1, fakes = fakes + excluded.fakes, rejoins = rejoins + excluded.rejoins",
+                    (guild_id, inviter_id, int(is_fake), int(is_rejoin))
+                )
+                self.conn.execute(
+                    "INSERT INTO invitees (guild_id, inviter_id, user_id, joined_at, is_fake, is_rejoin) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (guild_id, inviter_id, invitee_id, datetime.now().isoformat(), int(is_fake), int(is_rejoin))
+                )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving database: {e}")
+            return False
+    
+    def get_inviter(self, guild_id, user_id):
+        """Get who invited a user and the record of that join
+        
+        Returns:
+            tuple: (inviter ID, join record) of the user's most recent tracked join, or None
+        """
+        row = self.conn.execute(
+            "SELECT inviter_id, user_id, joined_at, is_fake, is_rejoin FROM invitees "
+            "WHERE guild_id = ? AND user_id = ? ORDER BY rowid DESC LIMIT 1",
+            (str(guild_id), str(user_id))
+        ).fetchone()
+        if not row:
+            return None
+        
+        return row['inviter_id'], {
+            'user_id': row['user_id'],
+            'joined_at': row['joined_at'],
+            'is_fake': bool(row['is_fake']),
+            'is_rejoin': bool(row['is_rejoin'])
+        }
+    
+    def track_leave(self, guild_id, user_id):
+        """Track a user leaving"""
+        # Find which inviter invited this user
+        invite = self.get_inviter(guild_id, user_id)
+        if invite is None:
+            return False
+        
+        return self._execute(
+            "UPDATE invites SET leaves = leaves + 1 WHERE guild_id = ? AND inviter_id = ?",
+            (str(guild_id), invite[0])
+        )
+    
+    def has_joined_before(self, guild_id, user_id):
+        """Check whether a user has been tracked as an invitee in a guild before"""
+        row = self.conn.execute(
+            "SELECT 1 FROM invitees WHERE guild_id = ? AND user_id = ? LIMIT 1",
+            (str(guild_id), str(user_id))
+        ).fetchone()
+        return row is not None
+    
+    def get_last_join_times(self):
+        """Get when each guild's most recent tracked join happened
+        
+        Returns:
+            dict: Guild ID -> ISO timestamp of the latest tracked join
+        """
+        rows = self.conn.execute(
+            "SELECT guild_id, MAX(joined_at) AS joined_at FROM invitees GROUP BY guild_id"
+        ).fetchall()
+        return {row['guild_id']: row['joined_at'] for row in rows}
+    
+    def get_invite_stats(self, guild_id, user_id):
+        """Get invite statistics for a user"""
+        row = self.conn.execute(
+            "SELECT joins, leaves, fakes, rejoins FROM invites WHERE guild_id = ? AND inviter_id = ?",
+            (str(guild_id), str(user_id))
+        ).fetchone()
+        joins, left, fake, rejoins = tuple(row) if row else (0, 0, 0, 0)
+        
+        return {
+            'total': max(joins - left - fake, 0),
+            'joins': joins,
+            'left': left,
+            'fake': fake,
+            'rejoins': rejoins
+        }
+    
+    def get_invite_leaderboard(self, guild_id, limit=10, page=1):
+        """Get a page of the invite leaderboard for a guild, ranked by total real invites"""
+        rows = self.conn.execute(
+            "SELECT inviter_id, MAX(joins - leaves - fakes, 0) AS total FROM invites WHERE guild_id = ? "
+            "ORDER BY total DESC, inviter_id LIMIT ? OFFSET ?",
+            (str(guild_id), limit, (max(page, 1) - 1) * limit)
+        ).fetchall()
+        return [{'user_id': row['inviter_id'], 'total': row['total']} for row in rows]
+    
+    def get_invite_rank(self, guild_id, user_id):
+        """Get a user's 1-based position on the invite leaderboard, or None if unranked"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        row = self.conn.execute(
+            "SELECT MAX(joins - leaves - fakes, 0) AS total FROM invites WHERE guild_id = ? AND inviter_id = ?",
+            (guild_id, user_id)
+        ).fetchone()
+        if not row:
+            return None
+        
+        ahead = self.conn.execute(
+            "SELECT COUNT(*) FROM invites WHERE guild_id = ? AND "
+            "(MAX(joins - leaves - fakes, 0) > ? OR (MAX(joins - leaves - fakes, 0) = ? AND inviter_id < ?))",
+            (guild_id, row['total'], row['total'], user_id)
+        ).fetchone()[0]
+        return ahead + 1
+    
+    # Message tracking methods
+    def _message_periods(self, now):
+        """Get today's date, the start of this week and this month's ID"""
+        return now.strftime("%Y-%m-%d"), now.toordinal() - now.weekday(), now.strftime("%Y-%m")
+    
+    def increment_message_count(self, guild_id, user_id):
+        """Increment message count for a user"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        today, week_start, month_id = self._message_periods(datetime.now())
+        
+        try:
+            with self.conn:
+                # The week and month rollups restart when a new period begins
+                self.conn.execute(
+                    "INSERT INTO message_counts (guild_id, user_id, all_time, week_start, week, month_id, month) "
+                    "VALUES (?, ?, 1, ?, 1, ?, 1) "
+                    "ON CONFLICT (guild_id, user_id) DO UPDATE SET "
+                    "all_time = all_time + 1, "
+                    "week = CASE WHEN week_start = excluded.week_start THEN week + 1 ELSE 1 END, "
+                    "week_start = excluded.week_start, "
+                    "month = CASE WHEN month_id = excluded.month_id THEN month + 1 ELSE 1 END, "
+                    "month_id = excluded.month_id",
+                    (guild_id, user_id, week_start, month_id)
+                )
+                self.conn.execute(
+                    "INSERT INTO message_daily (guild_id, user_id, day, count) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (guild_id, user_id, day) DO UPDATE SET count = count + 1",
+                    (guild_id, user_id, today)
+                )
+                
+                # Only the last MESSAGE_HISTORY_DAYS days of daily counts are kept
+                if self._pruned_day != today:
+                    cutoff = (datetime.now() - timedelta(days=MESSAGE_HISTORY_DAYS - 1)).strftime("%Y-%m-%d")
+                    self.conn.execute("DELETE FROM message_daily WHERE day < ?", (cutoff,))
+                    self._pruned_day = today
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving database: {e}")
+            return False
+    
+    def get_message_stats(self, guild_id, user_id):
+        """Get message statistics for a user"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        today, week_start, month_id = self._message_periods(datetime.now())
+        
+        counts = self.conn.execute(
+            "SELECT all_time, "
+            "CASE WHEN week_start = ? THEN week ELSE 0 END AS week, "
+            "CASE WHEN month_id = ? THEN month ELSE 0 END AS month "
+            "FROM message_counts WHERE guild_id = ? AND user_id = ?",
+            (week_start, month_id, guild_id, user_id)
+        ).fetchone()
+        today_count = self.conn.execute(
+            "SELECT count FROM message_daily WHERE guild_id = ? AND user_id = ? AND day = ?",
+            (guild_id, user_id, today)
+        ).fetchone()
+        
+        return {
+            'all_time': counts['all_time'] if counts else 0,
+            'today': today_count['count'] if today_count else 0,
+            'week': counts['week'] if counts else 0,
+            'month': counts['month'] if counts else 0
+        }
+    
+    def reset_message_stats(self, guild_id, user_id):
+        """Reset message statistics for a user
+        
+        Returns:
+            bool: False if the user has no message statistics
+        """
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        try:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "UPDATE message_counts SET all_time = 0, week = 0, month = 0 WHERE guild_id = ? AND user_id = ?",
+                    (guild_id, user_id)
+                )
+                self.conn.execute(
+                    "DELETE FROM message_daily WHERE guild_id = ? AND user_id = ?",
+                    (guild_id, user_id)
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Error saving database: {e}")
+            return False
+    
+    def get_channel_activity(self, guild_id):
+        """Get the message activity counters of every channel in a guild
+        
+        Returns:
+            dict: Channel ID -> activity counter
+        """
+        rows = self.conn.execute(
+            "SELECT channel_id, counter FROM channel_activity WHERE guild_id = ?",
+            (str(guild_id),)
+        ).fetchall()
+        return {row['channel_id']: json.loads(row['counter']) for row in rows}
+    
+    def save_channel_activity(self, guild_id, counters):
+        """Store the activity counters of some channels in a guild
+        
+        Args:
+            counters: Channel ID -> activity counter
+        """
+        return self._execute_many(
+            "INSERT OR REPLACE INTO channel_activity (guild_id, channel_id, counter) VALUES (?, ?, ?)",
+            [(str(guild_id), str(channel_id), json.dumps(counter)) for channel_id, counter in counters.items()]
+        ) > 0
+    
+    def remove_channel_activity(self, guild_id, channel_id):
+        """Delete the activity counter of a channel"""
+        return self._execute(
+            "DELETE FROM channel_activity WHERE guild_id = ? AND channel_id = ?",
+            (str(guild_id), str(channel_id))
+        )
+    
+    def _message_ranking(self, period, now):
+        """Get the table, count column and period filter a message leaderboard ranks by"""
+        today, week_start, month_id = self._message_periods(now)
+        return {
+            'all_time': ("message_counts", "all_time", "", ()),
+            'today': ("message_daily", "count", " AND day = ?", (today,)),
+            'week': ("message_counts", "week", " AND week_start = ?", (week_start,)),
+            'month': ("message_counts", "month", " AND month_id = ?", (month_id,))
+        }.get(period)
+    
+    def get_message_leaderboard(self, guild_id, limit=10, period='all_time', page=1):
+        """Get the message leaderboard for a guild
+        
+        Args:
+            guild_id: The guild to rank
+            limit: Number of entries per page
+            period: One of all_time, today, week or month
+            page: 1-based page of the leaderboard
+        """
+        ranking = self._message_ranking(period, datetime.now())
+        if ranking is None:
+            return []
+        
+        table, column, where, params = ranking
+        rows = self.conn.execute(
+            f"SELECT user_id, {column} AS count FROM {table} WHERE guild_id = ?{where} "
+            f"ORDER BY {column} DESC, user_id LIMIT ? OFFSET ?",
+            (str(guild_id), *params, limit, (max(page, 1) - 1) * limit)
+        ).fetchall()
+        
+        return [{'user_id': row['user_id'], 'count': row['count']} for row in rows]
+    
+    def get_message_rank(self, guild_id, user_id, period='all_time'):
+        """Get a user's 1-based position on the message leaderboard, or None if unranked"""
+        ranking = self._message_ranking(period, datetime.now())
+        if ranking is None:
+            return None
+        
+        table, column, where, params = ranking
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        row = self.conn.execute(
+            f"SELECT {column} AS count FROM {table} WHERE guild_id = ?{where} AND user_id = ?",
+            (guild_id, *params, user_id)
+        ).fetchone()
+        if not row:
+            return None
+        
+        ahead = self.conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE guild_id = ?{where} AND "
+            f"({column} > ? OR ({column} = ? AND user_id < ?))",
+            (guild_id, *params, row['count'], row['count'], user_id)
+        ).fetchone()[0]
+        return ahead + 1
+    
+    # Reaction roles methods
+    def set_reaction_role(self, guild_id, message_id, role_id, emoji):
+        """Set a reaction role"""
+        return self._execute(
+            "INSERT INTO reaction_roles (guild_id, message_id, emoji, role_id) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, message_id, emoji) DO UPDATE SET role_id = excluded.role_id",
+            (str(guild_id), str(message_id), emoji, role_id)
+        )
+    
+    def get_reaction_roles(self, guild_id, message_id):
+        """Get reaction roles for a message"""
+        rows = self.conn.execute(
+            "SELECT role_id, emoji FROM reaction_roles WHERE guild_id = ? AND message_id = ? ORDER BY rowid",
+            (str(guild_id), str(message_id))
+        ).fetchall()
+        return [{'role_id': row['role_id'], 'emoji': row['emoji']} for row in rows]
+    
+    def get_guild_reaction_roles(self, guild_id):
+        """Get all reaction role messages for a guild, keyed by message ID"""
+        return self.get_all_reaction_roles(guild_id).get(str(guild_id), {})
+    
+    def get_all_reaction_roles(self, guild_id=None):
+        """Get all reaction role messages, keyed by guild ID and message ID"""
+        query = "SELECT guild_id, message_id, role_id, emoji FROM reaction_roles"
+        params = ()
+        if guild_id is not None:
+            query += " WHERE guild_id = ?"
+            params = (str(guild_id),)
+        
+        result = {}
+        for row in self.conn.execute(query + " ORDER BY rowid", params):
+            result.setdefault(row['guild_id'], {}).setdefault(row['message_id'], []).append({
+                'role_id': row['role_id'],
+                'emoji': row['emoji']
+            })
+        return result
+    
+    def delete_reaction_role_message(self, guild_id, message_id):
+        """Remove every reaction role attached to a message"""
+        return self._execute(
+            "DELETE FROM reaction_roles WHERE guild_id = ? AND message_id = ?",
+            (str(guild_id), str(message_id))
+        )
+    
+    def remove_reaction_role(self, guild_id, message_id, emoji):
+        """Remove a reaction role"""
+        return self._execute(
+            "DELETE FROM reaction_roles WHERE guild_id = ? AND message_id = ? AND emoji = ?",
+            (str(guild_id), str(message_id), emoji)
+        )
+    
+    # Giveaway methods
+    def create_giveaway(self, guild_id, channel_id, message_id, prize, host_id, end_time, winners=1):
+        """Create a new giveaway"""
+        return self._execute(
+            "INSERT OR REPLACE INTO giveaways "
+            "(guild_id, message_id, channel_id, prize, host_id, end_time, winners) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(guild_id), str(message_id), str(channel_id), prize, str(host_id), end_time.isoformat(), winners)
+        )
+    
+    def add_giveaway_participant(self, guild_id, message_id, user_id):
+        """Add a participant to a giveaway"""
+        return self.add_giveaway_participants(guild_id, message_id, [user_id]) > 0
+    
+    def remove_giveaway_participant(self, guild_id, message_id, user_id):
+        """Remove a participant from a giveaway"""
+        return self.remove_giveaway_participants(guild_id, message_id, [user_id]) > 0
+    
+    def add_giveaway_participants(self, guild_id, message_id, user_ids):
+        """Add a batch of participants to a giveaway in one transaction
+        
+        Returns:
+            int: The number of users that weren't participating yet
+        """
+        if not self._giveaway_exists(guild_id, message_id):
+            return 0
+        
+        return self._execute_many(
+            "INSERT OR IGNORE INTO giveaway_participants (guild_id, message_id, user_id) VALUES (?, ?, ?)",
+            [(str(guild_id), str(message_id), str(user_id)) for user_id in user_ids]
+        )
+    
+    def remove_giveaway_participants(self, guild_id, message_id, user_ids):
+        """Remove a batch of participants from a giveaway in one transaction
+        
+        Returns:
+            int: The number of removed participants
+        """
+        return self._execute_many(
+            "DELETE FROM giveaway_participants WHERE guild_id = ? AND message_id = ? AND user_id = ?",
+            [(str(guild_id), str(message_id), str(user_id)) for user_id in user_ids]
+        )
+    
+    def set_giveaway_bonus(self, guild_id, message_id, bonus):
+        """Set the bonus entry rules of a giveaway
+        
+        Args:
+            bonus: List of {'type', 'target', 'multiplier'} rules
+        """
+        return self._execute(
+            "UPDATE giveaways SET bonus = ? WHERE guild_id = ? AND message_id = ?",
+            (json.dumps(bonus), str(guild_id), str(message_id))
+        )
+    
+    def is_giveaway_running(self, guild_id, message_id):
+        """Check whether a giveaway exists and has not ended"""
+        row = self.conn.execute(
+            "SELECT 1 FROM giveaways WHERE guild_id = ? AND message_id = ? AND ended = 0",
+            (str(guild_id), str(message_id))
+        ).fetchone()
+        return row is not None
+    
+    def _giveaway_exists(self, guild_id, message_id):
+        """Check whether a giveaway exists"""
+        row = self.conn.execute(
+            "SELECT 1 FROM giveaways WHERE guild_id = ? AND message_id = ?",
+            (str(guild_id), str(message_id))
+        ).fetchone()
+        return row is not None
+    
+    def _giveaway_from_row(self, row):
+        """Build the giveaway dict JsonDatabase returns from a giveaways row"""
+        participants = [
+            participant['user_id'] for participant in self.conn.execute(
+                "SELECT user_id FROM giveaway_participants WHERE guild_id = ? AND message_id = ? ORDER BY rowid",
+                (row['guild_id'], row['message_id'])
+            )
+        ]
+        
+        giveaway = {
+            'channel_id': row['channel_id'],
+            'prize': row['prize'],
+            'host_id': row['host_id'],
+            'end_time': row['end_time'],
+            'winners': row['winners'],
+            'participants': participants
+        }
+        bonus = json.loads(row['bonus'])
+        if bonus:
+            giveaway['bonus'] = bonus
+        if row['ended']:
+            giveaway['ended'] = True
+        return giveaway
+    
+    def get_giveaway(self, guild_id, message_id):
+        """Get giveaway information"""
+        row = self.conn.execute(
+            "SELECT * FROM giveaways WHERE guild_id = ? AND message_id = ?",
+            (str(guild_id), str(message_id))
+        ).fetchone()
+        return self._giveaway_from_row(row) if row else None
+    
+    def get_active_giveaways(self):
+        """Get all giveaways that have not been ended yet, including overdue ones"""
+        rows = self.conn.execute("SELECT * FROM giveaways WHERE ended = 0").fetchall()
+        
+        return [{
+            'guild_id': row['guild_id'],
+            'message_id': row['message_id'],
+            'channel_id': row['channel_id'],
+            'end_time': datetime.fromisoformat(row['end_time']),
+            'data': self._giveaway_from_row(row)
+        } for row in rows]
+    
+    def end_giveaway(self, guild_id, message_id):
+        """Mark a giveaway as ended"""
+        return self._execute(
+            "UPDATE giveaways SET ended = 1, end_time = ? WHERE guild_id = ? AND message_id = ?",
+            (datetime.now().isoformat(), str(guild_id), str(message_id))
+        )
+    
+    # Migration
+    def import_json(self, data):
+        """Import data in the bot_database.json layout, replacing existing rows
+        
+        Args:
+            data: The data dict of a JsonDatabase
+        """
+        # Imported here: utils.database creates the configured global database on import
+        from utils.database import message_counter_from_daily, roll_message_counter
+        
+        with self.conn:
+            for table in ('autoroles', 'levels', 'tickets', 'invites', 'invitees', 'message_counts',
+                          'message_daily', 'channel_activity', 'reaction_roles', 'giveaways',
+                          'giveaway_participants'):
+                self.conn.execute(f"DELETE FROM {table}")
+            
+            self.conn.executemany(
+                "INSERT INTO autoroles (guild_id, role_id) VALUES (?, ?)",
+                data.get('autoroles', {}).items()
+            )
+            
+            for guild_id, users in data.get('levels', {}).items():
+                self.conn.executemany(
+                    "INSERT INTO levels (guild_id, user_id, level, xp) VALUES (?, ?, ?, ?)",
+                    ((guild_id, user_id, user['level'], user['xp']) for user_id, user in users.items())
+                )
+            
+            for section in ('tickets', 'ticket_archive'):
+                for guild_id, tickets in data.get(section, {}).items():
+                    self.conn.executemany(
+                        "INSERT INTO tickets (guild_id, channel_id, user_id, status, created_at, closed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        ((guild_id, channel_id, ticket['user_id'], ticket.get('status', 'open'),
+                          ticket['created_at'], ticket.get('closed_at'))
+                         for channel_id, ticket in tickets.items())
+                    )
+            
+            for guild_id, inviters in data.get('invites', {}).items():
+                for inviter_id, inviter in inviters.items():
+                    self.conn.execute(
+                        "INSERT INTO invites (guild_id, inviter_id, joins, leaves, fakes, rejoins) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (guild_id, inviter_id, inviter['joins'], inviter['left'], inviter['fake'], inviter['rejoins'])
+                    )
+                    self.conn.executemany(
+                        "INSERT INTO invitees (guild_id, inviter_id, user_id, joined_at, is_fake, is_rejoin) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        ((guild_id, inviter_id, invitee['user_id'], invitee['joined_at'],
+                          int(invitee.get('is_fake', False)), int(invitee.get('is_rejoin', False)))
+                         for invitee in inviter.get('invitees', []))
+                    )
+            
+            now = datetime.now()
+            for guild_id, users in data.get('message_counts', {}).items():
+                for user_id, counter in users.items():
+                    if 'daily' in counter:
+                        counter = message_counter_from_daily(counter, now)
+                    else:
+                        counter = dict(counter, days=list(counter['days']))
+                    roll_message_counter(counter, now)
+                    
+                    self.conn.execute(
+                        "INSERT INTO message_counts (guild_id, user_id, all_time, week_start, week, month_id, month) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (guild_id, user_id, counter['all_time'], counter['week_start'], counter['week'],
+                         counter['month_id'], counter['month'])
+                    )
+                    
+                    # Unroll the ring of recent days into dated rows
+                    daily = []
+                    for offset in range(MESSAGE_HISTORY_DAYS):
+                        day = counter['day'] - offset
+                        count = counter['days'][day % MESSAGE_HISTORY_DAYS]
+                        if count:
+                            daily.append((guild_id, user_id, datetime.fromordinal(day).strftime("%Y-%m-%d"), count))
+                    self.conn.executemany(
+                        "INSERT INTO message_daily (guild_id, user_id, day, count) VALUES (?, ?, ?, ?)",
+                        daily
+                    )
+            
+            for guild_id, counters in data.get('channel_activity', {}).items():
+                self.conn.executemany(
+                    "INSERT INTO channel_activity (guild_id, channel_id, counter) VALUES (?, ?, ?)",
+                    ((guild_id, channel_id, json.dumps(counter)) for channel_id, counter in counters.items())
+                )
+            
+            for guild_id, messages in data.get('reaction_roles', {}).items():
+                for message_id, roles in messages.items():
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO reaction_roles (guild_id, message_id, emoji, role_id) "
+                        "VALUES (?, ?, ?, ?)",
+                        ((guild_id, message_id, role['emoji'], role['role_id']) for role in roles)
+                    )
+            
+            for guild_id, giveaways in data.get('giveaways', {}).items():
+                for message_id, giveaway in giveaways.items():
+                    self.conn.execute(
+                        "INSERT INTO giveaways "
+                        "(guild_id, message_id, channel_id, prize, host_id, end_time, winners, ended, bonus) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (guild_id, message_id, giveaway['channel_id'], giveaway['prize'], giveaway['host_id'],
+                         giveaway['end_time'], giveaway.get('winners', 1), int(giveaway.get('ended', False)),
+                         json.dumps(giveaway.get('bonus', [])))
+                    )
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO giveaway_participants (guild_id, message_id, user_id) "
+                        "VALUES (?, ?, ?)",
+                        ((guild_id, message_id, user_id) for user_id in giveaway.get('participants', []))
+                    )
+        
+        logger.info(f"Imported JSON data into {self.db_file}")
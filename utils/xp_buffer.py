@@ -0,0 +1,145 @@
+import logging
+
+from utils.helpers import Helpers
+from utils.ranking import RankIndex
+
+logger = logging.getLogger('discord_bot')
+
+class XPBuffer:
+    """In-memory buffer of XP grants in front of a DataManager
+    
+    XP and message deltas are collected per (guild, user) and applied to the
+    DataManager in one write by flush(). Totals returned by add() and
+    get_user_data() already include the pending delta, so level-ups can be
+    detected immediately. Per-guild XP and message rankings are built on first
+    use and kept up to date by add().
+    """
+    
+    def __init__(self, data_manager, max_pending=500):
+        """Initialize the buffer
+        
+        Args:
+            data_manager: The DataManager holding user_<guild>_<user> records
+            max_pending: Flush early from commit() once this many users have pending XP
+        """
+        self.data_manager = data_manager
+        self.max_pending = max_pending
+        self.pending = {}
+        self.rankings = {}
+    
+    @staticmethod
+    def get_user_key(guild_id, user_id):
+        """Get the DataManager key of a user's level record"""
+        return f"user_{guild_id}_{user_id}"
+    
+    def get_user_data(self, guild_id, user_id):
+        """Get a user's XP, level and message count including pending XP
+        
+        Returns:
+            dict: The user's xp, level and messages
+        """
+        stored = self.data_manager.data.get(self.get_user_key(guild_id, user_id), {})
+        delta = self.pending.get((guild_id, user_id), {'xp': 0, 'messages': 0})
+        
+        xp = stored.get('xp', 0) + delta['xp']
+        return {
+            'xp': xp,
+            'level': Helpers.get_level_from_xp(xp),
+            'messages': stored.get('messages', 0) + delta['messages']
+        }
+    
+    def add(self, guild_id, user_id, xp, messages=1):
+        """Buffer an XP grant
+        
+        Returns:
+            tuple: The user's (old_level, new_level)
+        """
+        old_level = self.get_user_data(guild_id, user_id)['level']
+        
+        delta = self.pending.setdefault((guild_id, user_id), {'xp': 0, 'messages': 0})
+        delta['xp'] += xp
+        delta['messages'] += messages
+        
+        user_data = self.get_user_data(guild_id, user_id)
+        for board in ('xp', 'messages'):
+            ranking = self.rankings.get((board, guild_id))
+            if ranking is not None:
+                ranking.update(user_id, user_data[board])
+        
+        return old_level, user_data['level']
+    
+    def get_ranking(self, guild_id, board='xp'):
+        """Get a guild's ranking by total XP or messages, building it on first use
+        
+        Args:
+            guild_id: The guild to rank
+            board: 'xp' or 'messages'
+        
+        Returns:
+            RankIndex: Scores keyed by user ID, including pending XP
+        """
+        ranking = self.rankings.get((board, guild_id))
+        if ranking is not None:
+            return ranking
+        
+        prefix = self.get_user_key(guild_id, '')
+        user_ids = {user_id for pending_guild, user_id in self.pending if pending_guild == guild_id}
+        for key in self.data_manager.data:
+            if key.startswith(prefix):
+                try:
+                    user_ids.add(int(key[len(prefix):]))
+                except ValueError:
+                    continue
+        
+        ranking = self.rankings[(board, guild_id)] = RankIndex({
+            user_id: self.get_user_data(guild_id, user_id)[board] for user_id in user_ids
+        })
+        return ranking
+    
+    def discard(self, guild_id, user_id=None):
+        """Drop pending XP and rankings for a user, or for a whole guild if no user is given
+        
+        Used when the user's stored records are deleted.
+        """
+        if user_id is not None:
+            self.pending.pop((guild_id, user_id), None)
+            for board in ('xp', 'messages'):
+                ranking = self.rankings.get((board, guild_id))
+                if ranking is not None:
+                    ranking.remove(user_id)
+            return
+        
+        for key in [key for key in self.pending if key[0] == guild_id]:
+            del self.pending[key]
+        for board in ('xp', 'messages'):
+            self.rankings.pop((board, guild_id), None)
+    
+    async def commit(self):
+        """Flush early when too many users have pending XP (message pipeline store)"""
+        if len(self.pending) >= self.max_pending:
+            await self.flush()
+    
+    async def flush(self):
+        """Apply all pending XP to the DataManager in a single write
+        
+        Returns:
+            int: The number of user records updated
+        """
+        if not self.pending:
+            return 0
+        
+        async with self.data_manager.lock:
+            # Swap and apply without awaiting in between, so totals read by
+            # get_user_data() never miss a delta
+            pending, self.pending = self.pending, {}
+            for (guild_id, user_id), delta in pending.items():
+                key = self.get_user_key(guild_id, user_id)
+                user_data = self.data_manager.data.setdefault(key, {'xp': 0, 'level': 0, 'messages': 0})
+                user_data['xp'] = user_data.get('xp', 0) + delta['xp']
+                user_data['messages'] = user_data.get('messages', 0) + delta['messages']
+                user_data['level'] = Helpers.get_level_from_xp(user_data['xp'])
+            self.data_manager.dirty = True
+        
+        await self.data_manager.commit()
+        logger.debug(f"Flushed buffered XP for {len(pending)} users")
+        return len(pending)